@@ -1,10 +1,16 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime
 from app.models.book import Livre
 from app.utils.validation import SchemaLivre, SchemaMiseAJourLivre, valider_donnees_requete
 from app.utils.security import token_requis, admin_requis
-from app.utils.database import ajouter_a_db, obtenir_ou_404, supprimer_de_db, valider_changements, paginer_resultats
+from app.utils.database import obtenir_ou_404, paginer_resultats, pagination_vers_dict, parametres_pagination
 from app.utils.error_handler import ErreurRequeteInvalide, ErreurNonTrouve
+from app.utils.suggestions import TAILLE_PRECALCUL
+from app.utils.importation import format_import, lire_lignes_import
+from app.utils.exportation import format_export, reponse_export
+from app.utils.routage import lecture_replique
+from app.utils.conditionnel import conditionnel
+from app.utils.cache_reponses import reponse_en_cache, etiqueter, etiquettes_livre, LISTE_LIVRES
+from app.services import book_service
 
 book_bp = Blueprint('books', __name__)
 
@@ -20,61 +26,77 @@ def creer_livre(utilisateur_actuel):
         return jsonify({'statut': 'erreur', 'erreurs': donnees_validees['erreurs']}), 400
 
     # Créer le livre
-    nouveau_livre = Livre(
-        titre=donnees_validees.get('titre'),
-        auteur=donnees_validees.get('auteur'),
-        isbn=donnees_validees.get('isbn'),
-        date_publication=donnees_validees.get('date_publication'),
-        quantite=donnees_validees.get('quantite', 1),
-        disponible=donnees_validees.get('quantite', 1),
-        cree_le=datetime.utcnow()
-    )
-
-    ajouter_a_db(nouveau_livre)
+    nouveau_livre = book_service.creer_livre(donnees_validees)
 
     return jsonify({
         'statut': 'succes',
         'message': 'Livre créé avec succès',
-        'livre': nouveau_livre.vers_dict()
+        'livre': nouveau_livre
     }), 201
 
+@book_bp.route('/import', methods=['POST'])
+@admin_requis
+def importer_livres(utilisateur_actuel):
+    """Endpoint pour importer des livres en masse depuis un CSV ou du NDJSON (admin seulement)"""
+    format_fichier = format_import(request.mimetype, request.args.get('format'))
+
+    # Le corps de la requête est lu en continu, sans être chargé en mémoire
+    resultat = book_service.importer_livres(lire_lignes_import(request.stream, format_fichier))
+
+    return jsonify({
+        'statut': 'succes',
+        'message': f"{resultat['importes']} livre(s) importé(s), {resultat['rejetes']} ligne(s) rejetée(s)",
+        'importes': resultat['importes'],
+        'rejetes': resultat['rejetes'],
+        'resultats': resultat['resultats']
+    }), 200
+
+@book_bp.route('/export', methods=['GET'])
+@admin_requis
+def exporter_livres(utilisateur_actuel):
+    """Endpoint pour exporter tous les livres en NDJSON ou CSV (admin seulement)"""
+    format_fichier = format_export(request.args.get('format'))
+
+    return reponse_export(book_service.exporter_livres(format_fichier), format_fichier, 'livres')
+
 @book_bp.route('', methods=['GET'])
+@reponse_en_cache(LISTE_LIVRES)
+@lecture_replique
+@conditionnel(book_service.validateurs_livres)
 def obtenir_livres():
     """Endpoint pour obtenir la liste des livres"""
-    page = request.args.get('page', 1, type=int)
-    par_page = request.args.get('par_page', 10, type=int)
+    pagination = parametres_pagination()
 
     # Obtenir les livres paginés
-    resultat = paginer_resultats(Livre.query, page, par_page)
+    resultat = paginer_resultats(Livre.query, cles_tri=(Livre.titre, Livre.id), compteur='livres', **pagination)
+    livres = [livre.vers_dict() for livre in resultat['elements']]
+    for livre in livres:
+        etiqueter(*etiquettes_livre(livre))
 
     return jsonify({
         'statut': 'succes',
-        'livres': [livre.vers_dict() for livre in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'livres': livres,
+        'pagination': pagination_vers_dict(resultat)
     }), 200
 
 @book_bp.route('/<int:livre_id>', methods=['GET'])
+@reponse_en_cache('livre:{livre_id}')
+@lecture_replique
+@conditionnel(book_service.validateurs_livre)
 def obtenir_livre(livre_id):
     """Endpoint pour obtenir les détails d'un livre"""
-    livre = obtenir_ou_404(Livre, livre_id, "Livre non trouvé")
+    livre = obtenir_ou_404(Livre, livre_id, "Livre non trouvé").vers_dict()
+    etiqueter(*etiquettes_livre(livre))
 
     return jsonify({
         'statut': 'succes',
-        'livre': livre.vers_dict()
+        'livre': livre
     }), 200
 
 @book_bp.route('/<int:livre_id>', methods=['PUT'])
 @admin_requis
 def mettre_a_jour_livre(utilisateur_actuel, livre_id):
     """Endpoint pour mettre à jour un livre (admin seulement)"""
-    livre = obtenir_ou_404(Livre, livre_id, "Livre non trouvé")
     donnees = request.get_json()
 
     # Valider les données
@@ -82,44 +104,19 @@ def mettre_a_jour_livre(utilisateur_actuel, livre_id):
     if 'erreurs' in donnees_validees:
         return jsonify({'statut': 'erreur', 'erreurs': donnees_validees['erreurs']}), 400
 
-    # Mettre à jour les champs
-    if 'titre' in donnees_validees:
-        livre.titre = donnees_validees['titre']
-    if 'auteur' in donnees_validees:
-        livre.auteur = donnees_validees['auteur']
-    if 'isbn' in donnees_validees:
-        livre.isbn = donnees_validees['isbn']
-    if 'date_publication' in donnees_validees:
-        livre.date_publication = donnees_validees['date_publication']
-    if 'quantite' in donnees_validees:
-        # Calculer la différence pour mettre à jour disponible
-        difference = donnees_validees['quantite'] - livre.quantite
-        livre.quantite = donnees_validees['quantite']
-        livre.disponible += difference
-
-    valider_changements()
+    livre = book_service.mettre_a_jour_livre(livre_id, donnees_validees)
 
     return jsonify({
         'statut': 'succes',
         'message': 'Livre mis à jour avec succès',
-        'livre': livre.vers_dict()
+        'livre': livre
     }), 200
 
 @book_bp.route('/<int:livre_id>', methods=['DELETE'])
 @admin_requis
 def supprimer_livre(utilisateur_actuel, livre_id):
     """Endpoint pour supprimer un livre (admin seulement)"""
-    livre = obtenir_ou_404(Livre, livre_id, "Livre non trouvé")
-
-    # Vérifier si le livre a des emprunts actifs
-    emprunts_actifs = [e for e in livre.emprunts if not e.est_retourne()]
-    if emprunts_actifs:
-        return jsonify({
-            'statut': 'erreur',
-            'message': 'Impossible de supprimer un livre avec des emprunts actifs'
-        }), 400
-
-    supprimer_de_db(livre)
+    book_service.supprimer_livre(livre_id)
 
     return jsonify({
         'statut': 'succes',
@@ -127,11 +124,12 @@ def supprimer_livre(utilisateur_actuel, livre_id):
     }), 200
 
 @book_bp.route('/search', methods=['GET'])
+@reponse_en_cache(LISTE_LIVRES)
+@lecture_replique
 def rechercher_livres():
     """Endpoint pour rechercher des livres"""
     terme = request.args.get('terme', '')
-    page = request.args.get('page', 1, type=int)
-    par_page = request.args.get('par_page', 10, type=int)
+    pagination = parametres_pagination()
 
     if not terme:
         return jsonify({
@@ -140,23 +138,26 @@ def rechercher_livres():
         }), 400
 
     # Rechercher les livres
-    requete = Livre.query.filter(
-        (Livre.titre.ilike(f'%{terme}%')) |
-        (Livre.auteur.ilike(f'%{terme}%')) |
-        (Livre.isbn.ilike(f'%{terme}%'))
-    )
+    resultat = book_service.rechercher_livres(terme, **pagination)
+    for livre in resultat['livres']:
+        etiqueter(*etiquettes_livre(livre))
+
+    return jsonify({
+        'statut': 'succes',
+        'livres': resultat['livres'],
+        'pagination': resultat['pagination']
+    }), 200
+
+@book_bp.route('/suggest', methods=['GET'])
+@lecture_replique
+def suggerer_livres():
+    """Endpoint de suggestions pendant la saisie"""
+    terme = request.args.get('q', '')
+    limite = min(max(request.args.get('limite', 10, type=int), 1), TAILLE_PRECALCUL)
 
-    resultat = paginer_resultats(requete, page, par_page)
+    suggestions = book_service.suggerer_livres(terme, limite)
 
     return jsonify({
         'statut': 'succes',
-        'livres': [livre.vers_dict() for livre in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'suggestions': suggestions
     }), 200
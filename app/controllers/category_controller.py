@@ -1,14 +1,49 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy import func, select
+from app import db
+from app.models.book import Livre
 from app.models.category import Categorie
 from app.utils.validation import SchemaCategorie, SchemaMiseAJourCategorie, valider_donnees_requete
 from app.utils.security import admin_requis
-from app.utils.database import ajouter_a_db, obtenir_ou_404, supprimer_de_db, valider_changements, paginer_resultats
+from app.utils.database import ajouter_a_db, obtenir_ou_404, supprimer_de_db, valider_changements, transactionnel, paginer_resultats, pagination_vers_dict, parametres_pagination
 from app.utils.error_handler import ErreurRequeteInvalide, ErreurNonTrouve, ErreurConflit
+from app.utils.routage import lecture_replique
+from app.utils.conditionnel import calculer_etag, conditionnel
+from app.utils.comptage import lire_compteur
+from app.utils.cache_reponses import reponse_en_cache, etiqueter, etiquettes_livre, etiquette_categorie, invalider_cache, CATEGORIES
 
 category_bp = Blueprint('categories', __name__)
 
+def _validateurs_categories():
+    """ETag et date de dernière modification de la liste des catégories
+
+    Le nombre de livres de chaque catégorie en fait partie : toute écriture sur
+    les livres (date de modification, compteur maintenu) change aussi l'ETag.
+    """
+    nombre, modifie_le, livres_modifies_le = db.session.execute(select(
+        func.count(Categorie.id),
+        func.max(Categorie.modifie_le),
+        select(func.max(Livre.modifie_le)).scalar_subquery()
+    )).one()
+    derniere_modification = max(filter(None, (modifie_le, livres_modifies_le)), default=None)
+    return calculer_etag('categories', nombre, modifie_le, livres_modifies_le, lire_compteur('livres')), derniere_modification
+
+def _validateurs_categorie(categorie_id):
+    """ETag et date de dernière modification d'une catégorie et de ses livres, sans les charger"""
+    ligne = db.session.execute(select(
+        Categorie.modifie_le,
+        Categorie.nombre_livres,
+        select(func.max(Livre.modifie_le)).where(Livre.categorie_id == Categorie.id).scalar_subquery()
+    ).where(Categorie.id == categorie_id)).first()
+    if ligne is None:
+        raise ErreurNonTrouve("Catégorie non trouvée")
+    modifie_le, nombre_livres, livres_modifies_le = ligne
+    derniere_modification = max(filter(None, (modifie_le, livres_modifies_le)), default=None)
+    return calculer_etag('categorie', categorie_id, modifie_le, nombre_livres, livres_modifies_le), derniere_modification
+
 @category_bp.route('', methods=['POST'])
 @admin_requis
+@transactionnel
 def creer_categorie(utilisateur_actuel):
     """Endpoint pour créer une nouvelle catégorie (admin seulement)"""
     donnees = request.get_json()
@@ -33,6 +68,7 @@ def creer_categorie(utilisateur_actuel):
     )
     
     ajouter_a_db(nouvelle_categorie)
+    invalider_cache(CATEGORIES)
     
     return jsonify({
         'statut': 'succes',
@@ -41,28 +77,26 @@ def creer_categorie(utilisateur_actuel):
     }), 201
 
 @category_bp.route('', methods=['GET'])
+@reponse_en_cache(CATEGORIES)
+@lecture_replique
+@conditionnel(_validateurs_categories)
 def obtenir_categories():
     """Endpoint pour obtenir la liste des catégories"""
-    page = request.args.get('page', 1, type=int)
-    par_page = request.args.get('par_page', 10, type=int)
+    pagination = parametres_pagination()
     
     # Obtenir les catégories paginées
-    resultat = paginer_resultats(Categorie.query, page, par_page)
+    resultat = paginer_resultats(Categorie.query, **pagination)
     
     return jsonify({
         'statut': 'succes',
         'categories': [categorie.vers_dict() for categorie in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'pagination': pagination_vers_dict(resultat)
     }), 200
 
 @category_bp.route('/<int:categorie_id>', methods=['GET'])
+@reponse_en_cache('categorie:{categorie_id}')
+@lecture_replique
+@conditionnel(_validateurs_categorie)
 def obtenir_categorie(categorie_id):
     """Endpoint pour obtenir les détails d'une catégorie"""
     categorie = obtenir_ou_404(Categorie, categorie_id, "Catégorie non trouvée")
@@ -74,6 +108,7 @@ def obtenir_categorie(categorie_id):
 
 @category_bp.route('/<int:categorie_id>', methods=['PUT'])
 @admin_requis
+@transactionnel
 def mettre_a_jour_categorie(utilisateur_actuel, categorie_id):
     """Endpoint pour mettre à jour une catégorie (admin seulement)"""
     categorie = obtenir_ou_404(Categorie, categorie_id, "Catégorie non trouvée")
@@ -100,6 +135,7 @@ def mettre_a_jour_categorie(utilisateur_actuel, categorie_id):
         categorie.description = donnees_validees['description']
     
     valider_changements()
+    invalider_cache(CATEGORIES, etiquette_categorie(categorie_id))
     
     return jsonify({
         'statut': 'succes',
@@ -109,18 +145,17 @@ def mettre_a_jour_categorie(utilisateur_actuel, categorie_id):
 
 @category_bp.route('/<int:categorie_id>', methods=['DELETE'])
 @admin_requis
+@transactionnel
 def supprimer_categorie(utilisateur_actuel, categorie_id):
     """Endpoint pour supprimer une catégorie (admin seulement)"""
     categorie = obtenir_ou_404(Categorie, categorie_id, "Catégorie non trouvée")
     
-    # Vérifier si la catégorie a des livres associés
-    if categorie.livres:
-        return jsonify({
-            'statut': 'erreur',
-            'message': 'Impossible de supprimer une catégorie avec des livres associés'
-        }), 400
+    # Détacher les livres de la catégorie en une seule requête, sans les charger
+    Livre.query.filter_by(categorie_id=categorie_id).update({Livre.categorie_id: None}, synchronize_session=False)
     
     supprimer_de_db(categorie)
+    # Les réponses des livres détachés portent aussi l'étiquette de la catégorie
+    invalider_cache(CATEGORIES, etiquette_categorie(categorie_id))
     
     return jsonify({
         'statut': 'succes',
@@ -128,28 +163,25 @@ def supprimer_categorie(utilisateur_actuel, categorie_id):
     }), 200
 
 @category_bp.route('/<int:categorie_id>/livres', methods=['GET'])
+@reponse_en_cache('categorie:{categorie_id}')
+@lecture_replique
+@conditionnel(_validateurs_categorie)
 def obtenir_livres_par_categorie(categorie_id):
     """Endpoint pour obtenir les livres d'une catégorie spécifique"""
     categorie = obtenir_ou_404(Categorie, categorie_id, "Catégorie non trouvée")
-    page = request.args.get('page', 1, type=int)
-    par_page = request.args.get('par_page', 10, type=int)
+    pagination = parametres_pagination()
     
     # Obtenir les livres de la catégorie
-    from app.models.book import Livre
     requete = Livre.query.filter_by(categorie_id=categorie_id)
     
-    resultat = paginer_resultats(requete, page, par_page)
+    resultat = paginer_resultats(requete, cles_tri=(Livre.titre, Livre.id), **pagination)
+    livres = [livre.vers_dict() for livre in resultat['elements']]
+    for livre in livres:
+        etiqueter(*etiquettes_livre(livre))
     
     return jsonify({
         'statut': 'succes',
         'categorie': categorie.vers_dict(),
-        'livres': [livre.vers_dict() for livre in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'livres': livres,
+        'pagination': pagination_vers_dict(resultat)
     }), 200
\ No newline at end of file
@@ -1,11 +1,12 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime
 from app.models.loan import Emprunt
 from app.models.book import Livre
-from app.utils.validation import SchemaCreationEmprunt, SchemaRetourEmprunt, valider_donnees_requete
+from app.utils.validation import SchemaCreationEmprunt, SchemaRetourEmprunt, SchemaCreationEmpruntsLot, SchemaRetourEmpruntsLot, valider_donnees_requete
 from app.utils.security import token_requis, admin_requis
-from app.utils.database import ajouter_a_db, obtenir_ou_404, valider_changements, paginer_resultats
-from app.utils.error_handler import ErreurRequeteInvalide, ErreurNonTrouve, ErreurConflit
+from app.utils.database import paginer_resultats, pagination_vers_dict, parametres_pagination
+from app.utils.error_handler import ErreurRequeteInvalide, ErreurNonTrouve
+from app.utils.exportation import format_export, reponse_export
+from app.services import loan_service
 
 loan_bp = Blueprint('loans', __name__)
 
@@ -20,40 +21,44 @@ def creer_emprunt(utilisateur_actuel):
     if 'erreurs' in donnees_validees:
         return jsonify({'statut': 'erreur', 'erreurs': donnees_validees['erreurs']}), 400
     
-    # Obtenir le livre
-    livre = obtenir_ou_404(Livre, donnees_validees.get('livre_id'), "Livre non trouvé")
-    
-    # Vérifier si le livre est disponible
-    if not livre.est_disponible():
-        raise ErreurConflit("Ce livre n'est pas disponible pour l'emprunt")
-    
     # Créer l'emprunt
-    duree_emprunt = donnees_validees.get('duree_emprunt', 14)  # Défaut: 14 jours
-    nouvel_emprunt = Emprunt(
-        utilisateur_id=utilisateur_actuel.id,
-        livre_id=livre.id,
-        duree_emprunt=duree_emprunt
-    )
+    nouvel_emprunt = loan_service.creer_emprunt(utilisateur_actuel.id, donnees_validees)
+
+    return jsonify({
+        'statut': 'succes',
+        'message': 'Livre emprunté avec succès',
+        'emprunt': nouvel_emprunt
+    }), 201
+
+@loan_bp.route('/batch', methods=['POST'])
+@token_requis
+def creer_emprunts_lot(utilisateur_actuel):
+    """Endpoint pour emprunter plusieurs livres en une requête"""
+    donnees = request.get_json()
     
-    # Mettre à jour la disponibilité du livre
-    livre.disponible -= 1
+    # Valider les données
+    donnees_validees = valider_donnees_requete(SchemaCreationEmpruntsLot, donnees)
+    if 'erreurs' in donnees_validees:
+        return jsonify({'statut': 'erreur', 'erreurs': donnees_validees['erreurs']}), 400
     
-    # Sauvegarder les changements
-    ajouter_a_db(nouvel_emprunt)
-    valider_changements()
+    resultat = loan_service.creer_emprunts_lot(
+        utilisateur_actuel.id,
+        donnees_validees['livre_ids'],
+        donnees_validees.get('duree_emprunt', 14),
+        donnees_validees['tout_ou_rien']
+    )
     
     return jsonify({
         'statut': 'succes',
-        'message': 'Livre emprunté avec succès',
-        'emprunt': nouvel_emprunt.vers_dict()
+        'message': f"{resultat['emprunts_crees']} livre(s) emprunté(s) avec succès",
+        'resultats': resultat['resultats']
     }), 201
 
 @loan_bp.route('/active', methods=['GET'])
 @token_requis
 def obtenir_emprunts_actifs(utilisateur_actuel):
     """Endpoint pour obtenir les emprunts actifs de l'utilisateur"""
-    page = request.args.get('page', 1, type=int)
-    par_page = request.args.get('par_page', 10, type=int)
+    pagination = parametres_pagination()
     
     # Obtenir les emprunts actifs (non retournés)
     requete = Emprunt.query.filter_by(
@@ -61,91 +66,81 @@ def obtenir_emprunts_actifs(utilisateur_actuel):
         date_retour_effective=None
     )
     
-    resultat = paginer_resultats(requete, page, par_page)
+    resultat = paginer_resultats(requete, cles_tri=(Emprunt.date_emprunt, Emprunt.id), descendant=True, **pagination)
     
     return jsonify({
         'statut': 'succes',
         'emprunts': [emprunt.vers_dict() for emprunt in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'pagination': pagination_vers_dict(resultat)
     }), 200
 
 @loan_bp.route('/history', methods=['GET'])
 @token_requis
 def obtenir_historique_emprunts(utilisateur_actuel):
     """Endpoint pour obtenir l'historique des emprunts de l'utilisateur"""
-    page = request.args.get('page', 1, type=int)
-    par_page = request.args.get('par_page', 10, type=int)
+    pagination = parametres_pagination()
     
     # Obtenir tous les emprunts de l'utilisateur
     requete = Emprunt.query.filter_by(utilisateur_id=utilisateur_actuel.id)
     
-    resultat = paginer_resultats(requete, page, par_page)
+    resultat = paginer_resultats(requete, cles_tri=(Emprunt.date_emprunt, Emprunt.id), descendant=True, **pagination)
     
     return jsonify({
         'statut': 'succes',
         'emprunts': [emprunt.vers_dict() for emprunt in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'pagination': pagination_vers_dict(resultat)
     }), 200
 
-@loan_bp.route('/<int:emprunt_id>/return', methods=['PATCH'])
+@loan_bp.route('/return-batch', methods=['PATCH'])
 @token_requis
-def retourner_livre(utilisateur_actuel, emprunt_id):
-    """Endpoint pour retourner un livre emprunté"""
-    # Obtenir l'emprunt
-    emprunt = obtenir_ou_404(Emprunt, emprunt_id, "Emprunt non trouvé")
-    
-    # Vérifier si l'utilisateur est autorisé à retourner ce livre
-    if emprunt.utilisateur_id != utilisateur_actuel.id and not utilisateur_actuel.est_admin:
-        return jsonify({
-            'statut': 'erreur',
-            'message': 'Vous n\'êtes pas autorisé à retourner ce livre'
-        }), 403
-    
-    # Vérifier si le livre a déjà été retourné
-    if emprunt.est_retourne():
-        return jsonify({
-            'statut': 'erreur',
-            'message': 'Ce livre a déjà été retourné'
-        }), 400
-    
-    # Obtenir le livre
-    livre = obtenir_ou_404(Livre, emprunt.livre_id, "Livre non trouvé")
-    
-    # Marquer le livre comme retourné
-    emprunt.retourner_livre()
+def retourner_livres_lot(utilisateur_actuel):
+    """Endpoint pour retourner plusieurs livres en une requête"""
+    donnees = request.get_json()
     
-    # Mettre à jour la disponibilité du livre
-    livre.disponible += 1
+    # Valider les données
+    donnees_validees = valider_donnees_requete(SchemaRetourEmpruntsLot, donnees)
+    if 'erreurs' in donnees_validees:
+        return jsonify({'statut': 'erreur', 'erreurs': donnees_validees['erreurs']}), 400
     
-    # Sauvegarder les changements
-    valider_changements()
+    resultat = loan_service.retourner_emprunts_lot(
+        utilisateur_actuel.id,
+        donnees_validees['emprunt_ids'],
+        donnees_validees['tout_ou_rien']
+    )
     
+    return jsonify({
+        'statut': 'succes',
+        'message': f"{resultat['emprunts_retournes']} livre(s) retourné(s) avec succès",
+        'resultats': resultat['resultats']
+    }), 200
+
+@loan_bp.route('/<int:emprunt_id>/return', methods=['PATCH'])
+@token_requis
+def retourner_livre(utilisateur_actuel, emprunt_id):
+    """Endpoint pour retourner un livre emprunté"""
+    emprunt = loan_service.retourner_livre(emprunt_id, utilisateur_actuel.id)
+
     return jsonify({
         'statut': 'succes',
         'message': 'Livre retourné avec succès',
-        'emprunt': emprunt.vers_dict()
+        'emprunt': emprunt
     }), 200
 
+@loan_bp.route('/export', methods=['GET'])
+@admin_requis
+def exporter_emprunts(utilisateur_actuel):
+    """Endpoint pour exporter les emprunts en NDJSON ou CSV (admin seulement)"""
+    format_fichier = format_export(request.args.get('format'))
+    actif_seulement = request.args.get('actif_seulement', 'false').lower() == 'true'
+
+    flux = loan_service.exporter_emprunts(format_fichier, actif_seulement)
+    return reponse_export(flux, format_fichier, 'emprunts')
+
 @loan_bp.route('', methods=['GET'])
 @admin_requis
 def obtenir_tous_emprunts(utilisateur_actuel):
     """Endpoint pour obtenir tous les emprunts (admin seulement)"""
-    page = request.args.get('page', 1, type=int)
-    par_page = request.args.get('par_page', 10, type=int)
+    pagination = parametres_pagination()
     actif_seulement = request.args.get('actif_seulement', 'false').lower() == 'true'
     
     # Filtrer les emprunts
@@ -153,17 +148,11 @@ def obtenir_tous_emprunts(utilisateur_actuel):
     if actif_seulement:
         requete = requete.filter_by(date_retour_effective=None)
     
-    resultat = paginer_resultats(requete, page, par_page)
+    resultat = paginer_resultats(requete, cles_tri=(Emprunt.date_emprunt, Emprunt.id), descendant=True,
+                                 compteur='emprunts_actifs' if actif_seulement else 'emprunts', **pagination)
     
     return jsonify({
         'statut': 'succes',
         'emprunts': [emprunt.vers_dict() for emprunt in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'pagination': pagination_vers_dict(resultat)
     }), 200
\ No newline at end of file
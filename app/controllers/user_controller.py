@@ -2,8 +2,9 @@ from flask import Blueprint, request, jsonify
 from app.models.user import Utilisateur
 from app.utils.validation import SchemaMiseAJourUtilisateur, SchemaMiseAJourRoleUtilisateur, SchemaMiseAJourStatutUtilisateur, valider_donnees_requete
 from app.utils.security import token_requis, admin_requis
-from app.utils.database import obtenir_ou_404, valider_changements, paginer_resultats
-from app.utils.error_handler import ErreurRequeteInvalide, ErreurNonTrouve, ErreurConflit
+from app.utils.database import paginer_resultats, pagination_vers_dict, parametres_pagination
+from app.utils.exportation import format_export, reponse_export
+from app.services import user_service
 
 user_bp = Blueprint('users', __name__)
 
@@ -27,63 +28,63 @@ def mettre_a_jour_profil(utilisateur_actuel):
     if 'erreurs' in donnees_validees:
         return jsonify({'statut': 'erreur', 'erreurs': donnees_validees['erreurs']}), 400
     
-    # Mettre à jour les champs
-    if 'prenom' in donnees_validees:
-        utilisateur_actuel.prenom = donnees_validees['prenom']
-    if 'nom' in donnees_validees:
-        utilisateur_actuel.nom = donnees_validees['nom']
-    if 'email' in donnees_validees:
-        # Vérifier si l'email est déjà utilisé par un autre utilisateur
-        utilisateur_existant = Utilisateur.query.filter_by(email=donnees_validees['email']).first()
-        if utilisateur_existant and utilisateur_existant.id != utilisateur_actuel.id:
-            raise ErreurConflit("Cet email est déjà utilisé par un autre utilisateur")
-        utilisateur_actuel.email = donnees_validees['email']
-    if 'mot_de_passe' in donnees_validees:
-        utilisateur_actuel.mot_de_passe = donnees_validees['mot_de_passe']
-    
-    valider_changements()
+    # Mettre à jour le profil
+    utilisateur = user_service.mettre_a_jour_profil(utilisateur_actuel.id, donnees_validees)
     
     return jsonify({
         'statut': 'succes',
         'message': 'Profil mis à jour avec succès',
-        'utilisateur': utilisateur_actuel.vers_dict()
+        'utilisateur': utilisateur
     }), 200
 
 @user_bp.route('', methods=['GET'])
 @admin_requis
 def obtenir_utilisateurs(utilisateur_actuel):
     """Endpoint pour obtenir la liste des utilisateurs (admin seulement)"""
-    page = request.args.get('page', 1, type=int)
-    par_page = request.args.get('par_page', 10, type=int)
+    pagination = parametres_pagination()
     
     # Obtenir les utilisateurs paginés
-    resultat = paginer_resultats(Utilisateur.query, page, par_page)
+    resultat = paginer_resultats(Utilisateur.query, cles_tri=(Utilisateur.nom, Utilisateur.id), table='utilisateurs', **pagination)
     
     return jsonify({
         'statut': 'succes',
         'utilisateurs': [utilisateur.vers_dict() for utilisateur in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'pagination': pagination_vers_dict(resultat)
     }), 200
 
-@user_bp.route('/<int:utilisateur_id>/role', methods=['PUT'])
+@user_bp.route('/export', methods=['GET'])
 @admin_requis
-def mettre_a_jour_role(utilisateur_actuel, utilisateur_id):
-    """Endpoint pour mettre à jour le rôle d'un utilisateur (admin seulement)"""
-    # Vérifier si l'utilisateur essaie de modifier son propre rôle
-    if utilisateur_id == utilisateur_actuel.id:
+def exporter_utilisateurs(utilisateur_actuel):
+    """Endpoint pour exporter tous les utilisateurs en NDJSON ou CSV (admin seulement)"""
+    format_fichier = format_export(request.args.get('format'))
+
+    return reponse_export(user_service.exporter_utilisateurs(format_fichier), format_fichier, 'utilisateurs')
+
+@user_bp.route('/search', methods=['GET'])
+@admin_requis
+def rechercher_utilisateurs(utilisateur_actuel):
+    """Endpoint pour rechercher des utilisateurs par nom, prénom ou email (admin seulement)"""
+    terme = request.args.get('terme', '')
+    pagination = parametres_pagination()
+
+    if not terme:
         return jsonify({
             'statut': 'erreur',
-            'message': 'Vous ne pouvez pas modifier votre propre rôle'
+            'message': 'Le paramètre de recherche "terme" est requis'
         }), 400
-    
-    utilisateur = obtenir_ou_404(Utilisateur, utilisateur_id, "Utilisateur non trouvé")
+
+    resultat = user_service.rechercher_utilisateurs(terme, **pagination)
+
+    return jsonify({
+        'statut': 'succes',
+        'utilisateurs': resultat['utilisateurs'],
+        'pagination': resultat['pagination']
+    }), 200
+
+@user_bp.route('/<int:utilisateur_id>/role', methods=['PUT'])
+@admin_requis
+def mettre_a_jour_role(utilisateur_actuel, utilisateur_id):
+    """Endpoint pour mettre à jour le rôle d'un utilisateur (admin seulement)"""
     donnees = request.get_json()
     
     # Valider les données
@@ -92,27 +93,18 @@ def mettre_a_jour_role(utilisateur_actuel, utilisateur_id):
         return jsonify({'statut': 'erreur', 'erreurs': donnees_validees['erreurs']}), 400
     
     # Mettre à jour le rôle
-    utilisateur.est_admin = donnees_validees['est_admin']
-    valider_changements()
+    utilisateur = user_service.mettre_a_jour_role(utilisateur_id, donnees_validees['est_admin'], utilisateur_actuel.id)
     
     return jsonify({
         'statut': 'succes',
         'message': 'Rôle utilisateur mis à jour avec succès',
-        'utilisateur': utilisateur.vers_dict()
+        'utilisateur': utilisateur
     }), 200
 
 @user_bp.route('/<int:utilisateur_id>/status', methods=['PUT'])
 @admin_requis
 def mettre_a_jour_statut(utilisateur_actuel, utilisateur_id):
     """Endpoint pour activer/désactiver un compte utilisateur (admin seulement)"""
-    # Vérifier si l'utilisateur essaie de modifier son propre statut
-    if utilisateur_id == utilisateur_actuel.id:
-        return jsonify({
-            'statut': 'erreur',
-            'message': 'Vous ne pouvez pas désactiver votre propre compte'
-        }), 400
-    
-    utilisateur = obtenir_ou_404(Utilisateur, utilisateur_id, "Utilisateur non trouvé")
     donnees = request.get_json()
     
     # Valider les données
@@ -121,11 +113,10 @@ def mettre_a_jour_statut(utilisateur_actuel, utilisateur_id):
         return jsonify({'statut': 'erreur', 'erreurs': donnees_validees['erreurs']}), 400
     
     # Mettre à jour le statut
-    utilisateur.est_actif = donnees_validees['est_actif']
-    valider_changements()
+    utilisateur = user_service.mettre_a_jour_statut(utilisateur_id, donnees_validees['est_actif'], utilisateur_actuel.id)
     
     return jsonify({
         'statut': 'succes',
         'message': 'Statut utilisateur mis à jour avec succès',
-        'utilisateur': utilisateur.vers_dict()
+        'utilisateur': utilisateur
     }), 200
\ No newline at end of file
@@ -1,4 +1,8 @@
 # Import all models here to make them available to the ORM
 from app.models.user import Utilisateur
 from app.models.book import Livre
-from app.models.loan import Emprunt
\ No newline at end of file
+from app.models.category import Categorie
+from app.models.loan import Emprunt
+from app.models.token import TokenRevoque
+from app.models.compteur import Compteur
+from app.models.invalidation import Invalidation
\ No newline at end of file
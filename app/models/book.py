@@ -1,9 +1,16 @@
 from datetime import datetime
 from app import db
+from app.utils.serialisation import date_json
 
 class Livre(db.Model):
     """Modèle Livre pour stocker les détails liés au livre"""
     __tablename__ = 'livres'
+    __table_args__ = (
+        db.Index('ix_livres_titre', 'titre', 'id'),
+        db.Index('ix_livres_categorie_id', 'categorie_id'),
+        db.Index('ix_livres_modifie_le', 'modifie_le'),
+        db.CheckConstraint('disponible >= 0 AND disponible <= quantite', name='ck_livres_disponible'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     titre = db.Column(db.String(200), nullable=False)
@@ -13,9 +20,12 @@ class Livre(db.Model):
     quantite = db.Column(db.Integer, default=1)
     disponible = db.Column(db.Integer, default=1)
     cree_le = db.Column(db.DateTime, default=datetime.utcnow)
+    # Mis à jour à chaque écriture, ORM ou UPDATE ensembliste (validateurs HTTP ETag / Last-Modified)
+    modifie_le = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    categorie_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
 
-    # Relation avec les emprunts
-    emprunts = db.relationship('Emprunt', backref='livre', lazy=True, cascade='all, delete-orphan')
+    # Relation avec les emprunts (supprimés par la base : ON DELETE CASCADE, sans chargement)
+    emprunts = db.relationship('Emprunt', backref='livre', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
 
     def __repr__(self):
         return f'<Livre {self.titre} par {self.auteur}>'
@@ -31,8 +41,10 @@ class Livre(db.Model):
             'titre': self.titre,
             'auteur': self.auteur,
             'isbn': self.isbn,
-            'date_publication': self.date_publication.isoformat() if self.date_publication else None,
+            'date_publication': date_json(self.date_publication),
             'quantite': self.quantite,
             'disponible': self.disponible,
-            'cree_le': self.cree_le.isoformat() if self.cree_le else None
+            'categorie_id': self.categorie_id,
+            'cree_le': date_json(self.cree_le),
+            'modifie_le': date_json(self.modifie_le)
         }
@@ -1,5 +1,9 @@
 from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import column_property
 from app import db
+from app.utils.serialisation import date_json
+from app.models.book import Livre
 
 class Categorie(db.Model):
     """Modèle Categorie pour stocker les détails liés aux catégories de livres"""
@@ -9,9 +13,16 @@ class Categorie(db.Model):
     nom = db.Column(db.String(50), nullable=False, unique=True)
     description = db.Column(db.String(200))
     cree_le = db.Column(db.DateTime, default=datetime.utcnow)
+    modifie_le = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    # Relation avec les livres
-    livres = db.relationship('Livre', backref='categorie', lazy=True)
+    # Relation avec les livres (détachés par un UPDATE avant la suppression, sans chargement)
+    livres = db.relationship('Livre', backref='categorie', lazy=True, passive_deletes=True)
+
+    # Nombre de livres calculé par sous-requête corrélée, chargé avec la catégorie
+    # (servi par l'index ix_livres_categorie_id, sans charger les livres)
+    nombre_livres = column_property(
+        select(func.count(Livre.id)).where(Livre.categorie_id == id).correlate_except(Livre).scalar_subquery()
+    )
 
     def __repr__(self):
         return f'<Categorie {self.nom}>'
@@ -22,6 +33,7 @@ class Categorie(db.Model):
             'id': self.id,
             'nom': self.nom,
             'description': self.description,
-            'cree_le': self.cree_le.isoformat() if self.cree_le else None,
-            'nombre_livres': len(self.livres)
-        }
\ No newline at end of file
+            'cree_le': date_json(self.cree_le),
+            'modifie_le': date_json(self.modifie_le),
+            'nombre_livres': self.nombre_livres
+        }
@@ -0,0 +1,11 @@
+from app import db
+
+class Compteur(db.Model):
+    """Modèle Compteur pour stocker les totaux maintenus lors des écritures"""
+    __tablename__ = 'compteurs'
+
+    nom = db.Column(db.String(50), primary_key=True)
+    valeur = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<Compteur {self.nom}={self.valeur}>'
@@ -0,0 +1,13 @@
+from datetime import datetime
+from app import db
+
+class Invalidation(db.Model):
+    """Modèle Invalidation : journal des messages du bus d'invalidation, lu par sondage sans LISTEN/NOTIFY"""
+    __tablename__ = 'invalidations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    message = db.Column(db.Text, nullable=False)
+    cree_le = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<Invalidation {self.id}>'
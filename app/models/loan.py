@@ -1,13 +1,28 @@
 from datetime import datetime, timedelta
 from app import db
+from app.utils.serialisation import date_json
 
 class Emprunt(db.Model):
     """Modèle Emprunt pour stocker les détails liés à l'emprunt"""
     __tablename__ = 'emprunts'
+    __table_args__ = (
+        # Emprunts actifs d'un utilisateur (filter_by(utilisateur_id=..., date_retour_effective=None))
+        db.Index('ix_emprunts_utilisateur_actifs', 'utilisateur_id',
+                 postgresql_where=db.text('date_retour_effective IS NULL'),
+                 sqlite_where=db.text('date_retour_effective IS NULL')),
+        # Historique d'un utilisateur, trié par date d'emprunt
+        db.Index('ix_emprunts_utilisateur_date', 'utilisateur_id', 'date_emprunt', 'id'),
+        # Emprunts en retard et rappels (date_retour_prevue < ... AND date_retour_effective IS NULL)
+        db.Index('ix_emprunts_retard', 'date_retour_prevue',
+                 postgresql_where=db.text('date_retour_effective IS NULL'),
+                 sqlite_where=db.text('date_retour_effective IS NULL')),
+        db.Index('ix_emprunts_livre_id', 'livre_id'),
+        db.Index('ix_emprunts_date_emprunt', 'date_emprunt', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    utilisateur_id = db.Column(db.Integer, db.ForeignKey('utilisateurs.id'), nullable=False)
-    livre_id = db.Column(db.Integer, db.ForeignKey('livres.id'), nullable=False)
+    utilisateur_id = db.Column(db.Integer, db.ForeignKey('utilisateurs.id', ondelete='CASCADE'), nullable=False)
+    livre_id = db.Column(db.Integer, db.ForeignKey('livres.id', ondelete='CASCADE'), nullable=False)
     date_emprunt = db.Column(db.DateTime, default=datetime.utcnow)
     date_retour_prevue = db.Column(db.DateTime, nullable=False)
     date_retour_effective = db.Column(db.DateTime, nullable=True)
@@ -49,9 +64,9 @@ class Emprunt(db.Model):
             'id': self.id,
             'utilisateur_id': self.utilisateur_id,
             'livre_id': self.livre_id,
-            'date_emprunt': self.date_emprunt.isoformat() if self.date_emprunt else None,
-            'date_retour_prevue': self.date_retour_prevue.isoformat() if self.date_retour_prevue else None,
-            'date_retour_effective': self.date_retour_effective.isoformat() if self.date_retour_effective else None,
+            'date_emprunt': date_json(self.date_emprunt),
+            'date_retour_prevue': date_json(self.date_retour_prevue),
+            'date_retour_effective': date_json(self.date_retour_effective),
             'est_retourne': self.est_retourne(),
             'est_en_retard': self.est_en_retard(),
             'jours_de_retard': self.jours_de_retard() if self.est_en_retard() else 0
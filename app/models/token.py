@@ -0,0 +1,13 @@
+from datetime import datetime
+from app import db
+
+class TokenRevoque(db.Model):
+    """Modèle TokenRevoque pour stocker les JWT révoqués jusqu'à leur expiration"""
+    __tablename__ = 'tokens_revoques'
+
+    jti = db.Column(db.String(36), primary_key=True)
+    expire_le = db.Column(db.DateTime, nullable=False, index=True)
+    revoque_le = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<TokenRevoque {self.jti}>'
@@ -1,9 +1,25 @@
 from datetime import datetime
-from app import db, bcrypt
+from sqlalchemy import event
+from app import db
+from app.utils.serialisation import date_json
+from app.utils import hachage
+from app.utils.texte import normaliser
 
 class Utilisateur(db.Model):
     """Modèle Utilisateur pour stocker les détails liés à l'utilisateur"""
     __tablename__ = 'utilisateurs'
+    __table_args__ = (
+        db.Index('ix_utilisateurs_nom', 'nom', 'id'),
+        # Recherche par préfixe (LIKE 'terme%') sur la colonne normalisée et l'email en minuscules
+        db.Index('ix_utilisateurs_recherche', 'recherche', postgresql_ops={'recherche': 'varchar_pattern_ops'}),
+        db.Index('ix_utilisateurs_email_minuscule', db.func.lower(db.text('email')).label('email_minuscule'),
+                 postgresql_ops={'email_minuscule': 'varchar_pattern_ops'}),
+        # « nom email » (recherche sans le prénom) : début du nom pour les termes courts
+        db.Index('ix_utilisateurs_recherche_nom',
+                 db.text("substr(recherche, instr(recherche, ' ') + 1)")).ddl_if(dialect='sqlite'),
+        db.Index('ix_utilisateurs_recherche_nom',
+                 db.text("substr(recherche, strpos(recherche, ' ') + 1) varchar_pattern_ops")).ddl_if(dialect='postgresql'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     prenom = db.Column(db.String(50), nullable=False)
@@ -14,9 +30,11 @@ class Utilisateur(db.Model):
     est_actif = db.Column(db.Boolean, default=True)
     est_admin = db.Column(db.Boolean, default=False)
     derniere_connexion = db.Column(db.DateTime, nullable=True)
+    # « prénom nom email » en minuscules et sans accents, maintenu à chaque écriture
+    recherche = db.Column(db.String(230), nullable=True)
 
-    # Relation avec les emprunts
-    emprunts = db.relationship('Emprunt', backref='utilisateur', lazy=True, cascade='all, delete-orphan')
+    # Relation avec les emprunts (supprimés par la base : ON DELETE CASCADE, sans chargement)
+    emprunts = db.relationship('Emprunt', backref='utilisateur', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
 
     @property
     def mot_de_passe(self):
@@ -26,11 +44,19 @@ class Utilisateur(db.Model):
     @mot_de_passe.setter
     def mot_de_passe(self, mot_de_passe):
         """Définir le mot de passe haché"""
-        self.mot_de_passe_hash = bcrypt.generate_password_hash(mot_de_passe).decode('utf-8')
+        self.mot_de_passe_hash = hachage.hacher_mot_de_passe(mot_de_passe)
 
     def verifier_mot_de_passe(self, mot_de_passe):
         """Vérifier si le mot de passe correspond au mot de passe haché"""
-        return bcrypt.check_password_hash(self.mot_de_passe_hash, mot_de_passe)
+        return hachage.verifier_mot_de_passe(self.mot_de_passe_hash, mot_de_passe)
+
+    def hash_a_actualiser(self):
+        """Vérifier si le hash a été calculé avec un autre facteur de coût que celui configuré"""
+        return hachage.cout_du_hash(self.mot_de_passe_hash) != hachage.cout_configure()
+
+    def actualiser_recherche(self):
+        """Recalculer la colonne de recherche normalisée"""
+        self.recherche = texte_de_recherche(self.prenom, self.nom, self.email)
 
     def __repr__(self):
         return f'<Utilisateur {self.email}>'
@@ -42,8 +68,19 @@ class Utilisateur(db.Model):
             'prenom': self.prenom,
             'nom': self.nom,
             'email': self.email,
-            'cree_le': self.cree_le.isoformat() if self.cree_le else None,
+            'cree_le': date_json(self.cree_le),
             'est_actif': self.est_actif,
             'est_admin': self.est_admin,
-            'derniere_connexion': self.derniere_connexion.isoformat() if self.derniere_connexion else None
+            'derniere_connexion': date_json(self.derniere_connexion)
         }
+
+
+def texte_de_recherche(prenom, nom, email):
+    """Texte normalisé sur lequel porte la recherche d'utilisateurs"""
+    return f"{normaliser(prenom).strip()} {normaliser(nom).strip()} {(email or '').strip().lower()}"
+
+
+@event.listens_for(Utilisateur, 'before_insert')
+@event.listens_for(Utilisateur, 'before_update')
+def _actualiser_recherche(mapper, connexion, utilisateur):
+    utilisateur.actualiser_recherche()
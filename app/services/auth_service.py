@@ -1,11 +1,14 @@
-from datetime import datetime
+from datetime import datetime, timezone
+from flask import current_app
 from app.models.user import Utilisateur
-from app.utils.database import ajouter_a_db, obtenir_par_champ_ou_404, verifier_unique_ou_409, valider_changements
+from app.utils.database import ajouter_a_db, obtenir_par_champ_ou_404, verifier_unique_ou_409, valider_changements, transactionnel
 from app.utils.security import generer_tokens, revoquer_token
 from app.utils.error_handler import ErreurNonAutorise, ErreurValidation, ErreurRequeteInvalide
 from app.utils.validation import valider_email_utilisateur
+from app.utils.serialisation import date_json
 from flask_jwt_extended import get_jwt, get_jwt_identity, create_access_token
 
+@transactionnel
 def inscrire_utilisateur(donnees):
     """Inscrire un nouvel utilisateur"""
     # Valider le format de l'email
@@ -33,6 +36,7 @@ def inscrire_utilisateur(donnees):
 
     return nouvel_utilisateur.vers_dict()
 
+@transactionnel
 def connecter_utilisateur(donnees):
     """Authentifier un utilisateur et générer des tokens"""
     # Obtenir l'utilisateur par email
@@ -50,15 +54,28 @@ def connecter_utilisateur(donnees):
     if not utilisateur.est_actif:
         raise ErreurNonAutorise("Compte désactivé")
 
-    # Mettre à jour la dernière connexion
-    utilisateur.derniere_connexion = datetime.utcnow()
-    valider_changements()
+    # Recalculer le hash si le facteur de coût configuré a changé
+    if utilisateur.hash_a_actualiser():
+        utilisateur.mot_de_passe = donnees.get('mot_de_passe')
+        valider_changements()
+
+    # Mettre à jour la dernière connexion (par lots si l'écriture différée est activée)
+    maintenant = datetime.utcnow()
+    tampon = current_app.extensions.get('derniere_connexion')
+    if tampon is not None:
+        tampon.enregistrer(utilisateur.id, maintenant)
+        donnees_utilisateur = utilisateur.vers_dict()
+        donnees_utilisateur['derniere_connexion'] = date_json(maintenant)
+    else:
+        utilisateur.derniere_connexion = maintenant
+        valider_changements()
+        donnees_utilisateur = utilisateur.vers_dict()
 
     # Générer des tokens
     tokens = generer_tokens(utilisateur.id)
 
     return {
-        'utilisateur': utilisateur.vers_dict(),
+        'utilisateur': donnees_utilisateur,
         'tokens': tokens
     }
 
@@ -81,13 +98,14 @@ def rafraichir_token():
 
 def deconnecter_utilisateur():
     """Révoquer le token actuel"""
-    jti = get_jwt()['jti']
-    revoquer_token(jti)
+    donnees_jwt = get_jwt()
+    revoquer_token(donnees_jwt['jti'], datetime.fromtimestamp(donnees_jwt['exp'], timezone.utc))
 
     return {
         'message': 'Déconnexion réussie'
     }
 
+@transactionnel
 def changer_mot_de_passe(utilisateur, donnees):
     """Changer le mot de passe de l'utilisateur"""
     # Vérifier le mot de passe actuel
@@ -1,8 +1,27 @@
+from itertools import islice
+from flask import current_app
+from marshmallow import ValidationError
+from sqlalchemy import exists, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from app import db
 from app.models.book import Livre
-from app.utils.database import ajouter_a_db, obtenir_ou_404, supprimer_de_db, valider_changements, paginer_resultats
+from app.models.category import Categorie
+from app.models.loan import Emprunt
+from app.utils.database import ajouter_a_db, obtenir_ou_404, supprimer_de_db, valider_changements, transactionnel, apres_validation, paginer_resultats, paginer_identifiants, pagination_vers_dict, decoder_curseur
 from app.utils.error_handler import ErreurRequeteInvalide, ErreurNonTrouve, ErreurConflit
+from app.utils.comptage import ajuster_compteur, lire_compteur
+from app.utils.conditionnel import calculer_etag
+from app.utils.recherche import obtenir_moteur_recherche
+from app.utils.index_livres import obtenir_index_livres
+from app.utils.texte import decouper
+from app.utils.validation import SchemaLivre
+from app.utils.exportation import flux_export
+from app.utils.suggestions import obtenir_suggestions, suggerer_en_base
+from app.utils.bus_invalidation import publier_invalidation
+from app.utils.cache_reponses import invalider_cache, etiquette_livre, etiquette_categorie, LISTE_LIVRES, CATEGORIES
 from datetime import datetime
 
+@transactionnel
 def creer_livre(donnees):
     """Créer un nouveau livre"""
     # Vérifier si l'ISBN existe déjà
@@ -18,36 +37,69 @@ def creer_livre(donnees):
         date_publication=donnees.get('date_publication'),
         quantite=donnees.get('quantite', 1),
         disponible=donnees.get('quantite', 1),
+        categorie_id=_categorie_existante(donnees.get('categorie_id')),
         cree_le=datetime.utcnow()
     )
     
+    ajuster_compteur('livres', 1)
     ajouter_a_db(nouveau_livre)
+    _indexer(nouveau_livre)
+    invalider_cache(LISTE_LIVRES, CATEGORIES, *_etiquettes_categories(nouveau_livre.categorie_id))
     
     return nouveau_livre.vers_dict()
 
+def _etiquettes_categories(*categorie_ids):
+    """Étiquettes du cache des réponses des catégories données (None ignoré)"""
+    return [etiquette_categorie(categorie_id) for categorie_id in categorie_ids if categorie_id is not None]
+
+def _categorie_existante(categorie_id):
+    """Vérifier que la catégorie référencée existe (None pour un livre sans catégorie)"""
+    if categorie_id is not None:
+        obtenir_ou_404(Categorie, categorie_id, "Catégorie non trouvée")
+    return categorie_id
+
+def _indexer(livre):
+    """Répercuter un livre créé ou modifié dans les structures en mémoire, une fois validé"""
+    copie = Livre(id=livre.id, titre=livre.titre, auteur=livre.auteur, isbn=livre.isbn)
+    for index in (obtenir_index_livres(), obtenir_suggestions()):
+        if index is not None:
+            apres_validation(lambda index=index: index.mettre_a_jour(copie))
+
 def obtenir_livre(livre_id):
     """Obtenir les détails d'un livre par ID"""
     livre = obtenir_ou_404(Livre, livre_id, "Livre non trouvé")
     return livre.vers_dict()
 
-def obtenir_livres(page=1, par_page=10):
-    """Obtenir la liste des livres paginée"""
-    resultat = paginer_resultats(Livre.query, page, par_page)
+def validateurs_livre(livre_id):
+    """ETag et date de dernière modification d'un livre, lus sans charger la ligne"""
+    modifie_le = db.session.execute(select(Livre.modifie_le).where(Livre.id == livre_id)).first()
+    if modifie_le is None:
+        raise ErreurNonTrouve("Livre non trouvé")
+    return calculer_etag('livre', livre_id, modifie_le[0]), modifie_le[0]
+
+def validateurs_livres():
+    """ETag et date de dernière modification du catalogue
+
+    Le compteur maintenu de livres détecte les suppressions, la date de
+    modification la plus récente (indexée) les créations et mises à jour.
+    """
+    derniere_modification = db.session.execute(select(func.max(Livre.modifie_le))).scalar()
+    return calculer_etag('livres', lire_compteur('livres'), derniere_modification), derniere_modification
+
+def obtenir_livres(page=1, par_page=10, curseur=None, avec_total=False):
+    """Obtenir la liste des livres paginée (par numéro de page ou par curseur)"""
+    resultat = paginer_resultats(Livre.query, page, par_page, curseur=curseur,
+                                 cles_tri=(Livre.titre, Livre.id), avec_total=avec_total, compteur='livres')
     return {
         'livres': [livre.vers_dict() for livre in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'pagination': pagination_vers_dict(resultat)
     }
 
+@transactionnel
 def mettre_a_jour_livre(livre_id, donnees):
     """Mettre à jour les détails d'un livre"""
     livre = obtenir_ou_404(Livre, livre_id, "Livre non trouvé")
+    ancienne_categorie_id = livre.categorie_id
     
     # Vérifier si l'ISBN est déjà utilisé par un autre livre
     if 'isbn' in donnees and donnees['isbn'] != livre.isbn:
@@ -64,51 +116,229 @@ def mettre_a_jour_livre(livre_id, donnees):
         livre.isbn = donnees['isbn']
     if 'date_publication' in donnees:
         livre.date_publication = donnees['date_publication']
+    if 'categorie_id' in donnees:
+        livre.categorie_id = _categorie_existante(donnees['categorie_id'])
     if 'quantite' in donnees:
-        # Calculer la différence pour mettre à jour disponible
+        # Les exemplaires empruntés ne peuvent pas être retirés du stock
+        if donnees['quantite'] < livre.quantite - livre.disponible:
+            raise ErreurConflit("La quantité ne peut pas être inférieure au nombre d'exemplaires empruntés")
+        # Calculer la différence pour mettre à jour disponible, en SQL pour ne pas
+        # écraser un emprunt ou un retour simultané
         difference = donnees['quantite'] - livre.quantite
         livre.quantite = donnees['quantite']
-        livre.disponible += difference
+        livre.disponible = Livre.disponible + difference
     
     valider_changements()
+    _indexer(livre)
+    
+    # Les pages contenant le livre portent son étiquette ; un changement de titre,
+    # d'auteur ou d'ISBN peut aussi le faire entrer dans d'autres pages ou recherches
+    etiquettes = [etiquette_livre(livre_id), *_etiquettes_categories(ancienne_categorie_id, livre.categorie_id)]
+    if set(donnees) - {'quantite'}:
+        etiquettes.append(LISTE_LIVRES)
+    if livre.categorie_id != ancienne_categorie_id:
+        etiquettes.append(CATEGORIES)
+    invalider_cache(*etiquettes)
     
     return livre.vers_dict()
 
+@transactionnel
 def supprimer_livre(livre_id):
     """Supprimer un livre"""
     livre = obtenir_ou_404(Livre, livre_id, "Livre non trouvé")
     
-    # Vérifier si le livre a des emprunts actifs
-    emprunts_actifs = [e for e in livre.emprunts if not e.est_retourne()]
+    # Vérifier si le livre a des emprunts actifs, sans charger son historique
+    emprunts_actifs = db.session.query(exists().where(
+        Emprunt.livre_id == livre_id, Emprunt.date_retour_effective == None
+    )).scalar()
     if emprunts_actifs:
         raise ErreurRequeteInvalide("Impossible de supprimer un livre avec des emprunts actifs")
     
+    # Les emprunts historiques du livre sont supprimés en cascade par la base (ON DELETE CASCADE)
+    nombre_emprunts = db.session.query(func.count(Emprunt.id)).filter(Emprunt.livre_id == livre_id).scalar()
+    ajuster_compteur('livres', -1)
+    ajuster_compteur('emprunts', -nombre_emprunts)
+    categorie_id = livre.categorie_id
     supprimer_de_db(livre)
+    for index in (obtenir_index_livres(), obtenir_suggestions()):
+        if index is not None:
+            apres_validation(lambda index=index: index.supprimer(livre_id))
+    invalider_cache(etiquette_livre(livre_id), LISTE_LIVRES, CATEGORIES, *_etiquettes_categories(categorie_id))
     
     return {"message": "Livre supprimé avec succès"}
 
-def rechercher_livres(terme, page=1, par_page=10):
-    """Rechercher des livres par titre, auteur ou ISBN"""
+def rechercher_livres(terme, page=1, par_page=10, curseur=None, avec_total=False):
+    """Rechercher des livres par titre, auteur ou ISBN
+
+    Les résultats sont triés par pertinence, ou par identifiant lorsque l'index
+    en mémoire est activé : un worker dont l'index n'est pas encore construit
+    trie alors de la même façon, et les curseurs restent valables d'un worker à l'autre.
+    """
     if not terme:
         raise ErreurRequeteInvalide("Le terme de recherche est requis")
     
-    # Rechercher les livres
-    requete = Livre.query.filter(
-        (Livre.titre.ilike(f'%{terme}%')) |
-        (Livre.auteur.ilike(f'%{terme}%')) |
-        (Livre.isbn.ilike(f'%{terme}%'))
-    )
+    # Un curseur [id] est servi dans l'ordre des identifiants, un curseur (rang, id) par pertinence
+    index = obtenir_index_livres()
+    valeurs = decoder_curseur(curseur) if curseur else None
+    par_identifiant = len(valeurs) == 1 if valeurs is not None else index is not None
+    
+    # Servir la recherche depuis l'index en mémoire lorsqu'il est construit
+    if index is not None and par_identifiant:
+        ids = index.rechercher(terme)
+        if ids is not None:
+            resultat = paginer_identifiants(Livre, ids, page, par_page, curseur=curseur, avec_total=avec_total)
+            return {
+                'livres': [livre.vers_dict() for livre in resultat['elements']],
+                'pagination': pagination_vers_dict(resultat)
+            }
+    
+    # Rechercher les livres avec le moteur plein texte de la base
+    requete, rang = obtenir_moteur_recherche().rechercher(terme)
+    cles_tri, descendant = ((Livre.id,), False) if par_identifiant else ((rang, Livre.id), True)
+    if curseur is None:
+        requete = requete.order_by(*[cle.desc() if descendant else cle.asc() for cle in cles_tri])
     
-    resultat = paginer_resultats(requete, page, par_page)
+    resultat = paginer_resultats(requete, page, par_page, curseur=curseur,
+                                 cles_tri=cles_tri, descendant=descendant, avec_total=avec_total)
     
     return {
-        'livres': [livre.vers_dict() for livre in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
-    }
\ No newline at end of file
+        'livres': [livre.vers_dict() for livre, _ in resultat['elements']],
+        'pagination': pagination_vers_dict(resultat)
+    }
+
+def suggerer_livres(terme, limite=10):
+    """Suggestions de titres et d'auteurs pour un début de saisie, par popularité d'emprunt"""
+    suggestions = obtenir_suggestions()
+    resultat = suggestions.suggerer(terme, limite) if suggestions is not None else None
+    if resultat is not None:
+        return resultat
+    
+    # Structure désactivée ou pas encore construite : préfixes de mots sur l'index de recherche
+    return suggerer_en_base(terme, limite)
+
+# Au-delà de ce nombre de livres importés, les structures en mémoire sont reconstruites
+# plutôt que mises à jour livre par livre
+SEUIL_RECONSTRUCTION_INDEX = 100
+
+def _inserer_lot(lot, resultats):
+    """Insérer un lot de lignes validées ; les conflits d'ISBN sont détectés par une seule requête IN"""
+    # Catégories référencées par le lot, vérifiées en une requête comme _categorie_existante
+    categorie_ids = {donnees['categorie_id'] for _, donnees in lot if donnees.get('categorie_id') is not None}
+    categories = set(db.session.execute(
+        select(Categorie.id).where(Categorie.id.in_(categorie_ids))
+    ).scalars()) if categorie_ids else set()
+    valides = []
+    for numero, donnees in lot:
+        if donnees.get('categorie_id') is not None and donnees['categorie_id'] not in categories:
+            resultats.append({'ligne': numero, 'statut': 'invalide',
+                              'erreurs': {'categorie_id': ["Catégorie non trouvée"]}})
+        else:
+            valides.append((numero, donnees))
+    lot = valides
+    
+    ids = {}
+    for tentative in range(2):
+        isbns = [donnees['isbn'] for _, donnees in lot]
+        existants = set(db.session.execute(select(Livre.isbn).where(Livre.isbn.in_(isbns))).scalars()) if isbns else set()
+        a_inserer = [(numero, donnees) for numero, donnees in lot if donnees['isbn'] not in existants]
+        maintenant = datetime.utcnow()
+        lignes = [{
+            'titre': donnees['titre'],
+            'auteur': donnees['auteur'],
+            'isbn': donnees['isbn'],
+            'date_publication': donnees.get('date_publication'),
+            'quantite': donnees.get('quantite', 1),
+            'disponible': donnees.get('quantite', 1),
+            'categorie_id': donnees.get('categorie_id'),
+            'cree_le': maintenant
+        } for _, donnees in a_inserer]
+        if not lignes:
+            break
+        try:
+            # executemany (insertmanyvalues) : une instruction pour tout le lot, dans un point de
+            # sauvegarde pour n'annuler que ce lot en cas de conflit
+            with db.session.begin_nested():
+                ids = dict(db.session.execute(insert(Livre).returning(Livre.isbn, Livre.id), lignes).all())
+                ajuster_compteur('livres', len(lignes))
+            valider_changements()
+            break
+        except IntegrityError:
+            # Un ISBN a été créé entre la vérification et l'insertion : vérifier à nouveau
+            if tentative:
+                raise ErreurConflit("Conflit d'ISBN persistant lors de l'import")
+    
+    for numero, donnees in lot:
+        if donnees['isbn'] in existants:
+            resultats.append({'ligne': numero, 'statut': 'conflit', 'isbn': donnees['isbn'],
+                              'message': "Un livre avec cet ISBN existe déjà"})
+    for (numero, donnees), ligne in zip(a_inserer, lignes):
+        ligne['id'] = ids[donnees['isbn']]
+        resultats.append({'ligne': numero, 'statut': 'cree', 'isbn': donnees['isbn'], 'id': ligne['id']})
+    return lignes
+
+def importer_livres(lignes, taille_lot=None):
+    """Importer des livres en continu, par lots validés avec SchemaLivre
+
+    lignes produit des couples (numéro, données) ; chaque ligne reçoit un
+    résultat : cree, conflit ou invalide.
+    """
+    taille_lot = taille_lot or current_app.config.get('IMPORT_TAILLE_LOT', 1000)
+    schema = SchemaLivre()
+    resultats, importes = [], []
+    isbns_vus = set()
+    lignes = iter(lignes)
+    
+    while True:
+        morceau = list(islice(lignes, taille_lot))
+        if not morceau:
+            break
+        lot = []
+        for numero, donnees in morceau:
+            if isinstance(donnees, str):
+                resultats.append({'ligne': numero, 'statut': 'invalide', 'erreurs': donnees})
+                continue
+            try:
+                donnees_validees = schema.load(donnees)
+            except ValidationError as err:
+                resultats.append({'ligne': numero, 'statut': 'invalide', 'erreurs': err.messages})
+                continue
+            # Un ISBN répété dans le fichier est en conflit avec sa première occurrence
+            if donnees_validees['isbn'] in isbns_vus:
+                resultats.append({'ligne': numero, 'statut': 'conflit', 'isbn': donnees_validees['isbn'],
+                                  'message': "ISBN en double dans le fichier"})
+                continue
+            isbns_vus.add(donnees_validees['isbn'])
+            lot.append((numero, donnees_validees))
+        if lot:
+            importes.extend(_inserer_lot(lot, resultats))
+    
+    for index in (obtenir_index_livres(), obtenir_suggestions()):
+        if index is None or not importes:
+            continue
+        if len(importes) > SEUIL_RECONSTRUCTION_INDEX:
+            apres_validation(index.reconstruire)
+        else:
+            apres_validation(lambda index=index: [index.mettre_a_jour(Livre(**ligne)) for ligne in importes])
+    
+    if importes:
+        # Les insertions en masse échappent au suivi des écritures de la session
+        if len(importes) > SEUIL_RECONSTRUCTION_INDEX:
+            publier_invalidation('livres:*')
+        else:
+            publier_invalidation(*(f"livres:{ligne['id']}" for ligne in importes))
+        invalider_cache(LISTE_LIVRES, CATEGORIES,
+                        *_etiquettes_categories(*{ligne.get('categorie_id') for ligne in importes}))
+    
+    resultats.sort(key=lambda resultat: resultat['ligne'])
+    return {
+        'importes': len(importes),
+        'rejetes': len(resultats) - len(importes),
+        'resultats': resultats
+    }
+
+def exporter_livres(format_fichier):
+    """Flux d'export de tous les livres, dans l'ordre de la liste"""
+    colonnes = (Livre.id, Livre.titre, Livre.auteur, Livre.isbn, Livre.date_publication,
+                Livre.quantite, Livre.disponible, Livre.cree_le)
+    requete = select(*colonnes).order_by(Livre.titre, Livre.id)
+    return flux_export(requete, [colonne.key for colonne in colonnes], format_fichier)
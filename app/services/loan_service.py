@@ -1,37 +1,60 @@
+from collections import Counter
+from sqlalchemy import case, select, update
+from app import db
 from app.models.loan import Emprunt
 from app.models.book import Livre
 from app.models.user import Utilisateur
-from app.utils.database import ajouter_a_db, obtenir_ou_404, valider_changements, paginer_resultats
+from app.utils.database import ajouter_a_db, obtenir_ou_404, valider_changements, transactionnel, apres_validation, paginer_resultats, pagination_vers_dict
 from app.utils.error_handler import ErreurRequeteInvalide, ErreurNonTrouve, ErreurConflit, ErreurInterdit
+from app.utils.comptage import ajuster_compteur
+from app.utils.suggestions import obtenir_suggestions
+from app.utils.exportation import flux_export
+from app.utils.routage import marquer_lecture_primaire
+from app.utils.cache_reponses import invalider_cache, etiquette_livre
 from datetime import datetime
 
+@transactionnel
 def creer_emprunt(utilisateur_id, donnees):
-    """Créer un nouvel emprunt"""
-    # Obtenir l'utilisateur
-    utilisateur = obtenir_ou_404(Utilisateur, utilisateur_id, "Utilisateur non trouvé")
+    """Créer un nouvel emprunt
     
-    # Obtenir le livre
+    L'exemplaire est réservé par un UPDATE conditionnel (disponible > 0) et
+    l'emprunt inséré dans la même transaction, validée une seule fois : deux
+    emprunts simultanés du dernier exemplaire ne peuvent pas réussir tous
+    les deux.
+    """
     livre_id = donnees.get('livre_id')
-    livre = obtenir_ou_404(Livre, livre_id, "Livre non trouvé")
-    
-    # Vérifier si le livre est disponible
-    if not livre.est_disponible():
+    livre_reserve = db.session.execute(
+        update(Livre)
+        .where(Livre.id == livre_id, Livre.disponible > 0)
+        .values(disponible=Livre.disponible - 1)
+        .returning(Livre.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if livre_reserve is None:
+        # Distinguer le livre inexistant du livre indisponible
+        obtenir_ou_404(Livre, livre_id, "Livre non trouvé")
         raise ErreurConflit("Ce livre n'est pas disponible pour l'emprunt")
     
-    # Créer l'emprunt
+    # Créer l'emprunt (l'utilisateur est celui du token, sa clé étrangère est vérifiée par la base)
     duree_emprunt = donnees.get('duree_emprunt', 14)  # Défaut: 14 jours
     nouvel_emprunt = Emprunt(
-        utilisateur_id=utilisateur.id,
-        livre_id=livre.id,
+        utilisateur_id=utilisateur_id,
+        livre_id=livre_id,
         duree_emprunt=duree_emprunt
     )
+    db.session.add(nouvel_emprunt)
+    ajuster_compteur('emprunts', 1)
+    ajuster_compteur('emprunts_actifs', 1)
     
-    # Mettre à jour la disponibilité du livre
-    livre.disponible -= 1
-    
-    # Sauvegarder les changements
-    ajouter_a_db(nouvel_emprunt)
+    # Sauvegarder les changements en une seule transaction
     valider_changements()
+    apres_validation(lambda: marquer_lecture_primaire(utilisateur_id))
+    invalider_cache(etiquette_livre(livre_id))
+    
+    # La popularité d'emprunt pondère les suggestions de saisie
+    suggestions = obtenir_suggestions()
+    if suggestions is not None:
+        apres_validation(lambda: suggestions.enregistrer_emprunts(livre_id))
     
     return nouvel_emprunt.vers_dict()
 
@@ -40,7 +63,7 @@ def obtenir_emprunt(emprunt_id):
     emprunt = obtenir_ou_404(Emprunt, emprunt_id, "Emprunt non trouvé")
     return emprunt.vers_dict()
 
-def obtenir_emprunts_utilisateur(utilisateur_id, actifs_seulement=False, page=1, par_page=10):
+def obtenir_emprunts_utilisateur(utilisateur_id, actifs_seulement=False, page=1, par_page=10, curseur=None, avec_total=False):
     """Obtenir les emprunts d'un utilisateur"""
     # Obtenir l'utilisateur
     utilisateur = obtenir_ou_404(Utilisateur, utilisateur_id, "Utilisateur non trouvé")
@@ -50,41 +73,33 @@ def obtenir_emprunts_utilisateur(utilisateur_id, actifs_seulement=False, page=1,
     if actifs_seulement:
         requete = requete.filter_by(date_retour_effective=None)
     
-    resultat = paginer_resultats(requete, page, par_page)
+    resultat = paginer_resultats(requete, page, par_page, curseur=curseur,
+                                 cles_tri=(Emprunt.date_emprunt, Emprunt.id), descendant=True,
+                                 avec_total=avec_total)
     
     return {
         'emprunts': [emprunt.vers_dict() for emprunt in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'pagination': pagination_vers_dict(resultat)
     }
 
-def obtenir_tous_emprunts(actifs_seulement=False, page=1, par_page=10):
+def obtenir_tous_emprunts(actifs_seulement=False, page=1, par_page=10, curseur=None, avec_total=False):
     """Obtenir tous les emprunts (admin seulement)"""
     # Filtrer les emprunts
     requete = Emprunt.query
     if actifs_seulement:
         requete = requete.filter_by(date_retour_effective=None)
     
-    resultat = paginer_resultats(requete, page, par_page)
+    resultat = paginer_resultats(requete, page, par_page, curseur=curseur,
+                                 cles_tri=(Emprunt.date_emprunt, Emprunt.id), descendant=True,
+                                 avec_total=avec_total,
+                                 compteur='emprunts_actifs' if actifs_seulement else 'emprunts')
     
     return {
         'emprunts': [emprunt.vers_dict() for emprunt in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'pagination': pagination_vers_dict(resultat)
     }
 
+@transactionnel
 def retourner_livre(emprunt_id, utilisateur_id):
     """Retourner un livre emprunté"""
     # Obtenir l'emprunt
@@ -101,21 +116,170 @@ def retourner_livre(emprunt_id, utilisateur_id):
     if emprunt.est_retourne():
         raise ErreurRequeteInvalide("Ce livre a déjà été retourné")
     
-    # Obtenir le livre
-    livre = obtenir_ou_404(Livre, emprunt.livre_id, "Livre non trouvé")
-    
-    # Marquer le livre comme retourné
-    emprunt.retourner_livre()
+    # Marquer le livre comme retourné, à condition qu'il ne l'ait pas été entre-temps
+    retour = db.session.execute(
+        update(Emprunt)
+        .where(Emprunt.id == emprunt.id, Emprunt.date_retour_effective == None)
+        .values(date_retour_effective=datetime.utcnow())
+        .execution_options(synchronize_session='evaluate')
+    )
+    if retour.rowcount == 0:
+        raise ErreurRequeteInvalide("Ce livre a déjà été retourné")
     
-    # Mettre à jour la disponibilité du livre
-    livre.disponible += 1
+    # Rendre l'exemplaire et mettre à jour les compteurs
+    db.session.execute(
+        update(Livre)
+        .where(Livre.id == emprunt.livre_id, Livre.disponible < Livre.quantite)
+        .values(disponible=Livre.disponible + 1)
+        .execution_options(synchronize_session=False)
+    )
+    ajuster_compteur('emprunts_actifs', -1)
     
     # Sauvegarder les changements
     valider_changements()
+    apres_validation(lambda: marquer_lecture_primaire(utilisateur_id))
+    invalider_cache(etiquette_livre(emprunt.livre_id))
     
     return emprunt.vers_dict()
 
-def obtenir_emprunts_en_retard(page=1, par_page=10):
+@transactionnel
+def creer_emprunts_lot(utilisateur_id, livre_ids, duree_emprunt=14, tout_ou_rien=True):
+    """Emprunter plusieurs livres en une transaction
+    
+    Les exemplaires sont réservés par un seul UPDATE ensembliste. En mode
+    tout_ou_rien, un livre indisponible annule tout le lot ; sinon les
+    livres disponibles sont empruntés et les autres signalés. Si aucun livre
+    n'est emprunté, ErreurConflit (avec les résultats) annule la transaction.
+    """
+    demandes = Counter(livre_ids)
+    reserves = set(db.session.execute(
+        update(Livre)
+        .where(Livre.id.in_(demandes), Livre.disponible >= case(demandes, value=Livre.id))
+        .values(disponible=Livre.disponible - case(demandes, value=Livre.id))
+        .returning(Livre.id)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+    
+    manquants = set(demandes) - reserves
+    existants = set(db.session.execute(select(Livre.id).where(Livre.id.in_(manquants))).scalars()) if manquants else set()
+    annule = tout_ou_rien and bool(manquants)
+    
+    emprunts = {}
+    if reserves and not annule:
+        nouveaux = [Emprunt(utilisateur_id=utilisateur_id, livre_id=livre_id, duree_emprunt=duree_emprunt)
+                    for livre_id in livre_ids if livre_id in reserves]
+        db.session.add_all(nouveaux)
+        ajuster_compteur('emprunts', len(nouveaux))
+        ajuster_compteur('emprunts_actifs', len(nouveaux))
+        valider_changements()
+        apres_validation(lambda: marquer_lecture_primaire(utilisateur_id))
+        invalider_cache(*[etiquette_livre(livre_id) for livre_id in reserves])
+        for emprunt in nouveaux:
+            emprunts.setdefault(emprunt.livre_id, []).append(emprunt.vers_dict())
+        suggestions = obtenir_suggestions()
+        if suggestions is not None:
+            apres_validation(lambda: [suggestions.enregistrer_emprunts(livre_id, demandes[livre_id])
+                                      for livre_id in reserves])
+    
+    resultats = []
+    for livre_id in livre_ids:
+        if livre_id in reserves:
+            if annule:
+                resultats.append({'livre_id': livre_id, 'statut': 'annule'})
+            else:
+                resultats.append({'livre_id': livre_id, 'statut': 'emprunte', 'emprunt': emprunts[livre_id].pop(0)})
+        elif livre_id in existants:
+            resultats.append({'livre_id': livre_id, 'statut': 'indisponible',
+                              'message': "Ce livre n'est pas disponible pour l'emprunt"})
+        else:
+            resultats.append({'livre_id': livre_id, 'statut': 'non_trouve', 'message': "Livre non trouvé"})
+    
+    emprunts_crees = sum(1 for resultat in resultats if resultat['statut'] == 'emprunte')
+    if not emprunts_crees:
+        # Les réservations déjà faites sont annulées avec la transaction
+        raise ErreurConflit("Aucun livre emprunté", {'resultats': resultats})
+    
+    return {
+        'emprunts_crees': emprunts_crees,
+        'resultats': resultats
+    }
+
+@transactionnel
+def retourner_emprunts_lot(utilisateur_id, emprunt_ids, tout_ou_rien=True):
+    """Retourner plusieurs emprunts en une transaction
+    
+    Les emprunts sont marqués retournés par un seul UPDATE conditionnel et
+    les exemplaires rendus par un seul UPDATE ensembliste sur les livres. Si
+    aucun emprunt n'est retourné, ErreurConflit (avec les résultats) annule
+    la transaction.
+    """
+    utilisateur = obtenir_ou_404(Utilisateur, utilisateur_id, "Utilisateur non trouvé")
+    emprunt_ids = list(dict.fromkeys(emprunt_ids))
+    
+    conditions = [Emprunt.id.in_(emprunt_ids), Emprunt.date_retour_effective == None]
+    if not utilisateur.est_admin:
+        conditions.append(Emprunt.utilisateur_id == utilisateur.id)
+    retournes = dict(db.session.execute(
+        update(Emprunt)
+        .where(*conditions)
+        .values(date_retour_effective=datetime.utcnow())
+        .returning(Emprunt.id, Emprunt.livre_id)
+        .execution_options(synchronize_session=False)
+    ).all())
+    
+    # Diagnostiquer les emprunts non retournés en une requête
+    echecs = {}
+    manquants = [emprunt_id for emprunt_id in emprunt_ids if emprunt_id not in retournes]
+    if manquants:
+        lignes = db.session.execute(
+            select(Emprunt.id, Emprunt.utilisateur_id, Emprunt.date_retour_effective).where(Emprunt.id.in_(manquants))
+        ).all()
+        for emprunt_id, proprietaire_id, date_retour_effective in lignes:
+            if date_retour_effective is not None:
+                echecs[emprunt_id] = ('deja_retourne', "Ce livre a déjà été retourné")
+            else:
+                echecs[emprunt_id] = ('interdit', "Vous n'êtes pas autorisé à retourner ce livre")
+    annule = tout_ou_rien and bool(manquants)
+    
+    emprunts = {}
+    if retournes and not annule:
+        rendus = Counter(retournes.values())
+        db.session.execute(
+            update(Livre)
+            .where(Livre.id.in_(rendus))
+            .values(disponible=case(
+                (Livre.disponible + case(rendus, value=Livre.id) > Livre.quantite, Livre.quantite),
+                else_=Livre.disponible + case(rendus, value=Livre.id)
+            ))
+            .execution_options(synchronize_session=False)
+        )
+        ajuster_compteur('emprunts_actifs', -len(retournes))
+        valider_changements()
+        apres_validation(lambda: marquer_lecture_primaire(utilisateur_id))
+        invalider_cache(*[etiquette_livre(livre_id) for livre_id in rendus])
+        emprunts = {emprunt.id: emprunt.vers_dict() for emprunt in Emprunt.query.filter(Emprunt.id.in_(retournes))}
+    
+    resultats = []
+    for emprunt_id in emprunt_ids:
+        if emprunt_id in retournes:
+            if annule:
+                resultats.append({'emprunt_id': emprunt_id, 'statut': 'annule'})
+            else:
+                resultats.append({'emprunt_id': emprunt_id, 'statut': 'retourne', 'emprunt': emprunts[emprunt_id]})
+        else:
+            statut, message = echecs.get(emprunt_id, ('non_trouve', "Emprunt non trouvé"))
+            resultats.append({'emprunt_id': emprunt_id, 'statut': statut, 'message': message})
+    
+    emprunts_retournes = sum(1 for resultat in resultats if resultat['statut'] == 'retourne')
+    if not emprunts_retournes:
+        raise ErreurConflit("Aucun livre retourné", {'resultats': resultats})
+    
+    return {
+        'emprunts_retournes': emprunts_retournes,
+        'resultats': resultats
+    }
+
+def obtenir_emprunts_en_retard(page=1, par_page=10, curseur=None, avec_total=False):
     """Obtenir les emprunts en retard"""
     # Obtenir la date actuelle
     maintenant = datetime.utcnow()
@@ -126,16 +290,31 @@ def obtenir_emprunts_en_retard(page=1, par_page=10):
         Emprunt.date_retour_effective == None
     )
     
-    resultat = paginer_resultats(requete, page, par_page)
+    resultat = paginer_resultats(requete, page, par_page, curseur=curseur,
+                                 cles_tri=(Emprunt.date_emprunt, Emprunt.id), descendant=True,
+                                 avec_total=avec_total)
     
     return {
         'emprunts': [emprunt.vers_dict() for emprunt in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
-    }
\ No newline at end of file
+        'pagination': pagination_vers_dict(resultat)
+    }
+
+def exporter_emprunts(format_fichier, actif_seulement=False):
+    """Flux d'export des emprunts, avec les mêmes filtres et le même ordre que la liste admin"""
+    colonnes = (Emprunt.id, Emprunt.utilisateur_id, Emprunt.livre_id, Emprunt.date_emprunt,
+                Emprunt.date_retour_prevue, Emprunt.date_retour_effective)
+    requete = select(*colonnes).order_by(Emprunt.date_emprunt.desc(), Emprunt.id.desc())
+    if actif_seulement:
+        requete = requete.where(Emprunt.date_retour_effective == None)
+    
+    maintenant = datetime.utcnow()
+    
+    def completer(emprunt):
+        # Mêmes champs calculés que Emprunt.vers_dict, à l'instant du début de l'export
+        emprunt['est_retourne'] = emprunt['date_retour_effective'] is not None
+        emprunt['est_en_retard'] = not emprunt['est_retourne'] and maintenant > emprunt['date_retour_prevue']
+        emprunt['jours_de_retard'] = (maintenant - emprunt['date_retour_prevue']).days if emprunt['est_en_retard'] else 0
+        return emprunt
+    
+    champs = [colonne.key for colonne in colonnes] + ['est_retourne', 'est_en_retard', 'jours_de_retard']
+    return flux_export(requete, champs, format_fichier, completer)
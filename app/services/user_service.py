@@ -1,7 +1,11 @@
+from sqlalchemy import select
 from app.models.user import Utilisateur
-from app.utils.database import ajouter_a_db, obtenir_ou_404, valider_changements, paginer_resultats
+from app.utils.database import ajouter_a_db, obtenir_ou_404, valider_changements, transactionnel, apres_validation, paginer_resultats, pagination_vers_dict
 from app.utils.error_handler import ErreurRequeteInvalide, ErreurNonTrouve, ErreurConflit, ErreurInterdit
 from app.utils.validation import valider_email_utilisateur
+from app.utils.security import invalider_principal
+from app.utils.recherche import requete_recherche_utilisateurs
+from app.utils.exportation import flux_export
 from datetime import datetime
 
 def obtenir_utilisateur(utilisateur_id):
@@ -9,21 +13,17 @@ def obtenir_utilisateur(utilisateur_id):
     utilisateur = obtenir_ou_404(Utilisateur, utilisateur_id, "Utilisateur non trouvé")
     return utilisateur.vers_dict()
 
-def obtenir_utilisateurs(page=1, par_page=10):
-    """Obtenir la liste des utilisateurs paginée"""
-    resultat = paginer_resultats(Utilisateur.query, page, par_page)
+def obtenir_utilisateurs(page=1, par_page=10, curseur=None, avec_total=False):
+    """Obtenir la liste des utilisateurs paginée (par numéro de page ou par curseur)"""
+    resultat = paginer_resultats(Utilisateur.query, page, par_page, curseur=curseur,
+                                 cles_tri=(Utilisateur.nom, Utilisateur.id), avec_total=avec_total,
+                                 table='utilisateurs')
     return {
         'utilisateurs': [utilisateur.vers_dict() for utilisateur in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
+        'pagination': pagination_vers_dict(resultat)
     }
 
+@transactionnel
 def mettre_a_jour_profil(utilisateur_id, donnees):
     """Mettre à jour le profil d'un utilisateur"""
     utilisateur = obtenir_ou_404(Utilisateur, utilisateur_id, "Utilisateur non trouvé")
@@ -48,9 +48,11 @@ def mettre_a_jour_profil(utilisateur_id, donnees):
         utilisateur.mot_de_passe = donnees['mot_de_passe']
     
     valider_changements()
+    apres_validation(lambda: invalider_principal(utilisateur_id))
     
     return utilisateur.vers_dict()
 
+@transactionnel
 def mettre_a_jour_role(utilisateur_id, est_admin, admin_id):
     """Mettre à jour le rôle d'un utilisateur (admin seulement)"""
     # Vérifier si l'admin essaie de modifier son propre rôle
@@ -62,9 +64,11 @@ def mettre_a_jour_role(utilisateur_id, est_admin, admin_id):
     # Mettre à jour le rôle
     utilisateur.est_admin = est_admin
     valider_changements()
+    apres_validation(lambda: invalider_principal(utilisateur_id))
     
     return utilisateur.vers_dict()
 
+@transactionnel
 def mettre_a_jour_statut(utilisateur_id, est_actif, admin_id):
     """Activer/désactiver un compte utilisateur (admin seulement)"""
     # Vérifier si l'admin essaie de modifier son propre statut
@@ -76,31 +80,31 @@ def mettre_a_jour_statut(utilisateur_id, est_actif, admin_id):
     # Mettre à jour le statut
     utilisateur.est_actif = est_actif
     valider_changements()
+    apres_validation(lambda: invalider_principal(utilisateur_id))
     
     return utilisateur.vers_dict()
 
-def rechercher_utilisateurs(terme, page=1, par_page=10):
+def rechercher_utilisateurs(terme, page=1, par_page=10, curseur=None, avec_total=False):
     """Rechercher des utilisateurs par nom, prénom ou email"""
     if not terme:
         raise ErreurRequeteInvalide("Le terme de recherche est requis")
     
-    # Rechercher les utilisateurs
-    requete = Utilisateur.query.filter(
-        (Utilisateur.prenom.ilike(f'%{terme}%')) |
-        (Utilisateur.nom.ilike(f'%{terme}%')) |
-        (Utilisateur.email.ilike(f'%{terme}%'))
-    )
+    # Rechercher les utilisateurs sur la colonne normalisée indexée, par pertinence
+    requete, rang = requete_recherche_utilisateurs(terme)
+    if curseur is None:
+        requete = requete.order_by(rang.desc(), Utilisateur.id.desc())
     
-    resultat = paginer_resultats(requete, page, par_page)
+    resultat = paginer_resultats(requete, page, par_page, curseur=curseur,
+                                 cles_tri=(rang, Utilisateur.id), descendant=True, avec_total=avec_total)
     
     return {
-        'utilisateurs': [utilisateur.vers_dict() for utilisateur in resultat['elements']],
-        'pagination': {
-            'page': resultat['page'],
-            'par_page': resultat['par_page'],
-            'total': resultat['total'],
-            'pages': resultat['pages'],
-            'a_suivant': resultat['a_suivant'],
-            'a_precedent': resultat['a_precedent']
-        }
-    }
\ No newline at end of file
+        'utilisateurs': [utilisateur.vers_dict() for utilisateur, _ in resultat['elements']],
+        'pagination': pagination_vers_dict(resultat)
+    }
+
+def exporter_utilisateurs(format_fichier):
+    """Flux d'export de tous les utilisateurs, dans l'ordre de la liste (sans le hash du mot de passe)"""
+    colonnes = (Utilisateur.id, Utilisateur.prenom, Utilisateur.nom, Utilisateur.email, Utilisateur.cree_le,
+                Utilisateur.est_actif, Utilisateur.est_admin, Utilisateur.derniere_connexion)
+    requete = select(*colonnes).order_by(Utilisateur.nom, Utilisateur.id)
+    return flux_export(requete, [colonne.key for colonne in colonnes], format_fichier)
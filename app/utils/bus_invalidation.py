@@ -0,0 +1,286 @@
+import os
+import select as selection
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import chain
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, func, insert, or_, select, text
+from sqlalchemy.engine import make_url
+from app import db
+from app.models.invalidation import Invalidation
+from app.utils.database import unite_de_travail_active
+
+# Canal LISTEN/NOTIFY des messages d'invalidation
+CANAL = 'bibliotheque_invalidations'
+
+# Tables dont les écritures ORM validées sont publiées (clés table:id)
+TABLES_PUBLIEES = ('livres', 'utilisateurs', 'emprunts', 'categories')
+
+# La charge utile d'un NOTIFY est limitée à 8000 octets
+TAILLE_MAX_MESSAGE = 7000
+
+# Clé de session.info des invalidations en attente de la validation
+CLE_SESSION = 'invalidations_en_attente'
+
+# Le journal des invalidations est purgé tous les N sondages
+PURGE_TOUS_LES = 60
+
+
+class BusInvalidation:
+    """Bus d'invalidation des caches en mémoire entre workers et nœuds
+
+    Un message est une liste de clés espace:valeur (livres:12,
+    reponses:livres:liste) précédée de l'origine du processus émetteur, qui
+    a déjà invalidé ses propres caches. Les messages sont écrits dans la
+    transaction de l'écriture : NOTIFY sous PostgreSQL (délivré à la
+    validation), sinon une ligne du journal invalidations lue par sondage.
+    Chaque worker écoute dans un thread et appelle les abonnés de chaque espace.
+    """
+
+    def __init__(self, app, mode='sondage', intervalle=1.0, retention=300, marge=30):
+        self.app = app
+        self.mode = mode
+        self.intervalle = intervalle
+        self.retention = retention
+        self.marge = marge
+        self._abonnes = defaultdict(list)
+        self._verrou = threading.Lock()
+        self._arret = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._origine = None
+        self._dernier_id = None
+        self._distribues = {}
+
+    @property
+    def origine(self):
+        # Identifiant du processus, renouvelé après le fork
+        if self._origine is None or self._origine[0] != os.getpid():
+            self._origine = (os.getpid(), uuid.uuid4().hex[:12])
+        return self._origine[1]
+
+    def abonner(self, espace, rappel):
+        """Appeler rappel(valeurs) pour les clés de cet espace publiées par les autres processus"""
+        self._abonnes[espace].append(rappel)
+
+    def demarrer(self):
+        """Lancer l'écoute en arrière-plan (une fois par worker)"""
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._verrou:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._dernier_id = None
+            self._distribues = {}
+            cible = self._ecouter if self.mode == 'notify' else self._sonder
+            self._thread = threading.Thread(target=cible, name='bus-invalidation', daemon=True)
+            self._thread.start()
+
+    def _messages(self, cles):
+        # Regrouper les clés en messages sous la taille maximale d'un NOTIFY
+        prefixe = f'{self.origine}|'
+        message = []
+        taille = len(prefixe)
+        for cle in sorted(cles):
+            if message and taille + len(cle) + 1 > TAILLE_MAX_MESSAGE:
+                yield prefixe + ','.join(message)
+                message, taille = [], len(prefixe)
+            message.append(cle)
+            taille += len(cle) + 1
+        if message:
+            yield prefixe + ','.join(message)
+
+    def publier(self, connexion, cles):
+        """Écrire les messages dans la transaction de connexion"""
+        messages = list(self._messages(cles))
+        if self.mode == 'notify':
+            for message in messages:
+                connexion.execute(text('SELECT pg_notify(:canal, :message)'), {'canal': CANAL, 'message': message})
+        else:
+            maintenant = datetime.utcnow()
+            connexion.execute(insert(Invalidation.__table__),
+                              [{'message': message, 'cree_le': maintenant} for message in messages])
+
+    def distribuer(self, message):
+        """Appeler les abonnés des clés d'un message reçu"""
+        origine, _, contenu = message.partition('|')
+        if origine == self.origine or not contenu:
+            return
+        par_espace = defaultdict(list)
+        for cle in contenu.split(','):
+            espace, _, valeur = cle.partition(':')
+            par_espace[espace].append(valeur)
+        for espace, valeurs in par_espace.items():
+            for rappel in self._abonnes.get(espace, ()):
+                try:
+                    rappel(valeurs)
+                except Exception as e:
+                    self.app.logger.error(f"Erreur lors de l'invalidation {espace}: {str(e)}")
+
+    def _ecouter(self):
+        # Connexion dédiée hors du pool, en autocommit, réouverte après une coupure
+        while not self._arret.is_set():
+            connexion = None
+            try:
+                with self.app.app_context():
+                    moteur = db.engine
+                    arguments, options = moteur.dialect.create_connect_args(moteur.url)
+                    connexion = moteur.dialect.connect(*arguments, **options)
+                    connexion.autocommit = True
+                    with connexion.cursor() as curseur:
+                        curseur.execute(f'LISTEN {CANAL}')
+                while not self._arret.is_set():
+                    if selection.select([connexion], [], [], self.intervalle) == ([], [], []):
+                        continue
+                    connexion.poll()
+                    if connexion.notifies:
+                        with self.app.app_context():
+                            while connexion.notifies:
+                                self.distribuer(connexion.notifies.pop(0).payload)
+            except Exception as e:
+                self.app.logger.error(f"Écoute des invalidations interrompue: {str(e)}")
+                self._arret.wait(self.intervalle)
+            finally:
+                if connexion is not None:
+                    try:
+                        connexion.close()
+                    except Exception:
+                        pass
+
+    def _sonder(self):
+        sondages = 0
+        while not self._arret.wait(self.intervalle):
+            try:
+                with self.app.app_context():
+                    self._lire_journal(purger=sondages % PURGE_TOUS_LES == 0)
+                sondages += 1
+            except Exception as e:
+                self.app.logger.error(f"Sondage des invalidations interrompu: {str(e)}")
+
+    def _lire_journal(self, purger=False):
+        """Distribuer les messages du journal écrits depuis le dernier sondage
+
+        Les identifiants sont attribués à l'insertion, avant la validation : une
+        transaction plus lente peut rendre visible une ligne d'identifiant
+        inférieur au dernier lu. Les lignes des dernières secondes (marge) sont
+        donc relues, et celles déjà distribuées écartées par identifiant.
+        """
+        plancher = datetime.utcnow() - timedelta(seconds=self.marge)
+        with db.engine.begin() as connexion:
+            if self._dernier_id is None:
+                # Les caches d'un worker qui démarre sont vides : le passé est ignoré
+                self._dernier_id = connexion.execute(select(func.max(Invalidation.id))).scalar() or 0
+                self._distribues = dict(connexion.execute(
+                    select(Invalidation.id, Invalidation.cree_le).where(Invalidation.cree_le >= plancher)
+                ).all())
+                return
+            lignes = connexion.execute(
+                select(Invalidation.id, Invalidation.message, Invalidation.cree_le)
+                .where(or_(Invalidation.id > self._dernier_id, Invalidation.cree_le >= plancher))
+                .order_by(Invalidation.id)
+            ).all()
+            if purger:
+                limite = datetime.utcnow() - timedelta(seconds=self.retention)
+                connexion.execute(delete(Invalidation).where(Invalidation.cree_le < limite))
+        # Oublier les lignes sorties de la fenêtre relue
+        self._distribues = {identifiant: cree_le for identifiant, cree_le in self._distribues.items()
+                            if cree_le >= plancher}
+        for identifiant, message, cree_le in lignes:
+            if identifiant in self._distribues:
+                continue
+            self._distribues[identifiant] = cree_le
+            self._dernier_id = max(self._dernier_id, identifiant)
+            self.distribuer(message)
+
+
+def obtenir_bus_invalidation():
+    """Obtenir le bus d'invalidation, ou None s'il est désactivé"""
+    return current_app.extensions.get('bus_invalidation') if has_app_context() else None
+
+
+def abonner_invalidations(app, espace, rappel):
+    """Abonner un cache en mémoire aux invalidations d'un espace (sans effet si le bus est désactivé)"""
+    bus = app.extensions.get('bus_invalidation')
+    if bus is not None:
+        bus.abonner(espace, rappel)
+
+
+def publier_invalidation(*cles):
+    """Publier des clés espace:valeur aux autres processus
+
+    Dans une unité de travail, les clés partent avec sa transaction ; sinon
+    elles sont publiées immédiatement dans une transaction courte.
+    """
+    bus = obtenir_bus_invalidation()
+    if bus is None or not cles:
+        return
+    if unite_de_travail_active():
+        db.session.info.setdefault(CLE_SESSION, set()).update(cles)
+    else:
+        with db.engine.begin() as connexion:
+            bus.publier(connexion, cles)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collecter_ecritures(session, contexte):
+    if obtenir_bus_invalidation() is None:
+        return
+    cles = set()
+    for instance in chain(session.new, session.deleted, session.dirty):
+        table = getattr(instance, '__tablename__', None)
+        if table not in TABLES_PUBLIEES:
+            continue
+        if instance in session.dirty and not session.is_modified(instance, include_collections=False):
+            continue
+        cles.add(f'{table}:{instance.id}')
+    if cles:
+        session.info.setdefault(CLE_SESSION, set()).update(cles)
+
+
+@event.listens_for(db.session, 'before_commit')
+def _publier_ecritures(session):
+    bus = obtenir_bus_invalidation()
+    if bus is None:
+        return
+    # Le dernier flush a lieu pendant la validation : le faire maintenant pour en collecter les écritures
+    session.flush()
+    cles = session.info.pop(CLE_SESSION, None)
+    if cles:
+        bus.publier(session.connection(bind_arguments={'bind': db.engine}), cles)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _abandonner_ecritures(session, transaction_precedente):
+    session.info.pop(CLE_SESSION, None)
+
+
+def _mode(app):
+    mode = app.config.get('BUS_INVALIDATION', 'auto')
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if mode == 'auto':
+        if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+            # Une base en mémoire n'est partagée avec aucun autre processus
+            return 'aucun'
+        return 'notify' if url.get_backend_name() == 'postgresql' else 'sondage'
+    return mode
+
+
+def initialiser_bus_invalidation(app):
+    """Enregistrer le bus d'invalidation selon BUS_INVALIDATION (auto, notify, sondage ou aucun)"""
+    mode = _mode(app)
+    if mode == 'aucun':
+        return
+    bus = BusInvalidation(
+        app, mode=mode,
+        intervalle=app.config.get('BUS_INVALIDATION_INTERVALLE', 1.0),
+        retention=app.config.get('BUS_INVALIDATION_RETENTION', 300),
+        marge=app.config.get('BUS_INVALIDATION_MARGE', 30)
+    )
+    app.extensions['bus_invalidation'] = bus
+
+    @app.before_request
+    def demarrer_bus_invalidation():
+        bus.demarrer()
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinelle pour distinguer une absence d'entrée d'une valeur None mise en cache
+ABSENT = object()
+
+
+class CacheLRU:
+    """Cache en mémoire borné (LRU) avec durée de vie par entrée"""
+
+    def __init__(self, taille_max=1024, ttl=60):
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+        self.succes = 0
+        self.echecs = 0
+
+    def obtenir(self, cle, defaut=ABSENT):
+        """Obtenir une valeur du cache si elle existe et n'a pas expiré"""
+        maintenant = time.monotonic()
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None or entree[1] < maintenant:
+                if entree is not None:
+                    del self._entrees[cle]
+                self.echecs += 1
+                return defaut
+            self._entrees.move_to_end(cle)
+            self.succes += 1
+            return entree[0]
+
+    def definir(self, cle, valeur, ttl=None):
+        """Ajouter ou remplacer une valeur dans le cache"""
+        expiration = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._verrou:
+            self._entrees[cle] = (valeur, expiration)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def supprimer(self, cle):
+        """Retirer une entrée du cache"""
+        with self._verrou:
+            self._entrees.pop(cle, None)
+
+    def vider(self):
+        """Vider entièrement le cache"""
+        with self._verrou:
+            self._entrees.clear()
+
+    def __len__(self):
+        return len(self._entrees)
+
+    def valeurs(self):
+        """Copie des valeurs présentes (expirées comprises), pour mesurer le cache"""
+        with self._verrou:
+            return [valeur for valeur, _ in self._entrees.values()]
+
+    def statistiques(self):
+        """Obtenir les compteurs de succès/échecs du cache"""
+        total = self.succes + self.echecs
+        return {
+            'entrees': len(self._entrees),
+            'taille_max': self.taille_max,
+            'succes': self.succes,
+            'echecs': self.echecs,
+            'taux_succes': (self.succes / total) if total else 0.0
+        }
@@ -0,0 +1,316 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, g, has_app_context, has_request_context, request
+from app.utils.cache import CacheLRU, ABSENT
+from app.utils.database import apres_validation
+from app.utils.metriques import incrementer_metrique
+from app.utils.bus_invalidation import abonner_invalidations, publier_invalidation
+from app.utils.routage import lecture_primaire_requise
+
+# Espace des étiquettes sur le bus d'invalidation
+ESPACE = 'reponses'
+
+# Étiquettes des réponses en cache
+LISTE_LIVRES = 'livres:liste'
+CATEGORIES = 'categories'
+
+# Les réponses expirées du niveau partagé sont purgées toutes les N écritures
+PURGE_TOUTES_LES = 500
+
+
+def etiquette_livre(livre_id):
+    return f'livre:{livre_id}'
+
+
+def etiquette_categorie(categorie_id):
+    return f'categorie:{categorie_id}'
+
+
+def etiquettes_livre(livre):
+    """Étiquettes d'une réponse contenant ce livre (dictionnaire vers_dict)"""
+    etiquettes = [etiquette_livre(livre['id'])]
+    if livre.get('categorie_id') is not None:
+        etiquettes.append(etiquette_categorie(livre['categorie_id']))
+    return etiquettes
+
+
+class StockageCacheFichier:
+    """Niveau partagé (SQLite local) entre les workers d'un même nœud : réponses et versions d'étiquettes"""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self._local = threading.local()
+        self._ecritures = 0
+        connexion = self._connexion()
+        connexion.execute(
+            'CREATE TABLE IF NOT EXISTS reponses (cle TEXT PRIMARY KEY, entree TEXT NOT NULL, '
+            'corps BLOB NOT NULL, expire_le REAL NOT NULL)'
+        )
+        connexion.execute(
+            'CREATE TABLE IF NOT EXISTS versions (etiquette TEXT PRIMARY KEY, version INTEGER NOT NULL, '
+            'invalidee_le REAL NOT NULL DEFAULT 0)'
+        )
+        try:
+            # Fichier créé par une version précédente
+            connexion.execute('ALTER TABLE versions ADD COLUMN invalidee_le REAL NOT NULL DEFAULT 0')
+        except sqlite3.OperationalError:
+            pass
+
+    def _connexion(self):
+        connexion = getattr(self._local, 'connexion', None)
+        if connexion is None or getattr(self._local, 'pid', None) != os.getpid():
+            connexion = sqlite3.connect(self.chemin, timeout=5, isolation_level=None)
+            connexion.execute('PRAGMA journal_mode=WAL')
+            self._local.connexion = connexion
+            self._local.pid = os.getpid()
+        return connexion
+
+    def obtenir(self, cle):
+        ligne = self._connexion().execute(
+            'SELECT entree, corps FROM reponses WHERE cle = ? AND expire_le > ?', (cle, time.time())
+        ).fetchone()
+        if ligne is None:
+            return None
+        entree = json.loads(ligne[0])
+        entree['corps'] = bytes(ligne[1])
+        return entree
+
+    def definir(self, cle, entree, ttl):
+        meta = json.dumps({cle_entree: valeur for cle_entree, valeur in entree.items() if cle_entree != 'corps'})
+        self._connexion().execute(
+            'INSERT OR REPLACE INTO reponses (cle, entree, corps, expire_le) VALUES (?, ?, ?, ?)',
+            (cle, meta, entree['corps'], time.time() + ttl)
+        )
+        self._ecritures += 1
+        if self._ecritures % PURGE_TOUTES_LES == 0:
+            self.purger()
+
+    def versions(self, etiquettes):
+        if not etiquettes:
+            return {}
+        marqueurs = ','.join('?' * len(etiquettes))
+        return dict(self._connexion().execute(
+            f'SELECT etiquette, version FROM versions WHERE etiquette IN ({marqueurs})', list(etiquettes)
+        ).fetchall())
+
+    def incrementer(self, etiquettes):
+        maintenant = time.time()
+        self._connexion().executemany(
+            'INSERT INTO versions (etiquette, version, invalidee_le) VALUES (?, 1, ?) '
+            'ON CONFLICT(etiquette) DO UPDATE SET version = version + 1, invalidee_le = excluded.invalidee_le',
+            [(etiquette, maintenant) for etiquette in etiquettes]
+        )
+
+    def invalidees_depuis(self, etiquettes, horodatage):
+        if not etiquettes:
+            return False
+        marqueurs = ','.join('?' * len(etiquettes))
+        return self._connexion().execute(
+            f'SELECT 1 FROM versions WHERE etiquette IN ({marqueurs}) AND invalidee_le >= ? LIMIT 1',
+            [*etiquettes, horodatage]
+        ).fetchone() is not None
+
+    def purger(self):
+        self._connexion().execute('DELETE FROM reponses WHERE expire_le <= ?', (time.time(),))
+
+
+class CacheReponses:
+    """Cache des réponses des endpoints publics : LRU du processus devant un niveau partagé optionnel
+
+    Chaque entrée mémorise la version de ses étiquettes au moment du calcul ;
+    invalider une étiquette incrémente sa version, ce qui périme en O(1) toutes
+    les entrées qui la portent, dans les deux niveaux.
+    """
+
+    def __init__(self, taille_max=2000, ttl=30, stockage=None, retard_replique=5):
+        self.ttl = ttl
+        self.stockage = stockage
+        self.retard_replique = retard_replique
+        self._local = CacheLRU(taille_max=taille_max, ttl=ttl)
+        self._versions = {}
+        # Étiquettes invalidées pendant la fenêtre de retard des répliques
+        self._invalidations_recentes = CacheLRU(taille_max=taille_max, ttl=retard_replique)
+        self._verrou = threading.Lock()
+        self.succes_local = 0
+        self.succes_partage = 0
+        self.echecs = 0
+
+    def _versions_actuelles(self, etiquettes):
+        if self.stockage is not None:
+            partagees = self.stockage.versions(etiquettes)
+            return {etiquette: partagees.get(etiquette, 0) + self._versions.get(etiquette, 0) for etiquette in etiquettes}
+        return {etiquette: self._versions.get(etiquette, 0) for etiquette in etiquettes}
+
+    def _valide(self, entree):
+        return self._versions_actuelles(entree['etiquettes']) == entree['versions']
+
+    def obtenir(self, cle):
+        """Réponse en cache encore valide, ou ABSENT"""
+        entree = self._local.obtenir(cle)
+        if entree is not ABSENT:
+            if self._valide(entree):
+                self.succes_local += 1
+                incrementer_metrique('bibliotheque_cache_reponses_total', 'local')
+                return entree
+            self._local.supprimer(cle)
+        if self.stockage is not None:
+            entree = self.stockage.obtenir(cle)
+            if entree is not None and self._valide(entree):
+                self._local.definir(cle, entree)
+                self.succes_partage += 1
+                incrementer_metrique('bibliotheque_cache_reponses_total', 'partage')
+                return entree
+        self.echecs += 1
+        incrementer_metrique('bibliotheque_cache_reponses_total', 'echec')
+        return ABSENT
+
+    def versions(self, etiquettes):
+        """Versions des étiquettes à relever avant de calculer une réponse"""
+        return self._versions_actuelles(sorted(set(etiquettes)))
+
+    def definir(self, cle, entree):
+        """Conserver une réponse calculée (entree porte ses étiquettes et leurs versions)"""
+        self._local.definir(cle, entree)
+        if self.stockage is not None:
+            self.stockage.definir(cle, entree, self.ttl)
+
+    def invalider(self, etiquettes, local_seulement=False):
+        """Périmer toutes les entrées portant l'une des étiquettes"""
+        etiquettes = sorted(set(etiquettes))
+        for etiquette in etiquettes:
+            self._invalidations_recentes.definir(etiquette, True)
+        if self.stockage is not None and not local_seulement:
+            self.stockage.incrementer(etiquettes)
+            return
+        with self._verrou:
+            for etiquette in etiquettes:
+                self._versions[etiquette] = self._versions.get(etiquette, 0) + 1
+
+    def invalidees_recemment(self, etiquettes):
+        """Une des étiquettes a-t-elle été invalidée pendant la fenêtre de retard des répliques ?"""
+        if any(self._invalidations_recentes.obtenir(etiquette, False) for etiquette in etiquettes):
+            return True
+        return self.stockage is not None and self.stockage.invalidees_depuis(
+            sorted(set(etiquettes)), time.time() - self.retard_replique
+        )
+
+    def vider(self):
+        self._local.vider()
+
+    def statistiques(self):
+        """Taux de succès et mémoire occupée par le niveau local"""
+        total = self.succes_local + self.succes_partage + self.echecs
+        entrees = self._local.valeurs()
+        return {
+            'entrees': len(entrees),
+            'octets': sum(len(entree['corps']) + sum(len(e) for e in entree['etiquettes']) for entree in entrees),
+            'succes_local': self.succes_local,
+            'succes_partage': self.succes_partage,
+            'echecs': self.echecs,
+            'taux_succes': ((self.succes_local + self.succes_partage) / total) if total else 0.0
+        }
+
+
+def _cle_requete():
+    # Paramètres normalisés : triés, valeurs vides ignorées, espaces retirés
+    parametres = sorted((nom, valeur.strip()) for nom, valeur in request.args.items(multi=True) if valeur.strip())
+    arguments = sorted((request.view_args or {}).items())
+    return f'{request.endpoint}:{urlencode(arguments)}?{urlencode(parametres)}'
+
+
+def obtenir_cache_reponses():
+    """Obtenir le cache des réponses, ou None s'il est désactivé"""
+    return current_app.extensions.get('cache_reponses') if has_app_context() else None
+
+
+def etiqueter(*etiquettes):
+    """Ajouter des étiquettes à la réponse en cours de calcul (par exemple les livres d'une page)"""
+    if has_request_context():
+        g.setdefault('etiquettes_cache', set()).update(etiquettes)
+
+
+def invalider_cache(*etiquettes):
+    """Périmer les réponses portant ces étiquettes, une fois la transaction validée"""
+    cache = obtenir_cache_reponses()
+    if cache is not None and etiquettes:
+        apres_validation(lambda: cache.invalider(etiquettes))
+        # Le niveau partagé porte déjà les versions ; sinon les autres workers sont prévenus par le bus
+        if cache.stockage is None:
+            publier_invalidation(*(f'{ESPACE}:{etiquette}' for etiquette in etiquettes))
+
+
+def reponse_en_cache(*etiquettes_fixes):
+    """Décorateur : servir un endpoint GET public depuis le cache des réponses
+
+    La réponse est étiquetée par etiquettes_fixes et par les étiquettes
+    ajoutées pendant son calcul (etiqueter). Seules les réponses 200 sont
+    conservées ; If-None-Match est évalué sur l'ETag de l'entrée. Un client
+    qui vient d'écrire contourne le cache (lecture de ses écritures sur le
+    primaire), et une réponse lue sur une réplique n'est pas conservée si
+    l'une de ses étiquettes vient d'être invalidée : la réplique peut être en retard.
+    """
+    def decorateur(fonction):
+        @wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            cache = obtenir_cache_reponses()
+            if cache is None or request.method != 'GET' or lecture_primaire_requise():
+                return fonction(*args, **kwargs)
+
+            cle = _cle_requete()
+            entree = cache.obtenir(cle)
+            if entree is not ABSENT:
+                reponse = current_app.response_class(entree['corps'], status=200, headers=entree['entetes'])
+                return reponse.make_conditional(request)
+
+            # Les versions sont relevées avant le calcul : une écriture concurrente périme l'entrée
+            fixes = [etiquette.format(**kwargs) for etiquette in etiquettes_fixes]
+            versions_avant = cache.versions(fixes)
+            g.etiquettes_cache = set(fixes)
+            reponse = current_app.make_response(fonction(*args, **kwargs))
+            etiquettes = sorted(g.etiquettes_cache)
+            if g.get('lecture_replique') and cache.invalidees_recemment(etiquettes):
+                return reponse
+            if reponse.status_code == 200 and not reponse.is_streamed:
+                versions = {**cache.versions(etiquettes), **versions_avant}
+                cache.definir(cle, {
+                    'corps': reponse.get_data(),
+                    'entetes': [(nom, valeur) for nom, valeur in reponse.headers
+                                if nom in ('Content-Type', 'ETag', 'Last-Modified')],
+                    'etiquettes': etiquettes,
+                    'versions': versions
+                })
+            return reponse
+        return enveloppe
+    return decorateur
+
+
+def initialiser_cache_reponses(app):
+    """Enregistrer le cache des réponses si activé par la configuration"""
+    if not app.config.get('CACHE_REPONSES_ACTIVE'):
+        return
+    chemin = app.config.get('CACHE_REPONSES_PARTAGE')
+    cache = CacheReponses(
+        taille_max=app.config.get('CACHE_REPONSES_TAILLE', 2000),
+        ttl=app.config.get('CACHE_REPONSES_TTL', 30),
+        stockage=StockageCacheFichier(chemin) if chemin else None,
+        # Retard admis des répliques : la fenêtre de lecture du primaire après une écriture
+        retard_replique=app.config.get('LECTURE_PRIMAIRE_APRES_ECRITURE', 5)
+    )
+    app.extensions['cache_reponses'] = cache
+    abonner_invalidations(app, ESPACE, lambda etiquettes: cache.invalider(etiquettes, local_seulement=True))
+
+    metriques = app.extensions.get('metriques')
+    if metriques is not None:
+        # Le taux de succès se calcule côté Prometheus à partir de bibliotheque_cache_reponses_total
+        def jauges():
+            statistiques = cache.statistiques()
+            return {
+                'bibliotheque_cache_reponses_entrees': statistiques['entrees'],
+                'bibliotheque_cache_reponses_octets': statistiques['octets'],
+            }
+        metriques.ajouter_jauges(jauges)
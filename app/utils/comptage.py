@@ -0,0 +1,90 @@
+from flask import current_app
+from sqlalchemy import select, text, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.compteur import Compteur
+from app.utils.cache import CacheLRU, ABSENT
+
+# Totaux des requêtes filtrées, conservés quelques secondes
+CACHE_COMPTES = CacheLRU(taille_max=1000, ttl=30)
+
+
+def _requetes_compteurs():
+    """Requêtes de référence des compteurs maintenus lors des écritures"""
+    from app.models.book import Livre
+    from app.models.loan import Emprunt
+    return {
+        'livres': Livre.query,
+        'emprunts': Emprunt.query,
+        'emprunts_actifs': Emprunt.query.filter_by(date_retour_effective=None)
+    }
+
+
+def ajuster_compteur(nom, delta):
+    """Ajuster un compteur dans la transaction en cours"""
+    if delta:
+        db.session.execute(update(Compteur).where(Compteur.nom == nom).values(valeur=Compteur.valeur + delta))
+
+
+def recalculer_compteur(nom):
+    """Recalculer un compteur à partir d'un COUNT(*) exact"""
+    valeur = _requetes_compteurs()[nom].order_by(None).count()
+    compteur = db.session.get(Compteur, nom)
+    if compteur is None:
+        db.session.add(Compteur(nom=nom, valeur=valeur))
+    else:
+        compteur.valeur = valeur
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Un autre worker a initialisé le compteur en même temps
+        db.session.rollback()
+    return valeur
+
+
+def lire_compteur(nom):
+    """Lire la valeur d'un compteur maintenu, en l'initialisant au besoin"""
+    valeur = db.session.execute(select(Compteur.valeur).where(Compteur.nom == nom)).scalar()
+    if valeur is None:
+        valeur = recalculer_compteur(nom)
+    return valeur
+
+
+def estimer_lignes(table):
+    """Estimer le nombre de lignes d'une table à partir des statistiques du planificateur (PostgreSQL)"""
+    if db.engine.dialect.name != 'postgresql':
+        return None
+    estimation = db.session.execute(
+        text('SELECT reltuples::bigint FROM pg_class WHERE relname = :table'), {'table': table}
+    ).scalar()
+    return estimation if estimation is not None and estimation >= 0 else None
+
+
+def _cle_requete(requete):
+    compilee = requete.statement.compile(dialect=db.engine.dialect)
+    return str(compilee), tuple(sorted((cle, repr(valeur)) for cle, valeur in compilee.params.items()))
+
+
+def compter_total(requete, compteur=None, table=None):
+    """Obtenir le total d'une requête paginée
+
+    Retourne (total, exact). Le total provient, dans l'ordre, d'un compteur
+    maintenu lors des écritures, d'une estimation du planificateur pour les
+    très grandes tables non filtrées, ou d'un COUNT(*) mis en cache quelques
+    secondes pour les requêtes filtrées.
+    """
+    if compteur is not None:
+        return lire_compteur(compteur), True
+
+    if table is not None:
+        estimation = estimer_lignes(table)
+        if estimation is not None and estimation >= current_app.config.get('COMPTAGE_SEUIL_ESTIMATION', 1000000):
+            return estimation, False
+
+    cle = _cle_requete(requete)
+    total = CACHE_COMPTES.obtenir(cle)
+    if total is not ABSENT:
+        return total, False
+    total = requete.order_by(None).count()
+    CACHE_COMPTES.definir(cle, total, ttl=current_app.config.get('COMPTAGE_CACHE_TTL', 30))
+    return total, True
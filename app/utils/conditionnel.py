@@ -0,0 +1,41 @@
+import hashlib
+from functools import wraps
+from flask import make_response, request
+from werkzeug.http import is_resource_modified
+
+
+def calculer_etag(*parties):
+    """ETag fort calculé à partir des valeurs qui déterminent la représentation"""
+    empreinte = hashlib.sha1('|'.join(str(partie) for partie in parties).encode('utf-8')).hexdigest()
+    return empreinte[:32]
+
+
+def conditionnel(validateurs):
+    """Décorateur : répondre 304 aux requêtes conditionnelles sans construire la réponse
+
+    validateurs reçoit les arguments de l'endpoint et retourne (etag,
+    derniere_modification) à partir de requêtes légères (date de modification,
+    compteurs), sans charger les lignes. If-None-Match est prioritaire sur
+    If-Modified-Since.
+    """
+    def decorateur(fonction):
+        @wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            etag, derniere_modification = validateurs(*args, **kwargs)
+            # Deux endpoints aux mêmes validateurs (une catégorie et ses livres) ont des représentations distinctes
+            etag = calculer_etag(request.endpoint, etag)
+            if derniere_modification is not None:
+                # Les dates HTTP sont à la seconde près
+                derniere_modification = derniere_modification.replace(microsecond=0)
+            if not is_resource_modified(request.environ, etag=etag, last_modified=derniere_modification):
+                reponse = make_response('', 304)
+            else:
+                reponse = make_response(fonction(*args, **kwargs))
+                if reponse.status_code != 200:
+                    return reponse
+            reponse.set_etag(etag)
+            if derniere_modification is not None:
+                reponse.last_modified = derniere_modification
+            return reponse
+        return enveloppe
+    return decorateur
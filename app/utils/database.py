@@ -1,15 +1,108 @@
+import base64
+import binascii
+import json
+import math
+import sqlite3
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import wraps
+from flask import g, has_app_context, request
 from app import db
+from sqlalchemy import event, tuple_
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
-from app.utils.error_handler import ErreurServeur, ErreurNonTrouve, ErreurConflit
+from app.utils.error_handler import ErreurServeur, ErreurNonTrouve, ErreurConflit, ErreurRequeteInvalide
+from app.utils.comptage import compter_total
+
+def unite_de_travail_active():
+    """Une unité de travail englobe-t-elle l'appel (transaction validée à sa sortie) ?"""
+    return has_app_context() and g.get('profondeur_unite_de_travail', 0) > 0
 
 def valider_changements():
-    """Valider les changements dans la base de données"""
+    """Valider les changements dans la base de données
+
+    Dans une unité de travail, les changements sont seulement envoyés (flush) ;
+    la transaction est validée une seule fois, à la fin de l'unité.
+    """
     try:
-        db.session.commit()
+        if unite_de_travail_active():
+            db.session.flush()
+        else:
+            db.session.commit()
     except SQLAlchemyError as e:
         db.session.rollback()
         raise ErreurServeur(f"Erreur de base de données: {str(e)}")
 
+@contextmanager
+def unite_de_travail():
+    """Regrouper les écritures en une transaction validée une seule fois à la sortie
+
+    Les unités imbriquées rejoignent l'unité englobante. Une exception annule
+    toute la transaction.
+    """
+    profondeur = g.get('profondeur_unite_de_travail', 0)
+    g.profondeur_unite_de_travail = profondeur + 1
+    try:
+        yield db.session
+    except BaseException:
+        if profondeur == 0:
+            db.session.rollback()
+            g.pop('rappels_apres_validation', None)
+        raise
+    finally:
+        g.profondeur_unite_de_travail = profondeur
+
+    if profondeur == 0:
+        try:
+            valider_changements()
+        finally:
+            rappels = g.pop('rappels_apres_validation', [])
+        for rappel in rappels:
+            rappel()
+
+def transactionnel(fonction):
+    """Décorateur : exécuter un service ou un endpoint dans une unité de travail"""
+    @wraps(fonction)
+    def decorateur(*args, **kwargs):
+        with unite_de_travail():
+            return fonction(*args, **kwargs)
+    return decorateur
+
+def apres_validation(rappel):
+    """Exécuter rappel une fois la transaction validée (immédiatement hors unité de travail)"""
+    if unite_de_travail_active():
+        g.setdefault('rappels_apres_validation', []).append(rappel)
+    else:
+        rappel()
+
+def nombre_commits():
+    """Nombre de transactions validées pendant la requête en cours"""
+    return g.get('nombre_commits', 0) if has_app_context() else 0
+
+@event.listens_for(db.session, 'after_commit')
+def _compter_commit(session):
+    if has_app_context():
+        g.nombre_commits = g.get('nombre_commits', 0) + 1
+
+@event.listens_for(Engine, 'connect')
+def _activer_cles_etrangeres_sqlite(connexion_dbapi, enregistrement):
+    # SQLite n'applique les clés étrangères (et ON DELETE CASCADE) que sur demande, par connexion
+    if isinstance(connexion_dbapi, sqlite3.Connection):
+        curseur = connexion_dbapi.cursor()
+        curseur.execute('PRAGMA foreign_keys=ON')
+        curseur.close()
+
+def initialiser_unite_de_travail(app):
+    """Exposer le nombre de commits de chaque requête dans l'en-tête X-Nombre-Commits (tests)"""
+    if not app.testing:
+        return
+
+    @app.after_request
+    def ajouter_nombre_commits(reponse):
+        reponse.headers['X-Nombre-Commits'] = str(nombre_commits())
+        return reponse
+
 def ajouter_a_db(element):
     """Ajouter un élément à la base de données"""
     try:
@@ -50,18 +143,188 @@ def verifier_unique_ou_409(modele, champ, valeur, message="La ressource existe d
         raise ErreurConflit(message)
     return True
 
-def paginer_resultats(requete, page=1, par_page=10):
-    """Paginer les résultats de requête"""
+def parametres_pagination():
+    """Lire les paramètres de pagination de la requête HTTP"""
+    return {
+        'page': request.args.get('page', 1, type=int),
+        'par_page': request.args.get('par_page', 10, type=int),
+        'curseur': request.args.get('curseur'),
+        'avec_total': request.args.get('avec_total', 'false').lower() == 'true'
+    }
+
+def _valeur_vers_json(valeur):
+    if isinstance(valeur, datetime):
+        return {'dt': valeur.isoformat()}
+    if isinstance(valeur, date):
+        return {'d': valeur.isoformat()}
+    return valeur
+
+def _valeur_depuis_json(valeur):
+    if isinstance(valeur, dict):
+        if 'dt' in valeur:
+            return datetime.fromisoformat(valeur['dt'])
+        if 'd' in valeur:
+            return date.fromisoformat(valeur['d'])
+    return valeur
+
+def encoder_curseur(valeurs):
+    """Encoder les valeurs de la clé de tri en curseur opaque"""
+    brut = json.dumps([_valeur_vers_json(v) for v in valeurs], separators=(',', ':'))
+    return base64.urlsafe_b64encode(brut.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decoder_curseur(curseur):
+    """Décoder un curseur opaque en valeurs de la clé de tri"""
     try:
-        pagine = requete.paginate(page=page, per_page=par_page, error_out=False)
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4))
+        valeurs = json.loads(brut)
+        if not isinstance(valeurs, list):
+            raise ValueError(curseur)
+        return [_valeur_depuis_json(v) for v in valeurs]
+    except (binascii.Error, ValueError, TypeError):
+        raise ErreurRequeteInvalide("Curseur de pagination invalide")
+
+def _condition_apres(cles_tri, valeurs, descendant):
+    """Construire la condition (a, b, ...) > (va, vb, ...) (< en ordre décroissant)
+
+    La comparaison de tuples (row value) donne au planificateur une borne sur
+    l'index de la clé de tri : une page profonde coûte autant que la première.
+    """
+    if len(cles_tri) == 1:
+        return cles_tri[0] < valeurs[0] if descendant else cles_tri[0] > valeurs[0]
+    cles, bornes = tuple_(*cles_tri), tuple_(*valeurs)
+    return cles < bornes if descendant else cles > bornes
+
+def _valeur_de_tri(element, cle):
+    """Lire la valeur d'une clé de tri sur un objet du modèle ou une ligne (modèle, colonnes calculées)"""
+    if hasattr(element, '_mapping'):
+        if cle.key in element._mapping:
+            return element._mapping[cle.key]
+        element = element[0]
+    return getattr(element, cle.key)
+
+def _paginer_par_curseur(requete, par_page, curseur, cles_tri, descendant, avec_total, compteur, table):
+    valeurs = decoder_curseur(curseur) if curseur else None
+    if valeurs is not None and len(valeurs) != len(cles_tri):
+        raise ErreurRequeteInvalide("Curseur de pagination invalide")
+
+    total, total_exact = compter_total(requete, compteur, table) if avec_total else (None, None)
+
+    requete_page = requete
+    if valeurs is not None:
+        requete_page = requete_page.filter(_condition_apres(cles_tri, valeurs, descendant))
+    requete_page = requete_page.order_by(*[cle.desc() if descendant else cle.asc() for cle in cles_tri])
+
+    # Lire un élément de plus pour savoir s'il existe une page suivante
+    elements = requete_page.limit(par_page + 1).all()
+    a_suivant = len(elements) > par_page
+    elements = elements[:par_page]
+    curseur_suivant = None
+    if a_suivant:
+        dernier = elements[-1]
+        curseur_suivant = encoder_curseur([_valeur_de_tri(dernier, cle) for cle in cles_tri])
+
+    return {
+        'elements': elements,
+        'par_page': par_page,
+        'curseur_suivant': curseur_suivant,
+        'a_suivant': a_suivant,
+        'total': total,
+        'total_exact': total_exact
+    }
+
+def paginer_resultats(requete, page=1, par_page=10, curseur=None, cles_tri=None, descendant=False, avec_total=False,
+                      compteur=None, table=None):
+    """Paginer les résultats de requête
+
+    Sans curseur, la pagination par numéro de page (OFFSET) est conservée.
+    Avec un curseur (chaîne vide pour la première page), la page suivante est lue
+    par recherche sur la clé de tri (cles_tri, terminée par l'id), et le total
+    n'est calculé que si avec_total est demandé.
+    Le total est obtenu par compter_total (compteur maintenu, estimation de la
+    table ou COUNT(*) mis en cache).
+    """
+    try:
+        if curseur is not None:
+            if cles_tri is None:
+                cles_tri = (requete.column_descriptions[0]['entity'].id,)
+            return _paginer_par_curseur(requete, par_page, curseur, cles_tri, descendant, avec_total, compteur, table)
+
+        pagine = requete.paginate(page=page, per_page=par_page, error_out=False, count=False)
+        total, total_exact = compter_total(requete, compteur, table)
+        pages = math.ceil(total / pagine.per_page) if total else 0
         return {
             'elements': pagine.items,
             'page': pagine.page,
             'par_page': pagine.per_page,
-            'total': pagine.total,
-            'pages': pagine.pages,
-            'a_suivant': pagine.has_next,
-            'a_precedent': pagine.has_prev
+            'total': total,
+            'total_exact': total_exact,
+            'pages': pages,
+            'a_suivant': pagine.page < pages,
+            'a_precedent': pagine.page > 1
         }
     except SQLAlchemyError as e:
         raise ErreurServeur(f"Erreur lors de la pagination des résultats: {str(e)}")
+
+def paginer_identifiants(modele, ids, page=1, par_page=10, curseur=None, avec_total=False):
+    """Paginer une liste triée d'identifiants déjà calculée (par exemple par un index en mémoire)"""
+    if curseur is not None:
+        debut = 0
+        if curseur:
+            valeurs = decoder_curseur(curseur)
+            if len(valeurs) != 1:
+                raise ErreurRequeteInvalide("Curseur de pagination invalide")
+            debut = bisect_right(ids, valeurs[0])
+    else:
+        page = max(page, 1)
+        debut = (page - 1) * par_page
+    ids_page = ids[debut:debut + par_page]
+
+    try:
+        par_id = {element.id: element for element in modele.query.filter(modele.id.in_(ids_page))} if ids_page else {}
+    except SQLAlchemyError as e:
+        raise ErreurServeur(f"Erreur lors de la pagination des résultats: {str(e)}")
+    # Conserver l'ordre de l'index ; un élément supprimé entre-temps est ignoré
+    elements = [par_id[i] for i in ids_page if i in par_id]
+    a_suivant = debut + par_page < len(ids)
+
+    if curseur is not None:
+        return {
+            'elements': elements,
+            'par_page': par_page,
+            'curseur_suivant': encoder_curseur([ids_page[-1]]) if a_suivant else None,
+            'a_suivant': a_suivant,
+            'total': len(ids) if avec_total else None,
+            'total_exact': True if avec_total else None
+        }
+    return {
+        'elements': elements,
+        'page': page,
+        'par_page': par_page,
+        'total': len(ids),
+        'total_exact': True,
+        'pages': math.ceil(len(ids) / par_page) if ids else 0,
+        'a_suivant': a_suivant,
+        'a_precedent': page > 1
+    }
+
+def pagination_vers_dict(resultat):
+    """Convertir le résultat de paginer_resultats en bloc 'pagination' de la réponse"""
+    if 'curseur_suivant' in resultat:
+        pagination = {
+            'par_page': resultat['par_page'],
+            'curseur_suivant': resultat['curseur_suivant'],
+            'a_suivant': resultat['a_suivant']
+        }
+        if resultat['total'] is not None:
+            pagination['total'] = resultat['total']
+            pagination['total_exact'] = resultat['total_exact']
+        return pagination
+    return {
+        'page': resultat['page'],
+        'par_page': resultat['par_page'],
+        'total': resultat['total'],
+        'total_exact': resultat['total_exact'],
+        'pages': resultat['pages'],
+        'a_suivant': resultat['a_suivant'],
+        'a_precedent': resultat['a_precedent']
+    }
@@ -0,0 +1,92 @@
+import atexit
+import os
+import threading
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+
+# Nombre maximal de lignes par instruction UPDATE groupée
+TAILLE_LOT = 1000
+
+
+class TamponDerniereConnexion:
+    """Tampon des dates de dernière connexion, écrites en base par lots"""
+
+    def __init__(self, app, intervalle=5.0):
+        self.app = app
+        self.intervalle = intervalle
+        self._en_attente = {}
+        self._verrou = threading.Lock()
+        self._arret = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.vider)
+
+    def _demarrer(self):
+        # Le thread est démarré dans chaque worker après le fork
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._verrou:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._boucle, name='derniere-connexion', daemon=True)
+            self._thread.start()
+
+    def _boucle(self):
+        while not self._arret.wait(self.intervalle):
+            self.vider()
+
+    def enregistrer(self, utilisateur_id, horodatage):
+        """Mémoriser la date de connexion d'un utilisateur jusqu'au prochain vidage"""
+        self._demarrer()
+        with self._verrou:
+            precedent = self._en_attente.get(utilisateur_id)
+            if precedent is None or precedent < horodatage:
+                self._en_attente[utilisateur_id] = horodatage
+
+    def vider(self):
+        """Écrire en base toutes les dates en attente"""
+        with self._verrou:
+            en_attente, self._en_attente = self._en_attente, {}
+        if not en_attente:
+            return
+        lignes = list(en_attente.items())
+        try:
+            with self.app.app_context(), db.engine.begin() as connexion:
+                for debut in range(0, len(lignes), TAILLE_LOT):
+                    self._ecrire_lot(connexion, lignes[debut:debut + TAILLE_LOT])
+        except SQLAlchemyError as e:
+            self.app.logger.error(f"Erreur lors de l'écriture des dernières connexions: {str(e)}")
+            # Remettre les dates en attente pour le prochain vidage
+            with self._verrou:
+                for utilisateur_id, horodatage in lignes:
+                    precedent = self._en_attente.get(utilisateur_id)
+                    if precedent is None or precedent < horodatage:
+                        self._en_attente[utilisateur_id] = horodatage
+
+    def _ecrire_lot(self, connexion, lot):
+        if connexion.dialect.name == 'postgresql':
+            valeurs = ', '.join(f'(:id_{i}, CAST(:date_{i} AS TIMESTAMP))' for i in range(len(lot)))
+            parametres = {}
+            for i, (utilisateur_id, horodatage) in enumerate(lot):
+                parametres[f'id_{i}'] = utilisateur_id
+                parametres[f'date_{i}'] = horodatage
+            connexion.execute(text(
+                'UPDATE utilisateurs AS u SET derniere_connexion = v.derniere_connexion '
+                f'FROM (VALUES {valeurs}) AS v(id, derniere_connexion) '
+                'WHERE u.id = v.id AND (u.derniere_connexion IS NULL OR u.derniere_connexion < v.derniere_connexion)'
+            ), parametres)
+        else:
+            connexion.execute(text(
+                'UPDATE utilisateurs SET derniere_connexion = :date '
+                'WHERE id = :id AND (derniere_connexion IS NULL OR derniere_connexion < :date)'
+            ), [{'id': utilisateur_id, 'date': horodatage} for utilisateur_id, horodatage in lot])
+
+
+def initialiser_ecriture_differee(app):
+    """Enregistrer le tampon des dernières connexions si l'écriture différée est activée"""
+    if app.config.get('DERNIERE_CONNEXION_DIFFEREE'):
+        app.extensions['derniere_connexion'] = TamponDerniereConnexion(
+            app, intervalle=app.config.get('DERNIERE_CONNEXION_INTERVALLE', 5.0)
+        )
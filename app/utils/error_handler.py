@@ -1,4 +1,5 @@
 from flask import jsonify
+from app.utils.metriques import incrementer_metrique
 
 class ErreurAPI(Exception):
     """Classe de base pour les erreurs API"""
@@ -49,14 +50,29 @@ class ErreurServeur(ErreurAPI):
     def __init__(self, message="Erreur interne du serveur", payload=None):
         super().__init__(message, 500, payload)
 
+class ErreurBudgetRequetes(ErreurServeur):
+    """Exception levée en mode strict lorsqu'une requête dépasse son budget de requêtes SQL"""
+    def __init__(self, message="Budget de requêtes SQL dépassé", payload=None):
+        super().__init__(message, payload)
+
+class ErreurServiceIndisponible(ErreurAPI):
+    """Exception levée lorsque le service est temporairement saturé"""
+    def __init__(self, message="Service temporairement indisponible", payload=None):
+        super().__init__(message, 503, payload)
+
+def reponse_erreur(erreur):
+    """Construire la réponse JSON d'une ErreurAPI"""
+    incrementer_metrique('bibliotheque_erreurs_api_total', type(erreur).__name__)
+    reponse = jsonify(erreur.vers_dict())
+    reponse.status_code = erreur.code_statut
+    return reponse
+
 def enregistrer_gestionnaires_erreurs(app):
     """Enregistrer les gestionnaires d'erreurs pour l'application Flask"""
 
     @app.errorhandler(ErreurAPI)
     def gerer_erreur_api(erreur):
-        reponse = jsonify(erreur.vers_dict())
-        reponse.status_code = erreur.code_statut
-        return reponse
+        return reponse_erreur(erreur)
 
     @app.errorhandler(400)
     def gerer_requete_invalide(erreur):
@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from flask import Response, stream_with_context
+from app import db
+from app.utils.error_handler import ErreurRequeteInvalide
+
+# Lignes lues par aller-retour du curseur côté serveur et écrites par morceau de réponse
+TAILLE_LOT_EXPORT = 1000
+
+TYPES_EXPORT = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def format_export(format_demande):
+    """Valider le format d'export demandé (ndjson par défaut)"""
+    format_fichier = (format_demande or 'ndjson').lower()
+    if format_fichier not in TYPES_EXPORT:
+        raise ErreurRequeteInvalide("Format d'export non supporté (ndjson ou csv)")
+    return format_fichier
+
+
+def _valeur_export(valeur):
+    if isinstance(valeur, (datetime, date)):
+        return valeur.isoformat()
+    return valeur
+
+
+def flux_export(requete, champs, format_fichier, transformer=None):
+    """Écrire les lignes d'une requête SELECT en NDJSON ou CSV, par morceaux
+
+    Les lignes sont lues par lots (yield_per, curseur côté serveur sur
+    PostgreSQL) sans construire d'objets du modèle ; transformer peut
+    compléter chaque ligne (dictionnaire) avec des champs calculés.
+    """
+    resultat = db.session.execute(requete.execution_options(yield_per=TAILLE_LOT_EXPORT))
+    try:
+        if format_fichier == 'csv':
+            tampon = io.StringIO()
+            ecrivain = csv.writer(tampon)
+            ecrivain.writerow(champs)
+            yield tampon.getvalue()
+        for lot in resultat.partitions():
+            tampon = io.StringIO()
+            ecrivain = csv.writer(tampon) if format_fichier == 'csv' else None
+            for ligne in lot:
+                donnees = ligne._asdict()
+                if transformer is not None:
+                    donnees = transformer(donnees)
+                valeurs = [_valeur_export(donnees.get(champ)) for champ in champs]
+                if ecrivain is not None:
+                    ecrivain.writerow(valeurs)
+                else:
+                    tampon.write(json.dumps(dict(zip(champs, valeurs)), ensure_ascii=False))
+                    tampon.write('\n')
+            yield tampon.getvalue()
+    finally:
+        resultat.close()
+
+
+def reponse_export(flux, format_fichier, nom):
+    """Réponse HTTP en continu pour un flux d'export"""
+    return Response(
+        stream_with_context(flux),
+        mimetype=TYPES_EXPORT[format_fichier],
+        headers={'Content-Disposition': f'attachment; filename={nom}.{format_fichier}'}
+    )
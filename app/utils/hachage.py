@@ -0,0 +1,125 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as DelaiDepasse
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+from flask import current_app, has_app_context
+from app.utils.error_handler import ErreurServiceIndisponible
+from app.utils.metriques import observer_metrique
+
+COUT_PAR_DEFAUT = 12
+
+
+def _hacher(mot_de_passe, cout):
+    """Hacher un mot de passe (exécuté dans un processus du pool)"""
+    return bcrypt.hashpw(mot_de_passe.encode('utf-8'), bcrypt.gensalt(rounds=cout)).decode('utf-8')
+
+
+def _verifier(mot_de_passe_hash, mot_de_passe):
+    """Vérifier un mot de passe (exécuté dans un processus du pool)"""
+    return bcrypt.checkpw(mot_de_passe.encode('utf-8'), mot_de_passe_hash.encode('utf-8'))
+
+
+class PoolHachage:
+    """Pool de processus borné pour les calculs bcrypt, hors des threads de requête"""
+
+    def __init__(self, nombre_workers=2, file_max=16, delai=10.0):
+        self.nombre_workers = nombre_workers
+        self.file_max = file_max
+        self.delai = delai
+        self._places = threading.BoundedSemaphore(nombre_workers + file_max) if nombre_workers else None
+        self._executeur = None
+        self._pid = None
+        self._verrou = threading.Lock()
+
+    def _obtenir_executeur(self):
+        # Un pool par processus : les workers gunicorn ne partagent pas l'exécuteur du maître
+        if self._executeur is None or self._pid != os.getpid():
+            with self._verrou:
+                if self._executeur is None or self._pid != os.getpid():
+                    self._executeur = ProcessPoolExecutor(
+                        max_workers=self.nombre_workers,
+                        mp_context=multiprocessing.get_context('forkserver')
+                    )
+                    self._pid = os.getpid()
+        return self._executeur
+
+    def executer(self, fonction, *args):
+        """Exécuter un calcul bcrypt dans le pool, ou rejeter immédiatement si le pool est saturé"""
+        if not self.nombre_workers:
+            return fonction(*args)
+        if not self._places.acquire(blocking=False):
+            raise ErreurServiceIndisponible("Trop de requêtes d'authentification simultanées, veuillez réessayer")
+        try:
+            futur = self._obtenir_executeur().submit(fonction, *args)
+        except Exception:
+            self._places.release()
+            raise
+        futur.add_done_callback(lambda _: self._places.release())
+        try:
+            return futur.result(timeout=self.delai)
+        except DelaiDepasse:
+            raise ErreurServiceIndisponible("Le délai de vérification du mot de passe a été dépassé")
+        except BrokenProcessPool:
+            # Recréer le pool à la prochaine demande
+            self._executeur = None
+            raise ErreurServiceIndisponible("Le service de vérification des mots de passe a redémarré")
+
+    def arreter(self):
+        if self._executeur is not None:
+            self._executeur.shutdown(wait=False, cancel_futures=True)
+            self._executeur = None
+
+
+def initialiser_hachage(app):
+    """Enregistrer le pool de hachage de l'application"""
+    app.extensions['hachage'] = PoolHachage(
+        nombre_workers=app.config.get('BCRYPT_POOL_WORKERS', 2),
+        file_max=app.config.get('BCRYPT_POOL_QUEUE_MAX', 16),
+        delai=app.config.get('BCRYPT_POOL_TIMEOUT', 10.0)
+    )
+
+
+def _pool():
+    if has_app_context() and 'hachage' in current_app.extensions:
+        return current_app.extensions['hachage']
+    return PoolHachage(nombre_workers=0)
+
+
+def cout_configure():
+    """Obtenir le facteur de coût bcrypt configuré"""
+    if has_app_context():
+        return current_app.config.get('BCRYPT_LOG_ROUNDS', COUT_PAR_DEFAUT)
+    return COUT_PAR_DEFAUT
+
+
+def cout_du_hash(mot_de_passe_hash):
+    """Extraire le facteur de coût d'un hash bcrypt ($2b$12$...)"""
+    try:
+        return int(mot_de_passe_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def hacher_mot_de_passe(mot_de_passe):
+    """Hacher un mot de passe avec le coût configuré"""
+    if not mot_de_passe:
+        raise ValueError('Le mot de passe ne peut pas être vide.')
+    debut = time.perf_counter()
+    try:
+        return _pool().executer(_hacher, mot_de_passe, cout_configure())
+    finally:
+        observer_metrique('bibliotheque_bcrypt_duree_secondes', time.perf_counter() - debut, 'hacher')
+
+
+def verifier_mot_de_passe(mot_de_passe_hash, mot_de_passe):
+    """Vérifier un mot de passe par rapport à son hash"""
+    if not mot_de_passe_hash or not mot_de_passe:
+        return False
+    debut = time.perf_counter()
+    try:
+        return _pool().executer(_verifier, mot_de_passe_hash, mot_de_passe)
+    finally:
+        observer_metrique('bibliotheque_bcrypt_duree_secondes', time.perf_counter() - debut, 'verifier')
@@ -0,0 +1,65 @@
+import codecs
+import csv
+import json
+from app.utils.error_handler import ErreurRequeteInvalide
+
+FORMATS_IMPORT = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+
+def format_import(type_contenu, format_demande=None):
+    """Déterminer le format d'import (csv ou ndjson) depuis le paramètre format ou le Content-Type"""
+    if format_demande:
+        if format_demande not in ('csv', 'ndjson'):
+            raise ErreurRequeteInvalide("Format d'import non supporté (csv ou ndjson)")
+        return format_demande
+    type_mime = (type_contenu or '').split(';')[0].strip().lower()
+    if type_mime not in FORMATS_IMPORT:
+        raise ErreurRequeteInvalide("Type de contenu non supporté : text/csv ou application/x-ndjson attendu")
+    return FORMATS_IMPORT[type_mime]
+
+
+def _lignes_texte(flux):
+    """Décoder le flux binaire de la requête ligne par ligne, sans le charger en mémoire"""
+    decodeur = codecs.getincrementaldecoder('utf-8-sig')()
+    reste = ''
+    try:
+        for morceau in iter(lambda: flux.read(64 * 1024), b''):
+            reste += decodeur.decode(morceau)
+            *lignes, reste = reste.split('\n')
+            for ligne in lignes:
+                yield ligne + '\n'
+        reste += decodeur.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise ErreurRequeteInvalide("Le fichier d'import doit être encodé en UTF-8")
+    if reste:
+        yield reste
+
+
+def lire_lignes_import(flux, format_fichier):
+    """Lire les lignes d'un import en continu
+
+    Produit des couples (numéro de ligne, données) où les données sont un
+    dictionnaire, ou une chaîne décrivant l'erreur de lecture de la ligne.
+    """
+    if format_fichier == 'csv':
+        lecteur = csv.DictReader(_lignes_texte(flux))
+        for donnees in lecteur:
+            # Les cellules vides sont traitées comme des champs absents
+            yield lecteur.line_num, {cle: valeur.strip() for cle, valeur in donnees.items()
+                                     if cle is not None and valeur not in (None, '')}
+        return
+
+    for numero, ligne in enumerate(_lignes_texte(flux), start=1):
+        if not ligne.strip():
+            continue
+        try:
+            donnees = json.loads(ligne)
+        except ValueError:
+            yield numero, "JSON invalide"
+            continue
+        yield numero, donnees if isinstance(donnees, dict) else "Un objet JSON est attendu"
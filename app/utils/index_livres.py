@@ -0,0 +1,198 @@
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from flask import current_app
+from app import db
+from app.models.book import Livre
+from app.utils.texte import decouper
+from app.utils.bus_invalidation import abonner_invalidations
+
+# Nombre de lignes lues par lot lors de la construction de l'index
+TAILLE_LOT = 5000
+
+
+def _mots_du_livre(titre, auteur, isbn):
+    return frozenset(decouper(titre) + decouper(auteur) + decouper(isbn))
+
+
+class IndexInverse:
+    """Index inversé en mémoire du catalogue : mot -> liste triée d'identifiants de livres"""
+
+    def __init__(self, app):
+        self.app = app
+        self.pret = False
+        self._postings = {}
+        self._mots_par_livre = {}
+        self._vocabulaire = []
+        self._vocabulaire_a_jour = False
+        self._verrou = threading.RLock()
+        self._pid = None
+        self.duree_construction = None
+
+    def demarrer(self):
+        """Lancer la construction de l'index en arrière-plan (une fois par worker)"""
+        if self._pid == os.getpid():
+            return
+        with self._verrou:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.pret = False
+            threading.Thread(target=self.construire, name='index-livres', daemon=True).start()
+
+    def reconstruire(self):
+        """Reconstruire en arrière-plan ; la version actuelle reste servie jusqu'au remplacement"""
+        if self.pret:
+            threading.Thread(target=self.construire, name='index-livres', daemon=True).start()
+
+    def construire(self):
+        """Construire l'index par un parcours en continu de la table livres"""
+        debut = time.perf_counter()
+        postings, mots_par_livre = {}, {}
+        try:
+            with self.app.app_context():
+                lignes = db.session.query(Livre.id, Livre.titre, Livre.auteur, Livre.isbn) \
+                    .order_by(Livre.id).yield_per(TAILLE_LOT)
+                for livre_id, titre, auteur, isbn in lignes:
+                    mots = _mots_du_livre(titre, auteur, isbn)
+                    mots_par_livre[livre_id] = mots
+                    for mot in mots:
+                        postings.setdefault(mot, []).append(livre_id)
+                db.session.remove()
+        except Exception as e:
+            self.app.logger.error(f"Erreur lors de la construction de l'index des livres: {str(e)}")
+            return
+
+        with self._verrou:
+            # Les identifiants sont lus par ordre croissant : les listes sont déjà triées
+            self._postings = {mot: array('I', ids) for mot, ids in postings.items()}
+            self._mots_par_livre = mots_par_livre
+            self._vocabulaire_a_jour = False
+            self.duree_construction = time.perf_counter() - debut
+            self.pret = True
+        statistiques = self.statistiques()
+        self.app.logger.info(
+            f"Index des livres construit en {statistiques['duree_construction']:.3f}s : "
+            f"{statistiques['livres']} livres, {statistiques['mots']} mots, "
+            f"{statistiques['memoire_octets'] / 1024:.0f} Kio"
+        )
+
+    def _retirer(self, livre_id):
+        for mot in self._mots_par_livre.pop(livre_id, ()):
+            ids = self._postings.get(mot)
+            if ids is None:
+                continue
+            position = bisect_left(ids, livre_id)
+            if position < len(ids) and ids[position] == livre_id:
+                ids.pop(position)
+            if not ids:
+                del self._postings[mot]
+                self._vocabulaire_a_jour = False
+
+    def mettre_a_jour(self, livre):
+        """Ajouter ou remplacer un livre dans l'index"""
+        if not self.pret:
+            return
+        with self._verrou:
+            self._retirer(livre.id)
+            mots = _mots_du_livre(livre.titre, livre.auteur, livre.isbn)
+            self._mots_par_livre[livre.id] = mots
+            for mot in mots:
+                ids = self._postings.get(mot)
+                if ids is None:
+                    self._postings[mot] = array('I', [livre.id])
+                    self._vocabulaire_a_jour = False
+                else:
+                    insort(ids, livre.id)
+
+    def supprimer(self, livre_id):
+        """Retirer un livre de l'index"""
+        if not self.pret:
+            return
+        with self._verrou:
+            self._retirer(livre_id)
+
+    def _ids_pour_prefixe(self, prefixe):
+        if not self._vocabulaire_a_jour:
+            self._vocabulaire = sorted(self._postings)
+            self._vocabulaire_a_jour = True
+        debut = bisect_left(self._vocabulaire, prefixe)
+        fin = bisect_left(self._vocabulaire, prefixe + '\uffff', debut)
+        if fin - debut == 1:
+            return set(self._postings[self._vocabulaire[debut]])
+        ids = set()
+        for mot in self._vocabulaire[debut:fin]:
+            ids.update(self._postings[mot])
+        return ids
+
+    def rechercher(self, terme):
+        """Identifiants triés des livres contenant tous les mots du terme (chaque mot comme préfixe)
+
+        Retourne None tant que l'index n'est pas construit.
+        """
+        if not self.pret:
+            return None
+        mots = decouper(terme)
+        if not mots:
+            return []
+        with self._verrou:
+            ensembles = sorted((self._ids_pour_prefixe(mot) for mot in mots), key=len)
+        resultat = ensembles[0]
+        for ensemble in ensembles[1:]:
+            resultat = resultat & ensemble
+            if not resultat:
+                break
+        return sorted(resultat)
+
+    def statistiques(self):
+        """Obtenir la taille et l'empreinte mémoire approximative de l'index"""
+        with self._verrou:
+            memoire = sys.getsizeof(self._postings) + sys.getsizeof(self._mots_par_livre)
+            for mot, ids in self._postings.items():
+                memoire += sys.getsizeof(mot) + sys.getsizeof(ids)
+            for mots in self._mots_par_livre.values():
+                memoire += sys.getsizeof(mots)
+            return {
+                'pret': self.pret,
+                'livres': len(self._mots_par_livre),
+                'mots': len(self._postings),
+                'memoire_octets': memoire,
+                'duree_construction': self.duree_construction
+            }
+
+
+def rafraichir_livres(index, ids):
+    """Relire les livres modifiés par un autre processus et les répercuter dans index
+
+    La valeur * (import en masse) reconstruit l'index.
+    """
+    if '*' in ids:
+        index.reconstruire()
+        return
+    ids = {int(livre_id) for livre_id in ids}
+    lignes = db.session.query(Livre.id, Livre.titre, Livre.auteur, Livre.isbn).filter(Livre.id.in_(ids)).all()
+    for livre_id, titre, auteur, isbn in lignes:
+        index.mettre_a_jour(Livre(id=livre_id, titre=titre, auteur=auteur, isbn=isbn))
+    for livre_id in ids - {ligne[0] for ligne in lignes}:
+        index.supprimer(livre_id)
+
+
+def initialiser_index_livres(app):
+    """Enregistrer l'index en mémoire du catalogue si activé par la configuration"""
+    if not app.config.get('INDEX_LIVRES_MEMOIRE'):
+        return
+    index = IndexInverse(app)
+    app.extensions['index_livres'] = index
+    abonner_invalidations(app, 'livres', lambda ids: rafraichir_livres(index, ids))
+
+    @app.before_request
+    def demarrer_index_livres():
+        index.demarrer()
+
+
+def obtenir_index_livres():
+    """Obtenir l'index en mémoire du catalogue, ou None s'il est désactivé"""
+    return current_app.extensions.get('index_livres')
@@ -0,0 +1,99 @@
+import time
+from collections import Counter
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from app import db
+from app.utils.error_handler import ErreurBudgetRequetes, reponse_erreur
+
+
+def _parametres_masques(parametres, executemany):
+    """Décrire les paramètres d'une requête sans leurs valeurs (types seulement)"""
+    if executemany:
+        return f'{len(parametres)} lignes'
+    if isinstance(parametres, dict):
+        return {cle: type(valeur).__name__ for cle, valeur in parametres.items()}
+    return [type(valeur).__name__ for valeur in parametres or ()]
+
+
+def _avant_execution(connexion, curseur, instruction, parametres, contexte, executemany):
+    contexte._debut_instrumentation = time.perf_counter()
+
+
+def _apres_execution(connexion, curseur, instruction, parametres, contexte, executemany):
+    debut = getattr(contexte, '_debut_instrumentation', None)
+    if debut is None or not has_app_context():
+        return
+    duree = time.perf_counter() - debut
+    config = current_app.config
+
+    if duree * 1000 >= config.get('SQL_SEUIL_LENT_MS', 200):
+        current_app.logger.warning(
+            f"Requête SQL lente ({duree * 1000:.1f} ms) : {' '.join(instruction.split())} "
+            f"-- paramètres : {_parametres_masques(parametres, executemany)}"
+        )
+
+    if not has_request_context():
+        return
+    g.requetes_sql = g.get('requetes_sql', 0) + 1
+    g.duree_sql = g.get('duree_sql', 0.0) + duree
+    g.setdefault('instructions_sql', Counter())[instruction] += 1
+
+
+def statistiques_requete():
+    """Nombre de requêtes SQL et durée cumulée (secondes) de la requête HTTP en cours"""
+    return g.get('requetes_sql', 0), g.get('duree_sql', 0.0)
+
+
+def initialiser_instrumentation(app):
+    """Mesurer les requêtes SQL de chaque requête HTTP
+
+    Le nombre de requêtes et leur durée cumulée sont exposés dans l'en-tête
+    Server-Timing ; les requêtes lentes sont journalisées sans la valeur de
+    leurs paramètres, et une même instruction répétée au-delà du seuil est
+    signalée comme N+1 probable. Au-delà de SQL_BUDGET_REQUETES, un
+    avertissement est journalisé, ou la réponse est remplacée par celle
+    d'ErreurBudgetRequetes (500) en mode strict (tests) ; le dépassement est
+    conservé dans g.depassement_budget_sql.
+    """
+    if not app.config.get('SQL_INSTRUMENTATION'):
+        return
+
+    with app.app_context():
+        for moteur in db.engines.values():
+            event.listen(moteur, 'before_cursor_execute', _avant_execution)
+            event.listen(moteur, 'after_cursor_execute', _apres_execution)
+
+    @app.before_request
+    def demarrer_chronometre():
+        g.debut_requete = time.perf_counter()
+
+    @app.after_request
+    def ajouter_server_timing(reponse):
+        nombre, duree = statistiques_requete()
+        total = time.perf_counter() - g.get('debut_requete', time.perf_counter())
+        reponse.headers.add(
+            'Server-Timing',
+            f'db;desc="{nombre} requetes";dur={duree * 1000:.1f}, app;dur={total * 1000:.1f}'
+        )
+
+        seuil_repetitions = app.config.get('SQL_SEUIL_REPETITIONS', 10)
+        for instruction, repetitions in g.get('instructions_sql', Counter()).most_common():
+            if repetitions < seuil_repetitions:
+                break
+            app.logger.warning(
+                f"N+1 probable sur {request.method} {request.path} : instruction exécutée "
+                f"{repetitions} fois : {' '.join(instruction.split())}"
+            )
+
+        budget = app.config.get('SQL_BUDGET_REQUETES', 0)
+        if budget and nombre > budget:
+            message = (f"{request.method} {request.path} a exécuté {nombre} requêtes SQL "
+                       f"(budget : {budget})")
+            g.depassement_budget_sql = message
+            if app.config.get('SQL_BUDGET_STRICT'):
+                # Une exception levée dans after_request deviendrait une erreur 500 générique
+                reponse_budget = reponse_erreur(ErreurBudgetRequetes(message))
+                reponse_budget.headers['Server-Timing'] = reponse.headers['Server-Timing']
+                return reponse_budget
+            app.logger.warning(message)
+        return reponse
@@ -0,0 +1,282 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, has_app_context, request
+from app import db
+
+DUREES_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DUREES_BCRYPT = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DUREES_ATTENTE_POOL = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+# nom -> (type, aide, noms des étiquettes, bornes des histogrammes)
+DEFINITIONS = {
+    'bibliotheque_http_requete_duree_secondes': (
+        'histogram', 'Durée des requêtes HTTP', ('blueprint', 'endpoint'), DUREES_HTTP),
+    'bibliotheque_http_reponse_taille_octets': (
+        'summary', 'Taille des réponses HTTP', ('blueprint', 'endpoint'), None),
+    'bibliotheque_erreurs_api_total': (
+        'counter', 'Erreurs ErreurAPI levées, par classe', ('type',), None),
+    'bibliotheque_bcrypt_duree_secondes': (
+        'histogram', 'Durée des hachages et vérifications bcrypt (file d\'attente comprise)', ('operation',),
+        DUREES_BCRYPT),
+    'bibliotheque_pool_attente_secondes': (
+        'histogram', 'Attente d\'une connexion du pool SQLAlchemy', (), DUREES_ATTENTE_POOL),
+    'bibliotheque_pool_connexions_utilisees': (
+        'gauge', 'Connexions du pool SQLAlchemy actuellement empruntées', (), None),
+    'bibliotheque_pool_debordement': (
+        'gauge', 'Connexions ouvertes au-delà de la taille du pool SQLAlchemy', (), None),
+    'bibliotheque_pool_en_attente': (
+        'gauge', 'Threads en attente d\'une connexion du pool SQLAlchemy', (), None),
+    'bibliotheque_cache_reponses_total': (
+        'counter', 'Consultations du cache des réponses, par niveau servant la réponse', ('resultat',), None),
+    'bibliotheque_cache_reponses_entrees': (
+        'gauge', 'Réponses conservées dans le niveau local du cache', (), None),
+    'bibliotheque_cache_reponses_octets': (
+        'gauge', 'Mémoire occupée par les corps et étiquettes du niveau local du cache', (), None),
+}
+
+
+class Metriques:
+    """Métriques d'un processus, publiées périodiquement dans un répertoire partagé
+
+    Chaque worker n'écrit que dans sa propre mémoire (une section critique de
+    quelques opérations) ; un instantané JSON par processus est écrit dans
+    repertoire, et /metrics additionne les instantanés de tous les workers.
+    """
+
+    def __init__(self, repertoire=None, intervalle=5.0):
+        self.repertoire = repertoire
+        self.intervalle = intervalle
+        self._valeurs = {}
+        self._verrou = threading.Lock()
+        self._attentes_pool = 0
+        self._pid = None
+        self._thread = None
+        self._fonctions_jauges = []
+        if repertoire:
+            os.makedirs(repertoire, exist_ok=True)
+            atexit.register(self.publier)
+
+    def _demarrer(self):
+        # Le thread de publication est démarré dans chaque worker après le fork
+        if not self.repertoire or (self._pid == os.getpid() and self._thread is not None):
+            return
+        with self._verrou:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Les valeurs héritées du maître appartiennent à son instantané
+                self._valeurs = {}
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._boucle, name='metriques', daemon=True)
+            self._thread.start()
+
+    def _boucle(self):
+        while True:
+            time.sleep(self.intervalle)
+            self.publier()
+
+    def incrementer(self, nom, etiquettes=(), valeur=1):
+        """Augmenter un compteur"""
+        self._demarrer()
+        cle = (nom, etiquettes)
+        with self._verrou:
+            self._valeurs[cle] = self._valeurs.get(cle, 0) + valeur
+
+    def observer(self, nom, valeur, etiquettes=()):
+        """Enregistrer une observation dans un histogramme ou un résumé"""
+        self._demarrer()
+        bornes = DEFINITIONS[nom][3]
+        cle = (nom, etiquettes)
+        with self._verrou:
+            etat = self._valeurs.get(cle)
+            if etat is None:
+                etat = self._valeurs[cle] = [[0] * len(bornes or ()), 0.0, 0]
+            if bornes:
+                position = bisect_left(bornes, valeur)
+                if position < len(bornes):
+                    etat[0][position] += 1
+            etat[1] += valeur
+            etat[2] += 1
+
+    def ajouter_jauges(self, fonction):
+        """Enregistrer une fonction retournant des jauges {nom: valeur}, lue à chaque instantané"""
+        self._fonctions_jauges.append(fonction)
+
+    def _instantane(self):
+        with self._verrou:
+            valeurs = [[nom, list(etiquettes), valeur if not isinstance(valeur, list) else
+                        [list(valeur[0]), valeur[1], valeur[2]]]
+                       for (nom, etiquettes), valeur in self._valeurs.items()]
+        jauges = {}
+        for fonction in self._fonctions_jauges:
+            jauges.update(fonction())
+        return {'pid': os.getpid(), 'valeurs': valeurs, 'jauges': jauges}
+
+    def publier(self):
+        """Écrire l'instantané du processus (remplacement atomique du fichier)"""
+        if not self.repertoire:
+            return
+        try:
+            chemin = os.path.join(self.repertoire, f'metriques-{os.getpid()}.json')
+            with open(chemin + '.tmp', 'w') as fichier:
+                json.dump(self._instantane(), fichier)
+            os.replace(chemin + '.tmp', chemin)
+        except (OSError, TypeError, ValueError):
+            pass
+
+    def _instantanes(self):
+        instantanes = [self._instantane()]
+        if not self.repertoire:
+            return instantanes
+        for nom_fichier in os.listdir(self.repertoire):
+            if not nom_fichier.endswith('.json') or nom_fichier == f'metriques-{os.getpid()}.json':
+                continue
+            try:
+                with open(os.path.join(self.repertoire, nom_fichier)) as fichier:
+                    instantane = json.load(fichier)
+            except (OSError, ValueError):
+                continue
+            # Les compteurs d'un worker arrêté restent acquis ; ses jauges ne valent plus rien
+            if not _processus_actif(instantane.get('pid')):
+                instantane['jauges'] = {}
+            instantanes.append(instantane)
+        return instantanes
+
+    def exposer(self):
+        """Agréger les instantanés de tous les workers au format texte Prometheus"""
+        valeurs, jauges = {}, {}
+        for instantane in self._instantanes():
+            for nom, etiquettes, valeur in instantane['valeurs']:
+                if nom not in DEFINITIONS:
+                    continue
+                cle = (nom, tuple(etiquettes))
+                if isinstance(valeur, list):
+                    total = valeurs.setdefault(cle, [[0] * len(valeur[0]), 0.0, 0])
+                    total[0] = [a + b for a, b in zip(total[0], valeur[0])]
+                    total[1] += valeur[1]
+                    total[2] += valeur[2]
+                else:
+                    valeurs[cle] = valeurs.get(cle, 0) + valeur
+            for nom, valeur in instantane.get('jauges', {}).items():
+                jauges[nom] = jauges.get(nom, 0) + valeur
+
+        lignes = []
+        for nom, (genre, aide, noms_etiquettes, bornes) in DEFINITIONS.items():
+            lignes.append(f'# HELP {nom} {aide}')
+            lignes.append(f'# TYPE {nom} {genre}')
+            if genre == 'gauge':
+                lignes.append(f'{nom} {_nombre(jauges.get(nom, 0))}')
+                continue
+            for (nom_valeur, etiquettes), valeur in sorted(valeurs.items()):
+                if nom_valeur != nom:
+                    continue
+                paires = list(zip(noms_etiquettes, etiquettes))
+                if genre == 'counter':
+                    lignes.append(f'{nom}{_etiquettes(paires)} {_nombre(valeur)}')
+                    continue
+                if genre == 'histogram':
+                    cumul = 0
+                    for borne, nombre in zip(bornes, valeur[0]):
+                        cumul += nombre
+                        lignes.append(f'{nom}_bucket{_etiquettes(paires + [("le", _nombre(borne))])} {cumul}')
+                    lignes.append(f'{nom}_bucket{_etiquettes(paires + [("le", "+Inf")])} {valeur[2]}')
+                lignes.append(f'{nom}_sum{_etiquettes(paires)} {_nombre(valeur[1])}')
+                lignes.append(f'{nom}_count{_etiquettes(paires)} {valeur[2]}')
+        return '\n'.join(lignes) + '\n'
+
+
+def _processus_actif(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    return True
+
+
+def _nombre(valeur):
+    return repr(float(valeur)) if isinstance(valeur, float) else str(valeur)
+
+
+def _echapper(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquettes(paires):
+    if not paires:
+        return ''
+    return '{' + ','.join(f'{nom}="{_echapper(valeur)}"' for nom, valeur in paires) + '}'
+
+
+def _mesurer_pool(metriques, moteur):
+    """Mesurer l'attente des connexions en enveloppant la prise de connexion du pool"""
+    pool = moteur.pool
+    prendre = pool._do_get
+
+    def prendre_mesure():
+        debut = time.perf_counter()
+        with metriques._verrou:
+            metriques._attentes_pool += 1
+        try:
+            return prendre()
+        finally:
+            with metriques._verrou:
+                metriques._attentes_pool -= 1
+            metriques.observer('bibliotheque_pool_attente_secondes', time.perf_counter() - debut)
+
+    pool._do_get = prendre_mesure
+
+    def jauges():
+        return {
+            'bibliotheque_pool_connexions_utilisees': pool.checkedout() if hasattr(pool, 'checkedout') else 0,
+            'bibliotheque_pool_debordement': max(pool.overflow(), 0) if hasattr(pool, 'overflow') else 0,
+            'bibliotheque_pool_en_attente': metriques._attentes_pool,
+        }
+    return jauges
+
+
+def incrementer_metrique(nom, *etiquettes):
+    """Augmenter un compteur de l'application en cours (sans effet si les métriques sont désactivées)"""
+    if has_app_context() and 'metriques' in current_app.extensions:
+        current_app.extensions['metriques'].incrementer(nom, etiquettes)
+
+
+def observer_metrique(nom, valeur, *etiquettes):
+    """Enregistrer une observation pour l'application en cours (sans effet si les métriques sont désactivées)"""
+    if has_app_context() and 'metriques' in current_app.extensions:
+        current_app.extensions['metriques'].observer(nom, valeur, etiquettes)
+
+
+def initialiser_metriques(app):
+    """Enregistrer la collecte des métriques et l'endpoint /metrics"""
+    if not app.config.get('METRIQUES_ACTIVEES'):
+        return
+    metriques = Metriques(
+        repertoire=app.config.get('METRIQUES_REPERTOIRE') or None,
+        intervalle=app.config.get('METRIQUES_INTERVALLE', 5.0)
+    )
+    app.extensions['metriques'] = metriques
+    with app.app_context():
+        metriques.ajouter_jauges(_mesurer_pool(metriques, db.engine))
+
+    @app.before_request
+    def demarrer_mesure():
+        g.debut_mesure = time.perf_counter()
+
+    @app.after_request
+    def mesurer_requete(reponse):
+        if request.endpoint == 'metriques':
+            return reponse
+        etiquettes = (request.blueprint or 'aucun', request.endpoint or 'aucun')
+        metriques.observer('bibliotheque_http_requete_duree_secondes',
+                           time.perf_counter() - g.get('debut_mesure', time.perf_counter()), etiquettes)
+        if reponse.content_length is not None:
+            metriques.observer('bibliotheque_http_reponse_taille_octets', reponse.content_length, etiquettes)
+        return reponse
+
+    @app.route('/metrics', endpoint='metriques')
+    def exposer_metriques():
+        return Response(metriques.exposer(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models.book import Livre
+from app.models.loan import Emprunt
+from app.models.user import Utilisateur
+from app.utils.recherche import requete_recherche_utilisateurs
+
+
+def requetes_critiques():
+    """Requêtes des services qui doivent être servies par un index"""
+    maintenant = datetime.utcnow()
+    return {
+        'emprunts actifs d\'un utilisateur': Emprunt.query.filter_by(utilisateur_id=1, date_retour_effective=None),
+        'historique d\'un utilisateur': Emprunt.query.filter_by(utilisateur_id=1)
+            .order_by(Emprunt.date_emprunt.desc(), Emprunt.id.desc()).limit(11),
+        'emprunts en retard': Emprunt.query.filter(
+            Emprunt.date_retour_prevue < maintenant,
+            Emprunt.date_retour_effective == None
+        ),
+        'emprunts à rappeler': Emprunt.query.filter(
+            Emprunt.date_retour_prevue >= maintenant + timedelta(days=3),
+            Emprunt.date_retour_prevue <= maintenant + timedelta(days=4),
+            Emprunt.date_retour_effective == None
+        ),
+        'emprunts actifs d\'un livre': Emprunt.query.filter_by(livre_id=1, date_retour_effective=None),
+        'livres d\'une catégorie': Livre.query.filter_by(categorie_id=1),
+        'livre par ISBN': Livre.query.filter_by(isbn='9780000000000'),
+        'utilisateur par email': Utilisateur.query.filter_by(email='admin@example.com'),
+        'recherche d\'utilisateur par email': requete_recherche_utilisateurs('admin@')[0],
+        'recherche d\'utilisateur par préfixe': requete_recherche_utilisateurs('du')[0],
+    }
+
+
+def _expliquer(connexion, requete):
+    dialecte = connexion.dialect
+    instruction = requete if hasattr(requete, 'compile') and not hasattr(requete, 'statement') else requete.statement
+    compilee = instruction.compile(dialect=dialecte)
+    if compilee.positional:
+        parametres = tuple(compilee.params[cle] for cle in compilee.positiontup)
+    else:
+        parametres = compilee.params
+    prefixe = 'EXPLAIN QUERY PLAN ' if dialecte.name == 'sqlite' else 'EXPLAIN '
+    lignes = connexion.exec_driver_sql(prefixe + str(compilee), parametres).fetchall()
+    return [str(ligne[-1]) for ligne in lignes]
+
+
+def _parcours_sequentiel(dialecte, plan):
+    for ligne in plan:
+        # « SCAN t USING [COVERING] INDEX i » parcourt un index, pas la table
+        if dialecte == 'sqlite' and ligne.startswith('SCAN ') and ' INDEX ' not in ligne:
+            return ligne
+        if dialecte != 'sqlite' and 'Seq Scan' in ligne:
+            return ligne.strip()
+    return None
+
+
+def verifier_plans():
+    """Exécuter EXPLAIN sur chaque requête critique et signaler les parcours séquentiels
+
+    Le plan dépend des statistiques de la base : la vérification n'a de sens
+    que sur un volume de données réaliste, analysé (ANALYZE) au préalable.
+    """
+    resultats = []
+    with db.engine.connect() as connexion:
+        with connexion.begin():
+            for nom, requete in requetes_critiques().items():
+                plan = _expliquer(connexion, requete)
+                resultats.append({
+                    'requete': nom,
+                    'plan': plan,
+                    'parcours_sequentiel': _parcours_sequentiel(connexion.dialect.name, plan)
+                })
+    return resultats
@@ -0,0 +1,151 @@
+import re
+from flask import current_app
+from sqlalchemy import Float, String, case, cast, func, inspect, literal, literal_column, or_, select, text
+from app import db
+from app.models.book import Livre
+from app.models.user import Utilisateur
+from app.utils.texte import normaliser
+
+# Le motif ILIKE est échappé pour que % et _ saisis par l'utilisateur soient littéraux
+CARACTERE_ECHAPPEMENT = '\\'
+
+
+def decouper_termes(terme):
+    """Découper un terme de recherche en mots normalisés"""
+    return re.findall(r'\w+', (terme or '').lower())
+
+
+def _echapper(terme):
+    return terme.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _motif_contient(terme):
+    return f'%{_echapper(terme)}%'
+
+
+class RechercheIlike:
+    """Recherche par ILIKE sur titre, auteur et ISBN (sans index, moteurs sans recherche plein texte)"""
+
+    nom = 'ilike'
+
+    def rechercher(self, terme):
+        motif = _motif_contient(terme)
+        rang = cast(literal(0), Float).label('rang')
+        return db.session.query(Livre, rang).filter(
+            Livre.titre.ilike(motif, escape=CARACTERE_ECHAPPEMENT) |
+            Livre.auteur.ilike(motif, escape=CARACTERE_ECHAPPEMENT) |
+            Livre.isbn.ilike(motif, escape=CARACTERE_ECHAPPEMENT)
+        ), rang
+
+
+class RecherchePostgres:
+    """Recherche plein texte PostgreSQL : colonne tsvector indexée (GIN) et trigrammes pour les mots partiels"""
+
+    nom = 'postgresql'
+
+    def rechercher(self, terme):
+        mots = decouper_termes(terme)
+        motif = _motif_contient(terme)
+        vecteur = literal_column('livres.recherche')
+        condition = or_(
+            Livre.titre.ilike(motif, escape=CARACTERE_ECHAPPEMENT),
+            Livre.auteur.ilike(motif, escape=CARACTERE_ECHAPPEMENT),
+            Livre.isbn.ilike(motif, escape=CARACTERE_ECHAPPEMENT)
+        )
+        pertinence = func.greatest(func.similarity(Livre.titre, terme), func.similarity(Livre.auteur, terme))
+        if mots:
+            # Chaque mot doit apparaître, éventuellement comme préfixe d'un mot indexé
+            requete_ts = func.to_tsquery('simple', ' & '.join(f'{mot}:*' for mot in mots))
+            condition = or_(vecteur.op('@@')(requete_ts), condition)
+            pertinence = func.ts_rank_cd(vecteur, requete_ts) + pertinence
+        rang = cast(pertinence, Float).label('rang')
+        return db.session.query(Livre, rang).filter(condition), rang
+
+
+class RechercheSqlite:
+    """Recherche plein texte SQLite via la table virtuelle FTS5 livres_fts"""
+
+    nom = 'sqlite'
+
+    def rechercher(self, terme):
+        mots = decouper_termes(terme)
+        if not mots:
+            return RechercheIlike().rechercher(terme)
+        requete_fts = ' '.join(f'"{mot}"*' for mot in mots)
+        correspondances = select(
+            literal_column('rowid').label('id'),
+            (-func.bm25(literal_column('livres_fts'))).label('pertinence')
+        ).select_from(text('livres_fts')).where(
+            literal_column('livres_fts').op('MATCH')(requete_fts)
+        ).subquery()
+        rang = cast(correspondances.c.pertinence, Float).label('rang')
+        return db.session.query(Livre, rang).join(correspondances, correspondances.c.id == Livre.id), rang
+
+
+def _condition_prefixe(colonne, prefixe, dialecte):
+    # PostgreSQL sert LIKE 'préfixe%' par un index varchar_pattern_ops ; SQLite compare
+    # octet par octet et sert l'intervalle [préfixe, préfixe + U+FFFF) par l'index
+    if dialecte == 'postgresql':
+        return colonne.like(f'{_echapper(prefixe)}%', escape=CARACTERE_ECHAPPEMENT)
+    return (colonne >= prefixe) & (colonne < prefixe + '\uffff')
+
+
+def _recherche_sans_prenom(dialecte):
+    # Expression de l'index ix_utilisateurs_recherche_nom, écrite en toutes lettres :
+    # avec des paramètres liés, le planificateur ne la reconnaîtrait pas
+    position = func.strpos if dialecte == 'postgresql' else func.instr
+    return func.substr(Utilisateur.recherche, position(Utilisateur.recherche, literal_column("' '")) + literal_column('1'),
+                       type_=String)
+
+
+def requete_recherche_utilisateurs(terme):
+    """Requête (Utilisateur, rang) des utilisateurs correspondant au terme, classés par pertinence
+
+    Un terme contenant « @ » est cherché comme email exact ou préfixe d'email
+    sur l'index lower(email). Les autres termes portent sur la colonne
+    normalisée recherche : début du prénom, du nom ou de l'email pour les
+    termes courts (trois préfixes indexés), sous-chaîne (servie par l'index
+    trigramme sur PostgreSQL) à partir de 3 caractères.
+    """
+    dialecte = db.engine.dialect.name
+    if '@' in terme:
+        email = terme.strip().lower()
+        email_minuscule = func.lower(Utilisateur.email)
+        rang = cast(case((email_minuscule == email, 2), else_=1), Float).label('rang')
+        return db.session.query(Utilisateur, rang).filter(_condition_prefixe(email_minuscule, email, dialecte)), rang
+
+    normalise = ' '.join(normaliser(terme).split())
+    debut = _condition_prefixe(Utilisateur.recherche, normalise, dialecte)
+    # Un début de mot (prénom, nom ou email) compte plus qu'une sous-chaîne quelconque
+    debut_de_mot = or_(debut, Utilisateur.recherche.like(_motif_contient(' ' + normalise), escape=CARACTERE_ECHAPPEMENT))
+    pertinence = case((debut, 3), (debut_de_mot, 2), else_=1)
+    if len(normalise) < 3:
+        condition = or_(debut, _condition_prefixe(_recherche_sans_prenom(dialecte), normalise, dialecte),
+                        _condition_prefixe(func.lower(Utilisateur.email), normalise, dialecte))
+    else:
+        condition = Utilisateur.recherche.like(_motif_contient(normalise), escape=CARACTERE_ECHAPPEMENT)
+        if dialecte == 'postgresql':
+            pertinence = pertinence + func.similarity(Utilisateur.recherche, normalise)
+    rang = cast(pertinence, Float).label('rang')
+    return db.session.query(Utilisateur, rang).filter(condition), rang
+
+
+def obtenir_moteur_recherche():
+    """Choisir le moteur de recherche selon la configuration et la base de données"""
+    moteur = current_app.extensions.get('recherche_livres')
+    if moteur is not None:
+        return moteur
+
+    choix = current_app.config.get('RECHERCHE_BACKEND', 'auto')
+    dialecte = db.engine.dialect.name
+    if choix == 'auto':
+        if dialecte == 'postgresql' and 'recherche' in {c['name'] for c in inspect(db.engine).get_columns('livres')}:
+            choix = 'postgresql'
+        elif dialecte == 'sqlite' and inspect(db.engine).has_table('livres_fts'):
+            choix = 'sqlite'
+        else:
+            choix = 'ilike'
+
+    moteur = {'postgresql': RecherchePostgres, 'sqlite': RechercheSqlite, 'ilike': RechercheIlike}[choix]()
+    current_app.extensions['recherche_livres'] = moteur
+    return moteur
@@ -0,0 +1,270 @@
+import calendar
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete, insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from app import db
+from app.models.token import TokenRevoque
+from app.utils.error_handler import ErreurServeur
+
+
+def _maintenant():
+    return datetime.now(timezone.utc)
+
+
+def _en_utc(moment):
+    """Datetime UTC conscient du fuseau (un datetime naïf est considéré comme UTC)"""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def _utc_naif(moment):
+    # Les colonnes DateTime de la base stockent l'heure UTC sans fuseau
+    return _en_utc(moment).replace(tzinfo=None)
+
+
+def _horodatage(moment):
+    """Secondes depuis l'époque, indépendamment du fuseau local (TZ)"""
+    moment = _en_utc(moment)
+    return calendar.timegm(moment.utctimetuple()) + moment.microsecond / 1e6
+
+
+class FiltreBloom:
+    """Filtre de Bloom servant de cache négatif devant le stockage des révocations"""
+
+    def __init__(self, capacite=100000, taux_faux_positifs=0.001):
+        self.nombre_bits = max(64, int(-capacite * math.log(taux_faux_positifs) / (math.log(2) ** 2)))
+        self.nombre_hachages = max(1, round(self.nombre_bits / capacite * math.log(2)))
+        self._bits = bytearray((self.nombre_bits + 7) // 8)
+
+    def _positions(self, cle):
+        empreinte = hashlib.blake2b(cle.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(empreinte[:8], 'little')
+        h2 = int.from_bytes(empreinte[8:], 'little') | 1
+        return ((h1 + i * h2) % self.nombre_bits for i in range(self.nombre_hachages))
+
+    def ajouter(self, cle):
+        for position in self._positions(cle):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, cle):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(cle))
+
+
+class StockageRevocationMemoire:
+    """Stockage des révocations en mémoire, limité au processus courant"""
+
+    partage = False
+
+    def __init__(self):
+        self._entrees = {}
+        self._verrou = threading.Lock()
+
+    def ajouter(self, jti, expire_le):
+        with self._verrou:
+            self._entrees[jti] = (_en_utc(expire_le), _maintenant())
+
+    def contient(self, jti):
+        entree = self._entrees.get(jti)
+        return entree is not None and entree[0] > _maintenant()
+
+    def revoques_depuis(self, horodatage=None):
+        maintenant = _maintenant()
+        horodatage = _en_utc(horodatage) if horodatage is not None else None
+        return [jti for jti, (expire_le, revoque_le) in list(self._entrees.items())
+                if expire_le > maintenant and (horodatage is None or revoque_le >= horodatage)]
+
+    def purger(self):
+        maintenant = _maintenant()
+        with self._verrou:
+            for jti in [j for j, (expire_le, _) in self._entrees.items() if expire_le <= maintenant]:
+                del self._entrees[jti]
+
+
+class StockageRevocationSQL:
+    """Stockage des révocations dans la table tokens_revoques, partagé par tous les workers"""
+
+    partage = True
+
+    def __init__(self, app):
+        self.app = app
+
+    def _executer(self, instruction):
+        try:
+            with self.app.app_context(), db.engine.begin() as connexion:
+                return connexion.execute(instruction)
+        except SQLAlchemyError as e:
+            raise ErreurServeur(f"Erreur du stockage des révocations: {str(e)}")
+
+    def ajouter(self, jti, expire_le):
+        table = TokenRevoque.__table__
+        try:
+            with self.app.app_context(), db.engine.begin() as connexion:
+                connexion.execute(insert(table).values(jti=jti, expire_le=_utc_naif(expire_le),
+                                                      revoque_le=_utc_naif(_maintenant())))
+        except IntegrityError:
+            # Le token est déjà révoqué
+            pass
+        except SQLAlchemyError as e:
+            raise ErreurServeur(f"Erreur du stockage des révocations: {str(e)}")
+
+    def contient(self, jti):
+        table = TokenRevoque.__table__
+        resultat = self._executer(
+            select(table.c.jti).where(table.c.jti == jti, table.c.expire_le > _utc_naif(_maintenant()))
+        )
+        return resultat.first() is not None
+
+    def revoques_depuis(self, horodatage=None):
+        table = TokenRevoque.__table__
+        requete = select(table.c.jti).where(table.c.expire_le > _utc_naif(_maintenant()))
+        if horodatage is not None:
+            requete = requete.where(table.c.revoque_le >= _utc_naif(horodatage))
+        return [ligne.jti for ligne in self._executer(requete)]
+
+    def purger(self):
+        table = TokenRevoque.__table__
+        self._executer(delete(table).where(table.c.expire_le <= _utc_naif(_maintenant())))
+
+
+class StockageRevocationFichier:
+    """Stockage clé-valeur local (SQLite) partagé par les workers d'un même nœud"""
+
+    partage = True
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self._local = threading.local()
+        with self._connexion() as connexion:
+            connexion.execute(
+                'CREATE TABLE IF NOT EXISTS tokens_revoques '
+                '(jti TEXT PRIMARY KEY, expire_le REAL NOT NULL, revoque_le REAL NOT NULL)'
+            )
+            connexion.execute('CREATE INDEX IF NOT EXISTS ix_revoque_le ON tokens_revoques (revoque_le)')
+
+    def _connexion(self):
+        connexion = getattr(self._local, 'connexion', None)
+        if connexion is None or getattr(self._local, 'pid', None) != os.getpid():
+            connexion = sqlite3.connect(self.chemin, timeout=5, isolation_level=None)
+            connexion.execute('PRAGMA journal_mode=WAL')
+            self._local.connexion = connexion
+            self._local.pid = os.getpid()
+        return connexion
+
+    def ajouter(self, jti, expire_le):
+        self._connexion().execute(
+            'INSERT OR IGNORE INTO tokens_revoques (jti, expire_le, revoque_le) VALUES (?, ?, ?)',
+            (jti, _horodatage(expire_le), time.time())
+        )
+
+    def contient(self, jti):
+        ligne = self._connexion().execute(
+            'SELECT 1 FROM tokens_revoques WHERE jti = ? AND expire_le > ?', (jti, time.time())
+        ).fetchone()
+        return ligne is not None
+
+    def revoques_depuis(self, horodatage=None):
+        requete = 'SELECT jti FROM tokens_revoques WHERE expire_le > ?'
+        parametres = [time.time()]
+        if horodatage is not None:
+            requete += ' AND revoque_le >= ?'
+            parametres.append(_horodatage(horodatage))
+        return [ligne[0] for ligne in self._connexion().execute(requete, parametres)]
+
+    def purger(self):
+        self._connexion().execute('DELETE FROM tokens_revoques WHERE expire_le <= ?', (time.time(),))
+
+
+class ListeRevocation:
+    """Liste des tokens révoqués : filtre de Bloom local devant un stockage partagé"""
+
+    # Marge couvrant les transactions concurrentes et les décalages d'horloge entre nœuds
+    MARGE_SYNCHRONISATION = timedelta(seconds=5)
+
+    def __init__(self, stockage, capacite=100000, intervalle_synchronisation=1.0, intervalle_reconstruction=900):
+        self.stockage = stockage
+        self.capacite = capacite
+        self.intervalle_synchronisation = intervalle_synchronisation
+        self.intervalle_reconstruction = intervalle_reconstruction
+        self._verrou = threading.Lock()
+        self._filtre = None
+        self._derniere_synchronisation = 0.0
+        self._derniere_reconstruction = 0.0
+        self._horodatage_synchronisation = None
+
+    def _reconstruire(self):
+        """Reconstruire le filtre à partir des révocations non expirées"""
+        self.stockage.purger()
+        horodatage = _maintenant()
+        filtre = FiltreBloom(self.capacite)
+        for jti in self.stockage.revoques_depuis():
+            filtre.ajouter(jti)
+        self._filtre = filtre
+        self._horodatage_synchronisation = horodatage
+        self._derniere_reconstruction = self._derniere_synchronisation = time.monotonic()
+
+    def synchroniser(self, forcer=False):
+        """Intégrer au filtre les révocations faites par les autres workers"""
+        maintenant = time.monotonic()
+        reconstruire = self._filtre is None or maintenant - self._derniere_reconstruction >= self.intervalle_reconstruction
+        # Un stockage non partagé ne reçoit que les révocations de ce processus : seule la
+        # reconstruction périodique (qui purge les révocations expirées) le concerne
+        if not forcer and not reconstruire and (
+            not self.stockage.partage or maintenant - self._derniere_synchronisation < self.intervalle_synchronisation
+        ):
+            return
+        with self._verrou:
+            if self._filtre is None or maintenant - self._derniere_reconstruction >= self.intervalle_reconstruction:
+                self._reconstruire()
+                return
+            if not self.stockage.partage:
+                return
+            if not forcer and maintenant - self._derniere_synchronisation < self.intervalle_synchronisation:
+                return
+            horodatage = _maintenant()
+            for jti in self.stockage.revoques_depuis(self._horodatage_synchronisation - self.MARGE_SYNCHRONISATION):
+                self._filtre.ajouter(jti)
+            self._horodatage_synchronisation = horodatage
+            self._derniere_synchronisation = maintenant
+
+    def revoquer(self, jti, expire_le):
+        """Révoquer un token jusqu'à son expiration"""
+        self.stockage.ajouter(jti, expire_le)
+        self.synchroniser()
+        with self._verrou:
+            self._filtre.ajouter(jti)
+
+    def est_revoque(self, jti):
+        """Vérifier si un token est révoqué (sans accès au stockage pour la plupart des tokens)"""
+        self.synchroniser()
+        if jti not in self._filtre:
+            return False
+        return self.stockage.contient(jti)
+
+
+def creer_stockage_revocation(app):
+    """Créer le stockage de révocations choisi par la configuration"""
+    type_stockage = app.config.get('JWT_REVOCATION_BACKEND', 'sql')
+    if type_stockage == 'memoire':
+        return StockageRevocationMemoire()
+    if type_stockage == 'fichier':
+        return StockageRevocationFichier(app.config.get('JWT_REVOCATION_FICHIER', 'revocations.sqlite3'))
+    if type_stockage == 'sql':
+        return StockageRevocationSQL(app)
+    raise ValueError(f"Stockage de révocation inconnu: {type_stockage}")
+
+
+def initialiser_revocation(app):
+    """Enregistrer la liste de révocation de l'application"""
+    app.extensions['revocation'] = ListeRevocation(
+        creer_stockage_revocation(app),
+        capacite=app.config.get('JWT_REVOCATION_BLOOM_CAPACITE', 100000),
+        intervalle_synchronisation=app.config.get('JWT_REVOCATION_SYNC_INTERVAL', 1.0),
+        intervalle_reconstruction=app.config.get('JWT_ACCESS_TOKEN_EXPIRES', 900)
+    )
@@ -0,0 +1,117 @@
+import random
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+from app.utils.cache import CacheLRU
+
+# Préfixe des binds SQLALCHEMY_BINDS des répliques en lecture
+PREFIXE_REPLIQUE = 'replique_'
+
+# Cookie posé après une écriture : le client lit le primaire jusqu'à son expiration
+COOKIE_LECTURE_PRIMAIRE = 'lecture_primaire'
+
+# Utilisateurs ayant écrit récemment, lus sur le primaire (par processus)
+ECRITURES_RECENTES = CacheLRU(taille_max=10000, ttl=5)
+
+
+def configurer_moteurs(app):
+    """Construire les options du pool et les binds des répliques à partir de la configuration
+
+    Les options explicites (SQLALCHEMY_ENGINE_OPTIONS) sont conservées. Les
+    options propres au QueuePool ne sont pas transmises à SQLite.
+    """
+    options = {
+        'pool_pre_ping': app.config.get('DB_POOL_PRE_PING', True),
+        'pool_recycle': app.config.get('DB_POOL_RECYCLE', 1800),
+    }
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        options.update(
+            pool_size=app.config.get('DB_POOL_SIZE', 10),
+            max_overflow=app.config.get('DB_MAX_OVERFLOW', 20),
+            pool_timeout=app.config.get('DB_POOL_TIMEOUT', 30),
+        )
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for numero, url in enumerate(app.config.get('DATABASE_REPLICA_URLS') or ()):
+        binds.setdefault(f'{PREFIXE_REPLIQUE}{numero}', {'url': url, **options})
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+class SessionRoutee(Session):
+    """Session envoyant les lectures des endpoints lecture_replique vers une réplique
+
+    Les écritures, les flush et les lectures d'une session qui a des
+    modifications en attente restent sur le primaire.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _lecture_sur_replique() and not self._flushing \
+                and (clause is None or getattr(clause, 'is_select', False)) \
+                and not (self.new or self.dirty or self.deleted):
+            repliques = [moteur for cle, moteur in self._db.engines.items()
+                         if cle and cle.startswith(PREFIXE_REPLIQUE)]
+            if repliques:
+                return random.choice(repliques)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _lecture_sur_replique():
+    return has_request_context() and g.get('lecture_replique', False)
+
+
+def _ecriture_recente():
+    """Le client vient-il d'écrire (cookie ou utilisateur authentifié connu de ce processus) ?"""
+    try:
+        if float(request.cookies.get(COOKIE_LECTURE_PRIMAIRE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    try:
+        verify_jwt_in_request(optional=True)
+        utilisateur_id = get_jwt_identity()
+    except Exception:
+        return False
+    return utilisateur_id is not None and ECRITURES_RECENTES.obtenir(str(utilisateur_id), False)
+
+
+def lecture_primaire_requise():
+    """Le client doit-il lire ses propres écritures sur le primaire (répliques configurées) ?"""
+    return bool(current_app.config.get('DATABASE_REPLICA_URLS')) and bool(_ecriture_recente())
+
+
+def lecture_replique(fonction):
+    """Décorateur : servir un endpoint en lecture seule depuis une réplique
+
+    Un client qui vient d'emprunter ou de rendre un livre lit le primaire
+    pendant LECTURE_PRIMAIRE_APRES_ECRITURE secondes (lecture de ses écritures).
+    """
+    @wraps(fonction)
+    def decorateur(*args, **kwargs):
+        if request.method in ('GET', 'HEAD') and current_app.config.get('DATABASE_REPLICA_URLS') \
+                and not lecture_primaire_requise():
+            g.lecture_replique = True
+        return fonction(*args, **kwargs)
+    return decorateur
+
+
+def marquer_lecture_primaire(utilisateur_id):
+    """Lire le primaire pour cet utilisateur pendant la fenêtre de lecture de ses écritures"""
+    ECRITURES_RECENTES.definir(str(utilisateur_id), True,
+                               ttl=current_app.config.get('LECTURE_PRIMAIRE_APRES_ECRITURE', 5))
+    if has_request_context():
+        g.lecture_primaire_marquee = True
+
+
+def initialiser_routage(app):
+    """Poser le cookie de lecture du primaire sur les réponses des requêtes qui ont écrit"""
+    @app.after_request
+    def poser_cookie_lecture_primaire(reponse):
+        if g.get('lecture_primaire_marquee'):
+            duree = app.config.get('LECTURE_PRIMAIRE_APRES_ECRITURE', 5)
+            reponse.set_cookie(COOKIE_LECTURE_PRIMAIRE, str(time.time() + duree), max_age=int(duree) or 1,
+                               httponly=True, samesite='Lax')
+        return reponse
@@ -1,4 +1,6 @@
+from datetime import datetime, timedelta, timezone
 from functools import wraps
+from itertools import count
 from flask import request, jsonify, current_app
 from flask_jwt_extended import (
     create_access_token, create_refresh_token,
@@ -6,10 +8,99 @@ from flask_jwt_extended import (
     get_jwt
 )
 from app.models.user import Utilisateur
-from app.utils.error_handler import ErreurNonAutorise, ErreurInterdit
+from app.utils.cache import CacheLRU, ABSENT
+from app.utils.error_handler import ErreurAPI, ErreurNonAutorise, ErreurInterdit
+from app.utils.bus_invalidation import abonner_invalidations
+
+# Cache des principaux authentifiés, indexé par (id utilisateur, version)
+CACHE_PRINCIPAUX = CacheLRU(taille_max=10000, ttl=30)
+# Version des principaux invalidés : un instantané lu avant l'invalidation reste sous l'ancienne
+# clé. Une version n'a besoin de survivre qu'aux entrées du cache, d'où un LRU de durée double.
+_versions_principaux = CacheLRU(taille_max=10000, ttl=60)
+# Versions croissantes pour tout le processus : une version expirée n'est jamais réattribuée
+_compteur_versions = count(1)
+
+
+class Principal:
+    """Utilisateur authentifié issu du cache, chargé depuis la base seulement au besoin"""
+
+    def __init__(self, id, est_actif, est_admin):
+        object.__setattr__(self, '_id', id)
+        object.__setattr__(self, '_est_actif', est_actif)
+        object.__setattr__(self, '_est_admin', est_admin)
+        object.__setattr__(self, '_utilisateur', None)
+
+    @property
+    def utilisateur(self):
+        """Charger l'objet Utilisateur complet lors du premier accès"""
+        if self._utilisateur is None:
+            utilisateur = Utilisateur.query.get(self._id)
+            if not utilisateur:
+                raise ErreurNonAutorise("Utilisateur invalide")
+            object.__setattr__(self, '_utilisateur', utilisateur)
+        return self._utilisateur
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def est_actif(self):
+        return self._utilisateur.est_actif if self._utilisateur is not None else self._est_actif
+
+    @property
+    def est_admin(self):
+        return self._utilisateur.est_admin if self._utilisateur is not None else self._est_admin
+
+    def __getattr__(self, nom):
+        return getattr(self.utilisateur, nom)
+
+    def __setattr__(self, nom, valeur):
+        setattr(self.utilisateur, nom, valeur)
+
+    def __repr__(self):
+        return f'<Principal {self._id}>'
+
 
-# Ensemble de liste noire de tokens révoqués
-LISTE_NOIRE = set()
+def configurer_cache_principaux(app):
+    """Appliquer la configuration de l'application au cache des principaux"""
+    CACHE_PRINCIPAUX.taille_max = app.config.get('PRINCIPAL_CACHE_SIZE', 10000)
+    CACHE_PRINCIPAUX.ttl = app.config.get('PRINCIPAL_CACHE_TTL', 30)
+    CACHE_PRINCIPAUX.vider()
+    _versions_principaux.taille_max = CACHE_PRINCIPAUX.taille_max
+    _versions_principaux.ttl = 2 * CACHE_PRINCIPAUX.ttl
+    _versions_principaux.vider()
+    # Un utilisateur modifié par un autre worker est invalidé ici aussi
+    abonner_invalidations(app, 'utilisateurs',
+                          lambda ids: [invalider_principal(int(utilisateur_id)) for utilisateur_id in ids])
+
+
+def invalider_principal(utilisateur_id):
+    """Invalider immédiatement le principal en cache d'un utilisateur"""
+    version = _versions_principaux.obtenir(utilisateur_id, 0)
+    _versions_principaux.definir(utilisateur_id, next(_compteur_versions))
+    CACHE_PRINCIPAUX.supprimer((utilisateur_id, version))
+
+
+def statistiques_cache_principaux():
+    """Obtenir les compteurs de succès/échecs du cache des principaux"""
+    return CACHE_PRINCIPAUX.statistiques()
+
+
+def obtenir_principal(utilisateur_id):
+    """Obtenir le principal d'un utilisateur depuis le cache ou la base de données"""
+    cle = (utilisateur_id, _versions_principaux.obtenir(utilisateur_id, 0))
+    instantane = CACHE_PRINCIPAUX.obtenir(cle)
+    if instantane is ABSENT:
+        utilisateur = Utilisateur.query.get(utilisateur_id)
+        if not utilisateur:
+            return None
+        instantane = (utilisateur.est_actif, utilisateur.est_admin)
+        CACHE_PRINCIPAUX.definir(cle, instantane)
+        principal = Principal(utilisateur_id, *instantane)
+        object.__setattr__(principal, '_utilisateur', utilisateur)
+        return principal
+    return Principal(utilisateur_id, *instantane)
 
 
 def generer_tokens(utilisateur_id):
@@ -24,15 +115,17 @@ def generer_tokens(utilisateur_id):
     }
 
 
-def revoquer_token(jti):
-    """Ajouter un JWT ID à la liste noire"""
-    LISTE_NOIRE.add(jti)
+def revoquer_token(jti, expire_le=None):
+    """Ajouter un JWT ID à la liste de révocation jusqu'à l'expiration du token"""
+    if expire_le is None:
+        expire_le = datetime.now(timezone.utc) + timedelta(seconds=current_app.config['JWT_REFRESH_TOKEN_EXPIRES'])
+    current_app.extensions['revocation'].revoquer(jti, expire_le)
 
 
 def est_token_revoque(payload_jwt):
     """Vérifier si un token a été révoqué"""
     jti = payload_jwt['jti']
-    return jti in LISTE_NOIRE
+    return current_app.extensions['revocation'].est_revoque(jti)
 
 
 def token_requis(fn):
@@ -57,7 +150,7 @@ def token_requis(fn):
             except (ValueError, TypeError):
                 raise ErreurNonAutorise("Format d'identité invalide")
 
-            utilisateur_actuel = Utilisateur.query.get(utilisateur_actuel_id_int)
+            utilisateur_actuel = obtenir_principal(utilisateur_actuel_id_int)
 
             if not utilisateur_actuel:
                 raise ErreurNonAutorise("Utilisateur invalide")
@@ -65,11 +158,14 @@ def token_requis(fn):
             if not utilisateur_actuel.est_actif:
                 raise ErreurNonAutorise("Le compte utilisateur est désactivé")
 
-            return fn(utilisateur_actuel, *args, **kwargs)
         except Exception as e:
             # Ajouter un log d'erreur pour le débogage
-            current_app.logger.error(f"Erreur token_requis: {str(e)}")
-            raise ErreurNonAutorise(str(e))
+            message = e.message if isinstance(e, ErreurAPI) else str(e)
+            current_app.logger.error(f"Erreur token_requis: {message}")
+            raise ErreurNonAutorise(message)
+
+        # Les erreurs du gestionnaire lui-même ne sont pas des erreurs d'authentification
+        return fn(utilisateur_actuel, *args, **kwargs)
 
     return wrapper
 
@@ -96,7 +192,7 @@ def admin_requis(fn):
             except (ValueError, TypeError):
                 raise ErreurNonAutorise("Format d'identité invalide")
 
-            utilisateur_actuel = Utilisateur.query.get(utilisateur_actuel_id_int)
+            utilisateur_actuel = obtenir_principal(utilisateur_actuel_id_int)
 
             if not utilisateur_actuel:
                 raise ErreurNonAutorise("Utilisateur invalide")
@@ -107,12 +203,15 @@ def admin_requis(fn):
             if not utilisateur_actuel.est_admin:
                 raise ErreurInterdit("Privilèges d'administrateur requis")
 
-            return fn(utilisateur_actuel, *args, **kwargs)
         except Exception as e:
             # Ajouter un log d'erreur pour le débogage
-            current_app.logger.error(f"Erreur admin_requis: {str(e)}")
+            message = e.message if isinstance(e, ErreurAPI) else str(e)
+            current_app.logger.error(f"Erreur admin_requis: {message}")
             if isinstance(e, ErreurInterdit):
                 raise e
-            raise ErreurNonAutorise(str(e))
+            raise ErreurNonAutorise(message)
+
+        # Les erreurs du gestionnaire lui-même ne sont pas des erreurs d'authentification
+        return fn(utilisateur_actuel, *args, **kwargs)
 
     return wrapper
\ No newline at end of file
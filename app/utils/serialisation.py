@@ -0,0 +1,76 @@
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def date_json(valeur):
+    """Date d'un vers_dict : native pour orjson, déjà en ISO 8601 pour le module json
+
+    Le hook default du module json est appelé en Python pour chaque date :
+    sans orjson, convertir dans vers_dict reste le chemin le plus rapide.
+    """
+    if valeur is None or orjson is not None:
+        return valeur
+    return valeur.isoformat()
+
+
+def _defaut(valeur):
+    # Dates au format ISO 8601, comme orjson ; le reste suit le fournisseur de Flask
+    if isinstance(valeur, date):
+        return valeur.isoformat()
+    return DefaultJSONProvider.default(valeur)
+
+
+class FournisseurJSON(DefaultJSONProvider):
+    """Fournisseur JSON de l'application : orjson s'il est installé, sinon le module json
+
+    Les datetime et date sont encodés en ISO 8601 par les deux chemins ; les
+    vers_dict passent leurs dates par date_json. Une valeur qu'orjson refuse
+    (entier de plus de 64 bits, clé d'un type inattendu) est encodée par le
+    module json.
+    """
+
+    default = staticmethod(_defaut)
+    ensure_ascii = False
+
+    def __init__(self, app, rapide=True):
+        super().__init__(app)
+        self.rapide = rapide and orjson is not None
+
+    def _options(self, indenter=False):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indenter:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def _encoder(self, obj, indenter=False):
+        """Encoder obj en octets UTF-8"""
+        if self.rapide:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._options(indenter))
+            except orjson.JSONEncodeError:
+                pass
+        separateurs = None if indenter else (',', ':')
+        return super().dumps(obj, indent=2 if indenter else None, separators=separateurs).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if self.rapide and not kwargs:
+            return self._encoder(obj).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.rapide and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        """Réponse JSON encodée directement en octets, sans passer par une chaîne"""
+        obj = self._prepare_response_obj(args, kwargs)
+        indenter = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._encoder(obj, indenter) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,284 @@
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from flask import current_app
+from sqlalchemy import func
+from app import db
+from app.models.book import Livre
+from app.models.loan import Emprunt
+from app.utils.texte import normaliser, decouper
+from app.utils.bus_invalidation import abonner_invalidations
+from app.utils.index_livres import rafraichir_livres
+from app.utils.recherche import obtenir_moteur_recherche
+
+# Les préfixes de cette longueur ou moins ont leurs meilleures suggestions précalculées
+LONGUEUR_PREFIXE_PRECALCULE = 3
+
+# Nombre de suggestions conservées par préfixe précalculé
+TAILLE_PRECALCUL = 20
+
+# Livres candidats lus par le moteur de recherche quand la structure n'est pas disponible
+CANDIDATS_EN_BASE = 200
+
+TITRE = 'titre'
+AUTEUR = 'auteur'
+
+
+def _cles(texte):
+    """Clés de recherche d'un texte : le texte normalisé à partir de chacun de ses mots"""
+    mots = decouper(texte)
+    return {' '.join(mots[i:]) for i in range(len(mots))}
+
+
+def _prefixes_courts(cle):
+    return (cle[:longueur] for longueur in range(1, min(len(cle), LONGUEUR_PREFIXE_PRECALCULE) + 1))
+
+
+class IndexSuggestions:
+    """Tableau trié de clés normalisées (titres et auteurs) pondérées par la popularité d'emprunt"""
+
+    def __init__(self, app):
+        self.app = app
+        self.pret = False
+        self._entrees = []
+        self._titres = {}
+        self._auteurs = {}
+        self._popularite = {}
+        self._precalcul = {}
+        self._prefixes_perimes = set()
+        self._verrou = threading.RLock()
+        self._pid = None
+
+    def demarrer(self):
+        """Lancer la construction en arrière-plan (une fois par worker)"""
+        if self._pid == os.getpid():
+            return
+        with self._verrou:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.pret = False
+            threading.Thread(target=self.construire, name='suggestions-livres', daemon=True).start()
+
+    def reconstruire(self):
+        """Reconstruire en arrière-plan ; la version actuelle reste servie jusqu'au remplacement"""
+        if self.pret:
+            threading.Thread(target=self.construire, name='suggestions-livres', daemon=True).start()
+
+    def construire(self):
+        """Construire le tableau trié à partir des livres et du nombre d'emprunts de chacun"""
+        debut = time.perf_counter()
+        try:
+            with self.app.app_context():
+                popularite = dict(db.session.query(Emprunt.livre_id, func.count(Emprunt.id))
+                                  .group_by(Emprunt.livre_id).all())
+                livres = db.session.query(Livre.id, Livre.titre, Livre.auteur).all()
+                db.session.remove()
+        except Exception as e:
+            self.app.logger.error(f"Erreur lors de la construction des suggestions: {str(e)}")
+            return
+
+        with self._verrou:
+            self._entrees, self._titres, self._auteurs = [], {}, {}
+            self._popularite = popularite
+            for livre_id, titre, auteur in livres:
+                self._ajouter(livre_id, titre, auteur)
+            self._entrees.sort()
+            self._precalculer()
+            self.pret = True
+        self.app.logger.info(
+            f"Suggestions construites en {time.perf_counter() - debut:.3f}s : "
+            f"{len(self._entrees)} clés, {len(self._precalcul)} préfixes précalculés"
+        )
+
+    def _cles_reference(self, genre, reference):
+        if genre == TITRE:
+            return _cles(self._titres[reference][0])
+        return _cles(self._auteurs[reference]['nom'])
+
+    def _ajouter(self, livre_id, titre, auteur):
+        """Ajouter les clés d'un livre et de son auteur (le tableau est trié par l'appelant)"""
+        cle_auteur = normaliser(auteur).strip()
+        self._titres[livre_id] = (titre, cle_auteur)
+        for cle in _cles(titre):
+            self._entrees.append((cle, TITRE, livre_id))
+        if not cle_auteur:
+            return
+        if cle_auteur in self._auteurs:
+            self._auteurs[cle_auteur]['livres'].add(livre_id)
+            return
+        self._auteurs[cle_auteur] = {'nom': auteur, 'livres': {livre_id}}
+        for cle in _cles(auteur):
+            self._entrees.append((cle, AUTEUR, cle_auteur))
+
+    def _inserer(self, livre_id, titre, auteur):
+        debut = len(self._entrees)
+        self._ajouter(livre_id, titre, auteur)
+        nouvelles = self._entrees[debut:]
+        del self._entrees[debut:]
+        for entree in nouvelles:
+            insort(self._entrees, entree)
+        self._promouvoir((TITRE, livre_id))
+        if self._titres[livre_id][1]:
+            self._promouvoir((AUTEUR, self._titres[livre_id][1]))
+
+    def _retirer_entree(self, entree):
+        position = bisect_left(self._entrees, entree)
+        if position < len(self._entrees) and self._entrees[position] == entree:
+            del self._entrees[position]
+
+    def _retirer(self, livre_id):
+        if livre_id not in self._titres:
+            return
+        self._retrograder((TITRE, livre_id))
+        titre, cle_auteur = self._titres.pop(livre_id)
+        for cle in _cles(titre):
+            self._retirer_entree((cle, TITRE, livre_id))
+        auteur = self._auteurs.get(cle_auteur)
+        if auteur is None:
+            return
+        # Le poids de l'auteur baisse : ses listes précalculées sont à recalculer
+        self._retrograder((AUTEUR, cle_auteur))
+        auteur['livres'].discard(livre_id)
+        if not auteur['livres']:
+            del self._auteurs[cle_auteur]
+            for cle in _cles(auteur['nom']):
+                self._retirer_entree((cle, AUTEUR, cle_auteur))
+
+    def _poids(self, genre, reference):
+        if genre == TITRE:
+            return self._popularite.get(reference, 0)
+        return sum(self._popularite.get(livre_id, 0) for livre_id in self._auteurs[reference]['livres'])
+
+    def _meilleures(self, prefixe, nombre):
+        debut = bisect_left(self._entrees, (prefixe,))
+        fin = bisect_left(self._entrees, (prefixe + '\uffff',), debut)
+        # Une même référence peut correspondre par plusieurs de ses mots ; à popularité
+        # égale, l'ordre alphabétique des clés est conservé
+        references = dict.fromkeys((genre, reference) for _, genre, reference in self._entrees[debut:fin])
+        return heapq.nlargest(nombre, references, key=lambda r: self._poids(*r))
+
+    def _precalculer(self):
+        prefixes = {prefixe for cle, _, _ in self._entrees for prefixe in _prefixes_courts(cle)}
+        self._precalcul = {prefixe: self._meilleures(prefixe, TAILLE_PRECALCUL) for prefixe in prefixes}
+        self._prefixes_perimes = set()
+
+    def _promouvoir(self, reference):
+        """Insérer ou remonter une référence dont le poids a augmenté dans les listes précalculées"""
+        for prefixe in {p for cle in self._cles_reference(*reference) for p in _prefixes_courts(cle)}:
+            liste = self._precalcul.setdefault(prefixe, [])
+            if reference in liste:
+                liste.remove(reference)
+            liste.append(reference)
+            liste.sort(key=lambda r: self._poids(*r), reverse=True)
+            del liste[TAILLE_PRECALCUL:]
+
+    def _retrograder(self, reference):
+        """Retirer une référence des listes précalculées, à compléter au prochain accès"""
+        for prefixe in {p for cle in self._cles_reference(*reference) for p in _prefixes_courts(cle)}:
+            liste = self._precalcul.get(prefixe)
+            if liste is not None and reference in liste:
+                liste.remove(reference)
+                self._prefixes_perimes.add(prefixe)
+
+    def mettre_a_jour(self, livre):
+        """Ajouter ou remplacer un livre"""
+        if not self.pret:
+            return
+        with self._verrou:
+            self._retirer(livre.id)
+            self._inserer(livre.id, livre.titre, livre.auteur)
+
+    def supprimer(self, livre_id):
+        """Retirer un livre et sa popularité"""
+        if not self.pret:
+            return
+        with self._verrou:
+            self._retirer(livre_id)
+            self._popularite.pop(livre_id, None)
+
+    def enregistrer_emprunts(self, livre_id, nombre=1):
+        """Augmenter la popularité d'un livre après un emprunt"""
+        if not self.pret:
+            return
+        with self._verrou:
+            self._popularite[livre_id] = self._popularite.get(livre_id, 0) + nombre
+            if livre_id not in self._titres:
+                return
+            self._promouvoir((TITRE, livre_id))
+            if self._titres[livre_id][1]:
+                self._promouvoir((AUTEUR, self._titres[livre_id][1]))
+
+    def suggerer(self, terme, nombre=10):
+        """Meilleures suggestions pour un préfixe, ou None tant que la structure n'est pas construite"""
+        if not self.pret:
+            return None
+        prefixe = ' '.join(decouper(terme))
+        if not prefixe:
+            return []
+        with self._verrou:
+            if len(prefixe) <= LONGUEUR_PREFIXE_PRECALCULE and nombre <= TAILLE_PRECALCUL:
+                if prefixe in self._prefixes_perimes:
+                    self._precalcul[prefixe] = self._meilleures(prefixe, TAILLE_PRECALCUL)
+                    self._prefixes_perimes.discard(prefixe)
+                meilleures = self._precalcul.get(prefixe, [])[:nombre]
+            else:
+                meilleures = self._meilleures(prefixe, nombre)
+            return [self._vers_dict(genre, reference) for genre, reference in meilleures]
+
+    def _vers_dict(self, genre, reference):
+        if genre == TITRE:
+            return {'type': TITRE, 'texte': self._titres[reference][0], 'livre_id': reference,
+                    'emprunts': self._popularite.get(reference, 0)}
+        return {'type': AUTEUR, 'texte': self._auteurs[reference]['nom'],
+                'emprunts': self._poids(AUTEUR, reference)}
+
+
+def suggerer_en_base(terme, nombre=10):
+    """Suggestions calculées en base, quand la structure est désactivée ou en construction
+
+    Les livres candidats sont trouvés par préfixe de mot sur l'index du moteur
+    de recherche (FTS5, tsvector), puis classés comme par la structure : une clé
+    du titre ou de l'auteur commence par le préfixe, par popularité d'emprunt.
+    """
+    prefixe = ' '.join(decouper(terme))
+    if not prefixe:
+        return []
+    requete, rang = obtenir_moteur_recherche().rechercher(prefixe)
+    livres = [livre for livre, _ in requete.order_by(rang.desc(), Livre.id).limit(CANDIDATS_EN_BASE)]
+    popularite = dict(db.session.query(Emprunt.livre_id, func.count(Emprunt.id))
+                      .filter(Emprunt.livre_id.in_([livre.id for livre in livres]))
+                      .group_by(Emprunt.livre_id).all()) if livres else {}
+
+    suggestions, auteurs = [], {}
+    for livre in livres:
+        emprunts = popularite.get(livre.id, 0)
+        if any(cle.startswith(prefixe) for cle in _cles(livre.titre)):
+            suggestions.append({'type': TITRE, 'texte': livre.titre, 'livre_id': livre.id, 'emprunts': emprunts})
+        if any(cle.startswith(prefixe) for cle in _cles(livre.auteur)):
+            auteur = auteurs.setdefault(normaliser(livre.auteur).strip(),
+                                        {'type': AUTEUR, 'texte': livre.auteur, 'emprunts': 0})
+            auteur['emprunts'] += emprunts
+    suggestions.extend(auteurs.values())
+    suggestions.sort(key=lambda suggestion: (-suggestion['emprunts'], normaliser(suggestion['texte'])))
+    return suggestions[:nombre]
+
+
+def initialiser_suggestions(app):
+    """Enregistrer la structure de suggestions du catalogue si activée par la configuration"""
+    if not app.config.get('SUGGESTIONS_MEMOIRE'):
+        return
+    index = IndexSuggestions(app)
+    app.extensions['suggestions_livres'] = index
+    abonner_invalidations(app, 'livres', lambda ids: rafraichir_livres(index, ids))
+
+    @app.before_request
+    def demarrer_suggestions():
+        index.demarrer()
+
+
+def obtenir_suggestions():
+    """Obtenir la structure de suggestions du catalogue, ou None si elle est désactivée"""
+    return current_app.extensions.get('suggestions_livres')
@@ -0,0 +1,21 @@
+import unicodedata
+
+
+def normaliser(texte):
+    """Mettre en minuscules et retirer les accents"""
+    decompose = unicodedata.normalize('NFKD', (texte or '').lower())
+    return ''.join(c for c in decompose if not unicodedata.combining(c))
+
+
+def decouper(texte):
+    """Découper un texte en mots normalisés"""
+    mots, courant = [], []
+    for caractere in normaliser(texte):
+        if caractere.isalnum():
+            courant.append(caractere)
+        elif courant:
+            mots.append(''.join(courant))
+            courant = []
+    if courant:
+        mots.append(''.join(courant))
+    return mots
@@ -31,6 +31,7 @@ class SchemaLivre(Schema):
     isbn = fields.String(required=True, validate=validate.Length(min=10, max=20))
     date_publication = fields.Date()
     quantite = fields.Integer(validate=validate.Range(min=1))
+    categorie_id = fields.Integer(allow_none=True)
 
 class SchemaMiseAJourLivre(Schema):
     titre = fields.String(validate=validate.Length(min=1, max=200))
@@ -38,6 +39,16 @@ class SchemaMiseAJourLivre(Schema):
     isbn = fields.String(validate=validate.Length(min=10, max=20))
     date_publication = fields.Date()
     quantite = fields.Integer(validate=validate.Range(min=1))
+    categorie_id = fields.Integer(allow_none=True)
+
+# Schémas de catégorie
+class SchemaCategorie(Schema):
+    nom = fields.String(required=True, validate=validate.Length(min=1, max=50))
+    description = fields.String(validate=validate.Length(max=200))
+
+class SchemaMiseAJourCategorie(Schema):
+    nom = fields.String(validate=validate.Length(min=1, max=50))
+    description = fields.String(validate=validate.Length(max=200))
 
 # Schémas Emprunt
 class SchemaCreationEmprunt(Schema):
@@ -47,6 +58,15 @@ class SchemaCreationEmprunt(Schema):
 class SchemaRetourEmprunt(Schema):
     emprunt_id = fields.Integer(required=True)
 
+class SchemaCreationEmpruntsLot(Schema):
+    livre_ids = fields.List(fields.Integer(), required=True, validate=validate.Length(min=1, max=50))
+    duree_emprunt = fields.Integer(validate=validate.Range(min=1, max=30))
+    tout_ou_rien = fields.Boolean(load_default=True)
+
+class SchemaRetourEmpruntsLot(Schema):
+    emprunt_ids = fields.List(fields.Integer(), required=True, validate=validate.Length(min=1, max=50))
+    tout_ou_rien = fields.Boolean(load_default=True)
+
 # Fonctions utilitaires pour la validation
 def valider_email_utilisateur(email):
     """Valider le format de l'email"""
@@ -0,0 +1,36 @@
+"""ajout de la table tokens_revoques
+
+Revision ID: 3c8e1f4a9b27
+Revises: 5a5fef6fc86f
+Create Date: 2026-10-17 09:12:41.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8e1f4a9b27'
+down_revision = '5a5fef6fc86f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tokens_revoques',
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('expire_le', sa.DateTime(), nullable=False),
+    sa.Column('revoque_le', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    with op.batch_alter_table('tokens_revoques', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_tokens_revoques_expire_le'), ['expire_le'], unique=False)
+        batch_op.create_index(batch_op.f('ix_tokens_revoques_revoque_le'), ['revoque_le'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tokens_revoques', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_tokens_revoques_revoque_le'))
+        batch_op.drop_index(batch_op.f('ix_tokens_revoques_expire_le'))
+
+    op.drop_table('tokens_revoques')
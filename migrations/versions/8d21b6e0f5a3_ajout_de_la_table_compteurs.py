@@ -0,0 +1,33 @@
+"""ajout de la table compteurs
+
+Revision ID: 8d21b6e0f5a3
+Revises: 3c8e1f4a9b27
+Create Date: 2026-10-17 10:03:17.552941
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d21b6e0f5a3'
+down_revision = '3c8e1f4a9b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('compteurs',
+    sa.Column('nom', sa.String(length=50), nullable=False),
+    sa.Column('valeur', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('nom')
+    )
+    # Initialiser les compteurs à partir des données existantes
+    op.execute("INSERT INTO compteurs (nom, valeur) SELECT 'livres', COUNT(*) FROM livres")
+    op.execute("INSERT INTO compteurs (nom, valeur) SELECT 'emprunts', COUNT(*) FROM emprunts")
+    op.execute("INSERT INTO compteurs (nom, valeur) "
+               "SELECT 'emprunts_actifs', COUNT(*) FROM emprunts WHERE date_retour_effective IS NULL")
+
+
+def downgrade():
+    op.drop_table('compteurs')
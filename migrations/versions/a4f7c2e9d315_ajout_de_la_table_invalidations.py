@@ -0,0 +1,34 @@
+"""ajout de la table invalidations
+
+Revision ID: a4f7c2e9d315
+Revises: d8c4f1a7e536
+Create Date: 2026-10-17 22:41:08.215873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4f7c2e9d315'
+down_revision = 'd8c4f1a7e536'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('invalidations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('cree_le', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('invalidations', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_invalidations_cree_le'), ['cree_le'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('invalidations', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_invalidations_cree_le'))
+
+    op.drop_table('invalidations')
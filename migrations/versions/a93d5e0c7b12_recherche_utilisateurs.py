@@ -0,0 +1,76 @@
+"""recherche indexée des utilisateurs
+
+Revision ID: a93d5e0c7b12
+Revises: e7a35c1b8f40
+Create Date: 2026-10-17 16:05:31.418207
+
+"""
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a93d5e0c7b12'
+down_revision = 'e7a35c1b8f40'
+branch_labels = None
+depends_on = None
+
+# Nombre d'utilisateurs renseignés par lot
+TAILLE_LOT = 5000
+
+
+# Copies figées de app.utils.texte.normaliser et app.models.user.texte_de_recherche :
+# la migration ne doit pas dépendre du code applicatif, qui peut évoluer
+def normaliser(texte):
+    decompose = unicodedata.normalize('NFKD', (texte or '').lower())
+    return ''.join(c for c in decompose if not unicodedata.combining(c))
+
+
+def texte_de_recherche(prenom, nom, email):
+    return f"{normaliser(prenom).strip()} {normaliser(nom).strip()} {(email or '').strip().lower()}"
+
+
+def upgrade():
+    with op.batch_alter_table('utilisateurs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('recherche', sa.String(length=230), nullable=True))
+
+    # Renseigner la colonne normalisée par lots (la normalisation des accents est faite en Python)
+    connexion = op.get_bind()
+    dernier_id = 0
+    while True:
+        lignes = connexion.execute(sa.text(
+            'SELECT id, prenom, nom, email FROM utilisateurs WHERE id > :dernier_id ORDER BY id LIMIT :taille'
+        ), {'dernier_id': dernier_id, 'taille': TAILLE_LOT}).fetchall()
+        if not lignes:
+            break
+        connexion.execute(
+            sa.text('UPDATE utilisateurs SET recherche = :recherche WHERE id = :id'),
+            [{'id': ligne.id, 'recherche': texte_de_recherche(ligne.prenom, ligne.nom, ligne.email)} for ligne in lignes]
+        )
+        dernier_id = lignes[-1].id
+
+    if connexion.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        with op.get_context().autocommit_block():
+            op.execute('CREATE INDEX CONCURRENTLY ix_utilisateurs_recherche ON utilisateurs (recherche varchar_pattern_ops)')
+            op.execute('CREATE INDEX CONCURRENTLY ix_utilisateurs_recherche_trgm ON utilisateurs USING gin (recherche gin_trgm_ops)')
+            op.execute('CREATE INDEX CONCURRENTLY ix_utilisateurs_email_minuscule ON utilisateurs (lower(email) varchar_pattern_ops)')
+    else:
+        op.create_index('ix_utilisateurs_recherche', 'utilisateurs', ['recherche'])
+        op.create_index('ix_utilisateurs_email_minuscule', 'utilisateurs', [sa.text('lower(email)')])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_utilisateurs_email_minuscule')
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_utilisateurs_recherche_trgm')
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_utilisateurs_recherche')
+    else:
+        op.drop_index('ix_utilisateurs_email_minuscule', table_name='utilisateurs')
+        op.drop_index('ix_utilisateurs_recherche', table_name='utilisateurs')
+
+    with op.batch_alter_table('utilisateurs', schema=None) as batch_op:
+        batch_op.drop_column('recherche')
@@ -0,0 +1,60 @@
+"""suppression en cascade des emprunts
+
+Revision ID: b6e1d3f9a284
+Revises: f2b84c6d1a57
+Create Date: 2026-10-17 19:08:12.417093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e1d3f9a284'
+down_revision = 'f2b84c6d1a57'
+branch_labels = None
+depends_on = None
+
+# (colonne, table référencée) des clés étrangères de emprunts
+CLES = [
+    ('utilisateur_id', 'utilisateurs'),
+    ('livre_id', 'livres'),
+]
+
+# Les clés étrangères créées sans nom sous SQLite sont retrouvées par cette convention
+CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _recreer_cles(ondelete):
+    if op.get_bind().dialect.name == 'postgresql':
+        for colonne, table in CLES:
+            nom = f'emprunts_{colonne}_fkey'
+            op.execute(f'ALTER TABLE emprunts DROP CONSTRAINT IF EXISTS {nom}')
+            # NOT VALID puis VALIDATE : la validation ne bloque pas les écritures sur la table
+            op.execute(
+                f'ALTER TABLE emprunts ADD CONSTRAINT {nom} FOREIGN KEY ({colonne}) '
+                f'REFERENCES {table} (id){" ON DELETE " + ondelete if ondelete else ""} NOT VALID'
+            )
+            op.execute(f'ALTER TABLE emprunts VALIDATE CONSTRAINT {nom}')
+        return
+
+    # SQLite recrée la table ; les clés étrangères sont désactivées le temps de la copie
+    with op.get_context().autocommit_block():
+        op.execute('PRAGMA foreign_keys=OFF')
+    with op.batch_alter_table('emprunts', recreate='always', naming_convention=CONVENTION) as batch_op:
+        for colonne, table in CLES:
+            nom = f'fk_emprunts_{colonne}_{table}'
+            batch_op.drop_constraint(nom, type_='foreignkey')
+            batch_op.create_foreign_key(nom, table, [colonne], ['id'], ondelete=ondelete)
+    with op.get_context().autocommit_block():
+        op.execute('PRAGMA foreign_keys=ON')
+
+
+def upgrade():
+    # La base supprime les emprunts d'un livre ou d'un utilisateur supprimé, sans
+    # que l'ORM ait à les charger
+    _recreer_cles('CASCADE')
+
+
+def downgrade():
+    _recreer_cles(None)
@@ -0,0 +1,46 @@
+"""index des emprunts, livres et catégories
+
+Revision ID: c41f7a2d9e63
+Revises: 8d21b6e0f5a3
+Create Date: 2026-10-17 11:26:05.204417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f7a2d9e63'
+down_revision = '8d21b6e0f5a3'
+branch_labels = None
+depends_on = None
+
+EMPRUNTS_ACTIFS = sa.text('date_retour_effective IS NULL')
+
+# (nom, table, colonnes, condition de l'index partiel)
+INDEX = [
+    ('ix_emprunts_utilisateur_actifs', 'emprunts', ['utilisateur_id'], EMPRUNTS_ACTIFS),
+    ('ix_emprunts_utilisateur_date', 'emprunts', ['utilisateur_id', 'date_emprunt', 'id'], None),
+    ('ix_emprunts_retard', 'emprunts', ['date_retour_prevue'], EMPRUNTS_ACTIFS),
+    ('ix_emprunts_livre_id', 'emprunts', ['livre_id'], None),
+    ('ix_emprunts_date_emprunt', 'emprunts', ['date_emprunt', 'id'], None),
+    ('ix_livres_categorie_id', 'livres', ['categorie_id'], None),
+    ('ix_livres_titre', 'livres', ['titre', 'id'], None),
+    ('ix_utilisateurs_nom', 'utilisateurs', ['nom', 'id'], None),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY ne peut pas s'exécuter dans une transaction (PostgreSQL)
+    with op.get_context().autocommit_block():
+        for nom, table, colonnes, condition in INDEX:
+            op.create_index(nom, table, colonnes, unique=False,
+                            postgresql_concurrently=True,
+                            postgresql_where=condition,
+                            sqlite_where=condition)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for nom, table, colonnes, condition in reversed(INDEX):
+            op.drop_index(nom, table_name=table, postgresql_concurrently=True)
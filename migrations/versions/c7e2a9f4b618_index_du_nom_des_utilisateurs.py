@@ -0,0 +1,35 @@
+"""index du nom des utilisateurs
+
+Revision ID: c7e2a9f4b618
+Revises: a4f7c2e9d315
+Create Date: 2026-10-18 10:12:47.306925
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2a9f4b618'
+down_revision = 'a4f7c2e9d315'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Index sur « nom email » (la colonne recherche sans le prénom) : recherche par début de nom
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("CREATE INDEX CONCURRENTLY ix_utilisateurs_recherche_nom ON utilisateurs "
+                       "((substr(recherche, strpos(recherche, ' ') + 1)) varchar_pattern_ops)")
+    else:
+        op.create_index('ix_utilisateurs_recherche_nom', 'utilisateurs',
+                        [sa.text("substr(recherche, instr(recherche, ' ') + 1)")])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_utilisateurs_recherche_nom')
+    else:
+        op.drop_index('ix_utilisateurs_recherche_nom', table_name='utilisateurs')
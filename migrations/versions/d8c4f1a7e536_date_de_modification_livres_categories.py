@@ -0,0 +1,56 @@
+"""date de modification des livres et catégories
+
+Revision ID: d8c4f1a7e536
+Revises: b6e1d3f9a284
+Create Date: 2026-10-17 20:14:52.731604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8c4f1a7e536'
+down_revision = 'b6e1d3f9a284'
+branch_labels = None
+depends_on = None
+
+# Nombre de lignes renseignées par lot
+TAILLE_LOT = 5000
+
+
+def _renseigner(connexion, table):
+    # La date de création sert de première date de modification
+    dernier_id = 0
+    while True:
+        fin = connexion.execute(sa.text(
+            f'SELECT max(id) FROM (SELECT id FROM {table} WHERE id > :dernier_id ORDER BY id LIMIT :taille) lot'
+        ), {'dernier_id': dernier_id, 'taille': TAILLE_LOT}).scalar()
+        if fin is None:
+            break
+        connexion.execute(sa.text(
+            f'UPDATE {table} SET modifie_le = COALESCE(cree_le, CURRENT_TIMESTAMP) '
+            'WHERE id > :dernier_id AND id <= :fin'
+        ), {'dernier_id': dernier_id, 'fin': fin})
+        dernier_id = fin
+
+
+def upgrade():
+    for table in ('livres', 'categories'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('modifie_le', sa.DateTime(), nullable=True))
+        _renseigner(op.get_bind(), table)
+
+    # max(modifie_le) sert les validateurs HTTP (ETag, Last-Modified) de la liste des livres
+    with op.get_context().autocommit_block():
+        op.create_index('ix_livres_modifie_le', 'livres', ['modifie_le'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_livres_modifie_le', table_name='livres', postgresql_concurrently=True)
+
+    # DROP COLUMN direct : recréer la table livres sous SQLite supprimerait ses déclencheurs
+    for table in ('categories', 'livres'):
+        op.execute(f'ALTER TABLE {table} DROP COLUMN modifie_le')
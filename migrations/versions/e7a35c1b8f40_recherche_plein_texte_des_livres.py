@@ -0,0 +1,81 @@
+"""recherche plein texte des livres
+
+Revision ID: e7a35c1b8f40
+Revises: c41f7a2d9e63
+Create Date: 2026-10-17 13:48:52.771630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a35c1b8f40'
+down_revision = 'c41f7a2d9e63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialecte = op.get_bind().dialect.name
+
+    if dialecte == 'postgresql':
+        # Colonne tsvector générée : maintenue par PostgreSQL à chaque insertion ou mise à jour
+        op.execute(
+            "ALTER TABLE livres ADD COLUMN recherche tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(titre, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(isbn, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(auteur, '')), 'B')"
+            ") STORED"
+        )
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        with op.get_context().autocommit_block():
+            op.execute('CREATE INDEX CONCURRENTLY ix_livres_recherche ON livres USING gin (recherche)')
+            op.execute('CREATE INDEX CONCURRENTLY ix_livres_titre_trgm ON livres USING gin (titre gin_trgm_ops)')
+            op.execute('CREATE INDEX CONCURRENTLY ix_livres_auteur_trgm ON livres USING gin (auteur gin_trgm_ops)')
+            op.execute('CREATE INDEX CONCURRENTLY ix_livres_isbn_trgm ON livres USING gin (isbn gin_trgm_ops)')
+
+    elif dialecte == 'sqlite':
+        # Table FTS5 à contenu externe, synchronisée par des déclencheurs
+        op.execute(
+            "CREATE VIRTUAL TABLE livres_fts USING fts5("
+            "titre, auteur, isbn, content='livres', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        op.execute(
+            "CREATE TRIGGER livres_fts_ai AFTER INSERT ON livres BEGIN "
+            "INSERT INTO livres_fts (rowid, titre, auteur, isbn) VALUES (new.id, new.titre, new.auteur, new.isbn); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER livres_fts_ad AFTER DELETE ON livres BEGIN "
+            "INSERT INTO livres_fts (livres_fts, rowid, titre, auteur, isbn) "
+            "VALUES ('delete', old.id, old.titre, old.auteur, old.isbn); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER livres_fts_au AFTER UPDATE OF titre, auteur, isbn ON livres BEGIN "
+            "INSERT INTO livres_fts (livres_fts, rowid, titre, auteur, isbn) "
+            "VALUES ('delete', old.id, old.titre, old.auteur, old.isbn); "
+            "INSERT INTO livres_fts (rowid, titre, auteur, isbn) VALUES (new.id, new.titre, new.auteur, new.isbn); "
+            "END"
+        )
+        op.execute("INSERT INTO livres_fts (livres_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialecte = op.get_bind().dialect.name
+
+    if dialecte == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_livres_isbn_trgm')
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_livres_auteur_trgm')
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_livres_titre_trgm')
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_livres_recherche')
+        op.execute('ALTER TABLE livres DROP COLUMN recherche')
+
+    elif dialecte == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS livres_fts_au')
+        op.execute('DROP TRIGGER IF EXISTS livres_fts_ad')
+        op.execute('DROP TRIGGER IF EXISTS livres_fts_ai')
+        op.execute('DROP TABLE IF EXISTS livres_fts')
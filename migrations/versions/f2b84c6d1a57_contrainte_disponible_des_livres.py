@@ -0,0 +1,50 @@
+"""contrainte disponible des livres
+
+Revision ID: f2b84c6d1a57
+Revises: a93d5e0c7b12
+Create Date: 2026-10-17 17:21:46.902513
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b84c6d1a57'
+down_revision = 'a93d5e0c7b12'
+branch_labels = None
+depends_on = None
+
+CONDITION = 'disponible >= 0 AND disponible <= quantite'
+
+
+def upgrade():
+    # Ramener dans les bornes les livres déjà surréservés avant de poser la contrainte
+    op.execute(
+        'UPDATE livres SET disponible = CASE WHEN disponible < 0 THEN 0 ELSE quantite END '
+        f'WHERE NOT ({CONDITION})'
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # NOT VALID puis VALIDATE : la validation ne bloque pas les écritures sur la table
+        op.execute(f'ALTER TABLE livres ADD CONSTRAINT ck_livres_disponible CHECK ({CONDITION}) NOT VALID')
+        op.execute('ALTER TABLE livres VALIDATE CONSTRAINT ck_livres_disponible')
+    else:
+        # SQLite ne sait pas ajouter une contrainte à une table existante sans la recréer
+        # (ce qui supprimerait les déclencheurs de la recherche plein texte) : la
+        # contrainte est appliquée par des déclencheurs
+        for evenement in ('INSERT', 'UPDATE OF disponible, quantite'):
+            nom = 'ck_livres_disponible_' + evenement.split()[0].lower()
+            op.execute(
+                f'CREATE TRIGGER {nom} BEFORE {evenement} ON livres '
+                'WHEN NOT (new.disponible >= 0 AND new.disponible <= new.quantite) '
+                "BEGIN SELECT RAISE(ABORT, 'CHECK constraint failed: ck_livres_disponible'); END"
+            )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE livres DROP CONSTRAINT IF EXISTS ck_livres_disponible')
+    else:
+        op.execute('DROP TRIGGER IF EXISTS ck_livres_disponible_update')
+        op.execute('DROP TRIGGER IF EXISTS ck_livres_disponible_insert')
@@ -32,10 +32,98 @@ def create_admin(email, password):
     print(f"Admin {email} créé avec succès")
 
 
+@app.cli.command("bench-login")
+@click.option("--nombre", default=200, help="Nombre de vérifications de mot de passe")
+@click.option("--concurrence", default=0, help="Nombre de requêtes simultanées (défaut: taille du pool)")
+def bench_login(nombre, concurrence):
+    """Mesurer le débit de connexion (vérifications bcrypt par seconde et par cœur)"""
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from app.utils.hachage import hacher_mot_de_passe, _verifier
+
+    pool = app.extensions['hachage']
+    coeurs = pool.nombre_workers or 1
+    mot_de_passe_hash = hacher_mot_de_passe("MotDePasseDeTest123")
+    # Préchauffer les processus du pool
+    pool.executer(_verifier, mot_de_passe_hash, "MotDePasseDeTest123")
+
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrence or coeurs) as executeur:
+        resultats = list(executeur.map(
+            lambda _: pool.executer(_verifier, mot_de_passe_hash, "MotDePasseDeTest123"), range(nombre)
+        ))
+    duree = time.perf_counter() - debut
+
+    assert all(resultats)
+    print(f"Coût bcrypt: {app.config['BCRYPT_LOG_ROUNDS']}, workers: {pool.nombre_workers}")
+    print(f"{nombre} connexions en {duree:.2f}s : {nombre / duree:.1f} connexions/s, "
+          f"{nombre / duree / coeurs:.1f} connexions/s/cœur")
+
+
+@app.cli.command("bench-json")
+@click.option("--lignes", default=1000, help="Nombre de livres et d'emprunts par réponse")
+@click.option("--repetitions", default=200, help="Nombre d'encodages mesurés par charge utile")
+def bench_json(lignes, repetitions):
+    """Comparer le débit d'encodage JSON des listes de livres et d'emprunts (orjson, module json)"""
+    import time
+    from datetime import date, datetime, timedelta
+    from flask.json.provider import DefaultJSONProvider
+    from app.models import Emprunt, Livre
+    from app.utils.serialisation import FournisseurJSON, orjson
+
+    maintenant = datetime.utcnow()
+    livres, emprunts = [], []
+    for i in range(lignes):
+        livres.append(Livre(
+            id=i + 1, titre=f"Titre du livre numéro {i}", auteur=f"Auteur {i % 97}", isbn=f"978{i:010d}",
+            date_publication=date(1950 + i % 70, 1 + i % 12, 1 + i % 28), quantite=3, disponible=i % 4,
+            categorie_id=i % 10 or None, cree_le=maintenant - timedelta(days=i), modifie_le=maintenant
+        ))
+        emprunt = Emprunt(utilisateur_id=1 + i % 50, livre_id=i + 1, duree_emprunt=14)
+        emprunt.id = i + 1
+        emprunt.date_emprunt = maintenant - timedelta(days=i % 30)
+        emprunt.date_retour_prevue = emprunt.date_emprunt + timedelta(days=14)
+        emprunt.date_retour_effective = maintenant if i % 3 == 0 else None
+        emprunts.append(emprunt)
+
+    def charge(nom, elements):
+        return {'statut': 'succes', nom: [element.vers_dict() for element in elements],
+                'pagination': {'page': 1, 'par_page': lignes, 'total': lignes}}
+
+    def en_texte(valeur):
+        # Dates converties par isoformat(), comme le fait date_json sans orjson
+        if isinstance(valeur, dict):
+            return {cle: en_texte(element) for cle, element in valeur.items()}
+        if isinstance(valeur, list):
+            return [en_texte(element) for element in valeur]
+        return valeur.isoformat() if isinstance(valeur, date) else valeur
+
+    # Sans orjson, vers_dict convertit les dates (date_json) : le module json reçoit des chaînes
+    fournisseurs = [('fournisseur de Flask', DefaultJSONProvider(app), True),
+                    ('module json (sans orjson)', FournisseurJSON(app, rapide=False), True)]
+    if orjson is not None:
+        fournisseurs.append(('orjson', FournisseurJSON(app), False))
+    else:
+        print("orjson n'est pas installé : seul le module json est mesuré")
+
+    with app.test_request_context():
+        for nom, elements in (('livres', livres), ('emprunts', emprunts)):
+            donnees = charge(nom, elements)
+            donnees_texte = en_texte(donnees)
+            print(f"{lignes} {nom} :")
+            for libelle, fournisseur, convertir in fournisseurs:
+                charge_utile = donnees_texte if convertir else donnees
+                debut = time.perf_counter()
+                for _ in range(repetitions):
+                    corps = fournisseur.response(charge_utile).get_data()
+                duree = (time.perf_counter() - debut) / repetitions
+                print(f"  {libelle:<26} {duree * 1000:7.2f} ms/réponse  {lignes / duree:10.0f} lignes/s  "
+                      f"{len(corps) / 1024:.0f} Kio")
+
+
 
 
 
 if __name__ == '__main__':
     app.run(debug=True)
 
-
@@ -0,0 +1,45 @@
+import pytest
+from app import create_app, db
+
+CONFIGURATION_TEST = {
+    'TESTING': True,
+    'JWT_REVOCATION_BACKEND': 'memoire',
+    'BCRYPT_LOG_ROUNDS': 4,
+    'BCRYPT_POOL_WORKERS': 0,
+    'DERNIERE_CONNEXION_DIFFEREE': False,
+    'BUS_INVALIDATION': 'aucun',
+    'METRIQUES_ACTIVEES': False,
+}
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Application de test sur une base SQLite fichier (partageable entre threads)"""
+    application = create_app({**CONFIGURATION_TEST,
+                              'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'bibliotheque.db'}"})
+    with application.app_context():
+        db.create_all(bind_key=None)
+        yield application
+        db.session.remove()
+        db.drop_all(bind_key=None)
+
+
+@pytest.fixture
+def app_http(tmp_path):
+    """Créer une application de test sans contexte englobant : chaque requête HTTP a son propre g"""
+    applications = []
+
+    def creer(**configuration):
+        application = create_app({**CONFIGURATION_TEST,
+                                  'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'bibliotheque.db'}",
+                                  **configuration})
+        with application.app_context():
+            db.create_all(bind_key=None)
+        applications.append(application)
+        return application
+
+    yield creer
+    for application in applications:
+        with application.app_context():
+            db.session.remove()
+            db.drop_all(bind_key=None)
@@ -0,0 +1,30 @@
+from app import db
+from app.models.category import Categorie
+
+
+def test_budget_strict_de_requetes_sql(app_http):
+    application = app_http(SQL_INSTRUMENTATION=True, SQL_BUDGET_STRICT=True, SQL_BUDGET_REQUETES=100,
+                           CACHE_REPONSES_ACTIVE=False)
+    with application.app_context():
+        db.session.add_all([Categorie(nom='Roman'), Categorie(nom='Poésie')])
+        db.session.commit()
+    client = application.test_client()
+    # La première requête du processus lit aussi les structures partagées (compteurs, schéma)
+    client.get('/categories')
+
+    reponse = client.get('/categories')
+    nombre = int(reponse.headers['Server-Timing'].split('"')[1].split()[0])
+    application.config['SQL_BUDGET_REQUETES'] = nombre
+    reponse = client.get('/categories')
+    assert reponse.status_code == 200
+    assert len(reponse.get_json()['categories']) == 2
+
+    application.config['SQL_BUDGET_REQUETES'] = nombre - 1
+    reponse = client.get('/categories')
+    assert reponse.status_code == 500
+    assert reponse.get_json() == {
+        'statut': 'erreur',
+        'message': f'GET /categories a exécuté {nombre} requêtes SQL (budget : {nombre - 1})'
+    }
+    # Le dépassement conserve la mesure dans l'en-tête Server-Timing
+    assert f'"{nombre} requetes"' in reponse.headers['Server-Timing']
@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import insert
+from app import db
+from app.models.invalidation import Invalidation
+from app.utils.bus_invalidation import BusInvalidation
+
+
+def _journaliser(identifiant, cle):
+    db.session.execute(insert(Invalidation), [{'id': identifiant, 'message': f'autre-worker|{cle}',
+                                               'cree_le': datetime.utcnow()}])
+    db.session.commit()
+
+
+def test_sondage_distribue_une_validation_tardive_une_seule_fois(app):
+    bus = BusInvalidation(app)
+    recus = []
+    bus.abonner('livres', recus.extend)
+    _journaliser(1, 'livres:1')
+    bus._lire_journal()
+
+    _journaliser(5, 'livres:5')
+    bus._lire_journal()
+    # La transaction qui a reçu l'id 3 valide après le sondage qui a lu l'id 5
+    _journaliser(3, 'livres:3')
+    bus._lire_journal()
+    bus._lire_journal()
+
+    assert recus == ['5', '3']
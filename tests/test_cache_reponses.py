@@ -0,0 +1,48 @@
+import shutil
+import pytest
+from app import create_app, db
+from app.models.book import Livre
+from app.models.user import Utilisateur
+
+
+@pytest.fixture
+def app_avec_replique(tmp_path):
+    """Application dont la réplique est une copie figée du primaire (réplique en retard)"""
+    primaire, replique = tmp_path / 'primaire.db', tmp_path / 'replique.db'
+    application = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primaire}',
+        'DATABASE_REPLICA_URLS': [f'sqlite:///{replique}'],
+        'JWT_REVOCATION_BACKEND': 'memoire',
+        'BCRYPT_LOG_ROUNDS': 4,
+        'BCRYPT_POOL_WORKERS': 0,
+        'DERNIERE_CONNEXION_DIFFEREE': False,
+        'BUS_INVALIDATION': 'aucun',
+        'METRIQUES_ACTIVEES': False,
+    })
+    with application.app_context():
+        db.create_all(bind_key=None)
+        lecteur = Utilisateur(prenom='Jean', nom='Dupont', email='jean@example.com')
+        lecteur.mot_de_passe = 'motdepasse1'
+        db.session.add_all([lecteur, Livre(titre='Vol de nuit', auteur='Saint-Exupéry', isbn='9780000000001',
+                                           quantite=1, disponible=1)])
+        db.session.commit()
+        db.engine.dispose()
+    shutil.copy(primaire, replique)
+    # Sans contexte d'application englobant : chaque requête a son propre g
+    return application
+
+
+def test_lecture_de_ses_ecritures_malgre_le_cache(app_avec_replique):
+    lecteur, autre_client = app_avec_replique.test_client(), app_avec_replique.test_client()
+    reponse = lecteur.post('/auth/login', json={'email': 'jean@example.com', 'mot_de_passe': 'motdepasse1'})
+    entetes = {'Authorization': 'Bearer ' + reponse.get_json()['tokens']['token_acces']}
+    assert autre_client.get('/books/1').get_json()['livre']['disponible'] == 1
+
+    assert lecteur.post('/loans', headers=entetes, json={'livre_id': 1}).status_code == 201
+
+    # Un autre client lit la réplique en retard ; sa réponse n'est pas mise en cache
+    assert autre_client.get('/books/1').get_json()['livre']['disponible'] == 1
+    assert app_avec_replique.extensions['cache_reponses'].statistiques()['entrees'] == 0
+    # Le lecteur, qui vient d'écrire, contourne le cache et lit le primaire
+    assert lecteur.get('/books/1', headers=entetes).get_json()['livre']['disponible'] == 0
@@ -0,0 +1,71 @@
+import threading
+import pytest
+from app import db
+from app.models.book import Livre
+from app.models.loan import Emprunt
+from app.models.user import Utilisateur
+from app.services import loan_service
+from app.utils.error_handler import ErreurConflit
+
+EXEMPLAIRES = 5
+THREADS = 16
+TENTATIVES = 10
+
+
+@pytest.fixture
+def lecteur_et_livre(app):
+    lecteur = Utilisateur(prenom='Jean', nom='Dupont', email='jean@example.com', mot_de_passe_hash='x')
+    livre = Livre(titre='Vol de nuit', auteur='Saint-Exupéry', isbn='9780000000001',
+                  quantite=EXEMPLAIRES, disponible=EXEMPLAIRES)
+    autre = Livre(titre='Terre des hommes', auteur='Saint-Exupéry', isbn='9780000000002', quantite=1, disponible=1)
+    db.session.add_all([lecteur, livre, autre])
+    db.session.commit()
+    return lecteur.id, livre.id, autre.id
+
+
+def _stock(livre_id):
+    db.session.expire_all()
+    livre = db.session.get(Livre, livre_id)
+    return livre.disponible, Emprunt.query.filter_by(livre_id=livre_id, date_retour_effective=None).count()
+
+
+def test_emprunts_simultanes_ne_surreservent_jamais(app, lecteur_et_livre):
+    utilisateur_id, livre_id, _ = lecteur_et_livre
+    reussis, refuses, erreurs = [], [], []
+    depart = threading.Barrier(THREADS)
+
+    def emprunter():
+        depart.wait()
+        for _ in range(TENTATIVES):
+            with app.app_context():
+                try:
+                    reussis.append(loan_service.creer_emprunt(utilisateur_id, {'livre_id': livre_id})['id'])
+                except ErreurConflit:
+                    refuses.append(1)
+                except Exception as erreur:
+                    erreurs.append(erreur)
+
+    executants = [threading.Thread(target=emprunter) for _ in range(THREADS)]
+    for executant in executants:
+        executant.start()
+    for executant in executants:
+        executant.join()
+
+    disponible, emprunts_actifs = _stock(livre_id)
+    assert not erreurs, erreurs
+    assert disponible == 0
+    assert len(reussis) == emprunts_actifs == EXEMPLAIRES
+    assert len(refuses) == THREADS * TENTATIVES - EXEMPLAIRES
+
+
+def test_lot_annule_ne_valide_aucune_reservation(app, lecteur_et_livre):
+    utilisateur_id, livre_id, autre_id = lecteur_et_livre
+    loan_service.creer_emprunt(utilisateur_id, {'livre_id': autre_id})
+
+    with pytest.raises(ErreurConflit) as erreur:
+        loan_service.creer_emprunts_lot(utilisateur_id, [livre_id, autre_id], tout_ou_rien=True)
+
+    statuts = [resultat['statut'] for resultat in erreur.value.payload['resultats']]
+    assert statuts == ['annule', 'indisponible']
+    assert _stock(livre_id) == (EXEMPLAIRES, 0)
+    assert _stock(autre_id) == (0, 1)
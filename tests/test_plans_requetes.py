@@ -0,0 +1,84 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from app import db
+from app.models.book import Livre
+from app.models.category import Categorie
+from app.models.loan import Emprunt
+from app.models.user import Utilisateur, texte_de_recherche
+from app.utils.database import _condition_apres
+from app.utils.plans_requetes import verifier_plans, _expliquer, _parcours_sequentiel
+
+UTILISATEURS = 2000
+LIVRES = 5000
+CATEGORIES = 20
+EMPRUNTS = 50000
+
+
+def peupler(graine=7):
+    """Volume proche de la production : la plupart des emprunts sont retournés, quelques-uns en retard"""
+    hasard = random.Random(graine)
+    maintenant = datetime.utcnow()
+    db.session.execute(insert(Categorie), [
+        {'id': i, 'nom': f'Catégorie {i}', 'cree_le': maintenant} for i in range(1, CATEGORIES + 1)
+    ])
+    utilisateurs = []
+    for i in range(1, UTILISATEURS + 1):
+        prenom, nom, email = f'Prénom{i}', f'Nom{i % 500}', f'lecteur{i}@example.com'
+        utilisateurs.append({'id': i, 'prenom': prenom, 'nom': nom, 'email': email, 'mot_de_passe_hash': 'x',
+                             'recherche': texte_de_recherche(prenom, nom, email), 'cree_le': maintenant})
+    db.session.execute(insert(Utilisateur), utilisateurs)
+    db.session.execute(insert(Livre), [
+        {'id': i, 'titre': f'Titre {i}', 'auteur': f'Auteur {i % 800}', 'isbn': f'978{i:010d}', 'quantite': 3,
+         'disponible': 3, 'categorie_id': hasard.randint(1, CATEGORIES), 'cree_le': maintenant, 'modifie_le': maintenant}
+        for i in range(1, LIVRES + 1)
+    ])
+    emprunts = []
+    for i in range(1, EMPRUNTS + 1):
+        date_emprunt = maintenant - timedelta(days=hasard.uniform(0, 730))
+        date_retour_prevue = date_emprunt + timedelta(days=14)
+        actif = date_emprunt > maintenant - timedelta(days=30) and hasard.random() < 0.3
+        emprunts.append({
+            'id': i, 'utilisateur_id': hasard.randint(1, UTILISATEURS), 'livre_id': hasard.randint(1, LIVRES),
+            'date_emprunt': date_emprunt, 'date_retour_prevue': date_retour_prevue,
+            'date_retour_effective': None if actif else date_emprunt + timedelta(days=hasard.uniform(1, 20))
+        })
+    db.session.execute(insert(Emprunt), emprunts)
+    db.session.commit()
+    # Le planificateur s'appuie sur les statistiques des tables
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+def test_requetes_critiques_servies_par_un_index(app):
+    peupler()
+    resultats = verifier_plans()
+    echecs = {resultat['requete']: resultat['plan'] for resultat in resultats if resultat['parcours_sequentiel']}
+    assert not echecs, echecs
+
+
+def test_page_profonde_par_curseur_bornee_par_l_index(app):
+    peupler()
+    pages = {
+        'livres': Livre.query.filter(_condition_apres((Livre.titre, Livre.id), ['Titre 4000', 4000], False))
+            .order_by(Livre.titre, Livre.id).limit(11),
+        'emprunts': Emprunt.query.filter(_condition_apres(
+            (Emprunt.date_emprunt, Emprunt.id), [datetime.utcnow() - timedelta(days=600), 40000], True
+        )).order_by(Emprunt.date_emprunt.desc(), Emprunt.id.desc()).limit(11),
+    }
+    with db.engine.connect() as connexion:
+        plans = {nom: _expliquer(connexion, requete) for nom, requete in pages.items()}
+    # SEARCH : l'index est parcouru à partir du curseur, et non depuis son début
+    assert plans['livres'][0].startswith('SEARCH livres USING INDEX ix_livres_titre'), plans
+    assert plans['emprunts'][0].startswith('SEARCH emprunts USING INDEX ix_emprunts_date_emprunt'), plans
+
+
+@pytest.mark.parametrize('ligne, signalee', [
+    ('SCAN emprunts', True),
+    ('SCAN livres USING INDEX ix_livres_titre', False),
+    ('SCAN utilisateurs USING COVERING INDEX ix_utilisateurs_recherche', False),
+    ('SEARCH emprunts USING INDEX ix_emprunts_utilisateur_actifs (utilisateur_id=?)', False),
+])
+def test_seul_le_parcours_complet_de_table_est_signale_sur_sqlite(ligne, signalee):
+    assert bool(_parcours_sequentiel('sqlite', [ligne])) is signalee
@@ -0,0 +1,29 @@
+from app import db
+from app.models.book import Livre
+from app.services import book_service
+from app.utils.index_livres import IndexInverse
+
+
+def _parcourir(curseur=''):
+    resultat = book_service.rechercher_livres('prince', par_page=2, curseur=curseur)
+    return [livre['id'] for livre in resultat['livres']], resultat['pagination'].get('curseur_suivant')
+
+
+def test_curseur_de_recherche_valable_entre_workers_chaud_et_froid(app):
+    db.session.add_all([Livre(titre=f'Le Prince {i}', auteur='Machiavel', isbn=f'97800000000{i:02d}',
+                              quantite=1, disponible=1) for i in range(1, 6)])
+    db.session.commit()
+    froid, chaud = IndexInverse(app), IndexInverse(app)
+    chaud.construire()
+
+    app.extensions['index_livres'] = chaud
+    page_chaude, curseur_chaud = _parcourir()
+    app.extensions['index_livres'] = froid
+    page_froide, curseur_froid = _parcourir()
+    assert page_chaude == page_froide == [1, 2]
+    assert curseur_chaud == curseur_froid
+
+    # Le curseur d'un worker est repris par l'autre, dans les deux sens
+    assert _parcourir(curseur_chaud)[0] == [3, 4]
+    app.extensions['index_livres'] = chaud
+    assert _parcourir(curseur_froid)[0] == [3, 4]
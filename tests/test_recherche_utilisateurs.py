@@ -0,0 +1,15 @@
+import pytest
+from app import db
+from app.models.user import Utilisateur
+from app.utils.recherche import requete_recherche_utilisateurs
+
+
+@pytest.mark.parametrize('terme', ['je', 'du', 'jd', 'dup'])
+def test_terme_court_trouve_un_debut_de_mot(app, terme):
+    db.session.add_all([
+        Utilisateur(prenom='Jean', nom='Dupont', email='jd@example.com', mot_de_passe_hash='x'),
+        Utilisateur(prenom='Claire', nom='Martin', email='claire@example.com', mot_de_passe_hash='x'),
+    ])
+    db.session.commit()
+    requete, rang = requete_recherche_utilisateurs(terme)
+    assert [utilisateur.nom for utilisateur, _ in requete.order_by(rang.desc())] == ['Dupont']
@@ -0,0 +1,55 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.utils.revocation import ListeRevocation, StockageRevocationFichier, StockageRevocationMemoire
+
+
+@pytest.fixture(params=['Asia/Tokyo', 'America/New_York'])
+def fuseau_local(request, monkeypatch):
+    """Fuseau local du processus différent d'UTC, dans les deux sens"""
+    monkeypatch.setenv('TZ', request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _expiration(minutes=15):
+    return datetime.now(timezone.utc) + timedelta(minutes=minutes)
+
+
+def test_revocation_fichier_independante_du_fuseau_local(tmp_path, fuseau_local):
+    chemin = str(tmp_path / 'revocations.sqlite3')
+    worker, autre_worker = (ListeRevocation(StockageRevocationFichier(chemin), intervalle_synchronisation=0)
+                            for _ in range(2))
+    autre_worker.synchroniser()
+
+    jti = str(uuid.uuid4())
+    worker.revoquer(jti, _expiration())
+
+    assert worker.stockage.contient(jti)
+    assert worker.est_revoque(jti)
+    # Un autre worker voit la révocation à sa prochaine synchronisation, sans attendre la reconstruction
+    assert autre_worker.est_revoque(jti)
+
+
+def test_revocation_accepte_une_expiration_naive_en_utc(tmp_path, fuseau_local):
+    stockage = StockageRevocationFichier(str(tmp_path / 'revocations.sqlite3'))
+    jti = str(uuid.uuid4())
+    stockage.ajouter(jti, datetime.utcnow() + timedelta(minutes=15))
+    assert stockage.contient(jti)
+
+
+def test_revocation_memoire_reconstruite_periodiquement():
+    stockage = StockageRevocationMemoire()
+    liste = ListeRevocation(stockage, intervalle_reconstruction=0)
+    liste.revoquer('expire', datetime.now(timezone.utc) - timedelta(seconds=1))
+    liste.revoquer('actif', _expiration())
+
+    liste.synchroniser()
+
+    # La reconstruction purge les révocations expirées et les retire du filtre
+    assert list(stockage._entrees) == ['actif']
+    assert 'expire' not in liste._filtre
+    assert liste.est_revoque('actif')
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from app import db
+from app.models.book import Livre
+from app.models.loan import Emprunt
+from app.models.user import Utilisateur
+from app.utils.suggestions import suggerer_en_base
+
+
+@pytest.fixture(params=['ilike', 'sqlite'])
+def catalogue(request, app):
+    """Petit catalogue, cherché par ILIKE ou par la table FTS5 de la migration"""
+    app.config['RECHERCHE_BACKEND'] = request.param
+    app.extensions.pop('recherche_livres', None)
+    if request.param == 'sqlite':
+        db.session.execute(db.text(
+            "CREATE VIRTUAL TABLE livres_fts USING fts5(titre, auteur, isbn, content='livres', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+    db.session.add_all([
+        Utilisateur(prenom='Jean', nom='Dupont', email='jean@example.com', mot_de_passe_hash='x'),
+        Livre(titre='Le Petit Prince', auteur='Antoine de Saint-Exupéry', isbn='9780000000001', quantite=1, disponible=1),
+        Livre(titre='Peter Pan', auteur='J. M. Barrie', isbn='9780000000002', quantite=1, disponible=1),
+        Livre(titre='Germinal', auteur='Émile Zola', isbn='9780000000003', quantite=1, disponible=1),
+    ])
+    db.session.commit()
+    if request.param == 'sqlite':
+        db.session.execute(db.text("INSERT INTO livres_fts (livres_fts) VALUES ('rebuild')"))
+    maintenant = datetime.utcnow()
+    db.session.execute(insert(Emprunt), [{'utilisateur_id': 1, 'livre_id': 2, 'date_emprunt': maintenant,
+                                          'date_retour_prevue': maintenant + timedelta(days=14)}])
+    db.session.commit()
+    yield
+    if request.param == 'sqlite':
+        db.session.execute(db.text('DROP TABLE livres_fts'))
+        db.session.commit()
+
+
+def test_suggestions_en_base_par_prefixe_de_mot(catalogue):
+    # Début d'un mot quelconque du titre, classé par popularité d'emprunt
+    assert [s['texte'] for s in suggerer_en_base('pet')] == ['Peter Pan', 'Le Petit Prince']
+    assert [s['texte'] for s in suggerer_en_base('petit pr')] == ['Le Petit Prince']
+    assert suggerer_en_base('zol') == [{'type': 'auteur', 'texte': 'Émile Zola', 'emprunts': 0}]
+    assert suggerer_en_base('rince') == []
@@ -0,0 +1,35 @@
+import pytest
+from app import db
+from app.models.book import Livre
+from app.models.user import Utilisateur
+
+
+@pytest.fixture
+def client_admin(app_http):
+    application = app_http(CACHE_REPONSES_ACTIVE=False)
+    with application.app_context():
+        admin = Utilisateur(prenom='Alice', nom='Martin', email='alice@example.com', est_admin=True)
+        admin.mot_de_passe = 'motdepasse1'
+        db.session.add_all([admin,
+                            Livre(titre='Vol de nuit', auteur='Saint-Exupéry', isbn='9780000000001',
+                                  quantite=1, disponible=1)])
+        db.session.commit()
+    client = application.test_client()
+    reponse = client.post('/auth/login', json={'email': 'alice@example.com', 'mot_de_passe': 'motdepasse1'})
+    client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer ' + reponse.get_json()['tokens']['token_acces']
+    return client
+
+
+def test_une_ecriture_valide_une_seule_transaction(client_admin):
+    reponse = client_admin.post('/categories', json={'nom': 'Roman'})
+    assert reponse.status_code == 201
+    assert reponse.headers['X-Nombre-Commits'] == '1'
+
+    reponse = client_admin.post('/loans', json={'livre_id': 1})
+    assert reponse.status_code == 201
+    assert reponse.headers['X-Nombre-Commits'] == '1'
+
+    # Le livre n'a plus d'exemplaire : l'emprunt échoue sans rien valider
+    reponse = client_admin.post('/loans', json={'livre_id': 1})
+    assert reponse.status_code == 409
+    assert reponse.headers['X-Nombre-Commits'] == '0'